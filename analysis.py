@@ -0,0 +1,348 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Scoring a CV against a job description, shared by the Dash callbacks and the
+JSON API.
+
+analyse() fetches the job description (if it is a URL), extracts the keywords
+of both documents and computes the match percentage once per pair of inputs.
+The result is cached on disk, so background jobs and web workers all reuse it.
+The app analyses incrementally: an edited pair reuses the per-paragraph counts
+behind the session's previous analysis (see incremental.py).
+"""
+
+import os
+
+from cache import CACHE_DIR, DiskCache, content_hash
+from fetcher import get_fetcher
+from incremental import (
+    IncrementalMatch,
+    current_version,
+    match_percentage,
+    score_tokens,
+)
+from keywords import extract_keywords
+from metrics import document_bytes, normalize_lookups, register_cache, timed
+from normalize import NORMALIZATION, get_normalizer
+from skills import extract_skills
+from store import get_store, terms_version
+
+# One analysis result per (CV text, job description) pair, shared by the Analyze
+# callbacks and the API. The callbacks run as background jobs in separate
+# processes, so the cache is on disk. The TTL lets a job description URL be fetched again once it is stale.
+analysis_cache = DiskCache(
+    os.path.join(CACHE_DIR, "analysis"),
+    size_limit=int(os.environ.get("SKILLS_MATCH_CACHE_BYTES", 256 * 1024 * 1024)),
+    ttl=float(os.environ.get("SKILLS_MATCH_CACHE_TTL", 900)),
+)
+register_cache("analysis", analysis_cache)
+# Part of the cache key; bump when the analysis result changes shape
+ANALYSIS_VERSION = "4"
+
+# The per-paragraph counts behind incremental analyses, by analysis key, so the
+# next analysis in a session only tokenizes the paragraphs that were edited
+match_cache = DiskCache(
+    os.path.join(CACHE_DIR, "matches"),
+    size_limit=int(os.environ.get("SKILLS_MATCH_MATCH_CACHE_BYTES", 64 * 1024 * 1024)),
+    ttl=analysis_cache.ttl,
+)
+register_cache("matches", match_cache)
+
+# Keyword and skill counts by text when there is no document store, so a popular
+# job description is tokenized once for every worker and job process
+terms_cache = DiskCache(
+    os.path.join(CACHE_DIR, "terms"),
+    size_limit=int(os.environ.get("SKILLS_MATCH_TERMS_CACHE_BYTES", 64 * 1024 * 1024)),
+)
+register_cache("terms", terms_cache)
+register_cache("job_texts", get_fetcher().text_cache)
+
+# CVs for ranking: the inverted index written by ingest.py or inverted_index.py
+# if there is one, otherwise the corpus built with `python ranking.py build`.
+# Loaded on first use.
+INDEX_DIR = os.environ.get("SKILLS_MATCH_INDEX", "index")
+CORPUS_DIR = os.environ.get("SKILLS_MATCH_CORPUS", "corpus")
+RANKING_TOP_K = int(os.environ.get("SKILLS_MATCH_RANKING_TOP_K", 50))
+_index = None
+_corpus = None
+# The manifest mtime of an index found stale, so it is reported once and
+# opened again only once it has been rebuilt
+_stale_index = None
+# A corpus that has to be rebuilt before it can be used
+_STALE = object()
+
+
+def fetch_job_text(url):
+    """
+    Fetch the text of a job description URL, raising on network and HTTP errors.
+    """
+    with timed("fetch_job_description"):
+        return get_fetcher().fetch(url.strip())
+
+
+def extract_text_from_url(url):
+    """
+    Extract text from job description URL.
+    """
+    try:
+        return fetch_job_text(url)
+    except Exception as e:
+        print(e)
+        return ""
+
+
+def handle_extraction(text, strict=False):
+    """
+    Return the job description text, fetching it if it is a URL. A failed
+    fetch gives "", or with strict raises.
+    """
+    if text is not None and "http" in text:
+        text = fetch_job_text(text) if strict else extract_text_from_url(text)
+    return text
+
+
+def calculate_match_percentage(text, jd):
+    """
+    Calculate the match percentage between the CV text and the job description:
+    the cosine similarity of their CountVectorizer token counts.
+    """
+    return match_percentage(score_tokens(text), score_tokens(jd))
+
+
+def document_terms(kind, text, external_id=None, terms=None):
+    """
+    Return the keyword and skill Counters of a CV ("cv") or job description ("jd").
+
+    With a document store configured, each text is tokenized once and its counts
+    are read back from the store afterwards; without one, they are kept in
+    terms_cache. terms, if given, are the text's (keywords, skills) counts,
+    already extracted, and are stored with it. A text recorded as a
+    near-duplicate of a stored document (see dedup.py) is analysed as it is but
+    not stored, so the store keeps one document per group.
+    """
+    store = get_store()
+    if store is not None and text and store.duplicate_of(kind, text) is not None:
+        store = None
+    if terms is not None:
+        if store is not None and text:
+            keywords, skills = terms
+            record = {"id": external_id, "text": text}
+            store.add_many(kind, [{**record, "keywords": keywords, "skills": skills}])
+        return terms
+    if not text:
+        return extract_keywords(text), extract_skills(text)
+    if store is None:
+        return terms_cache.get_or_compute(
+            content_hash(terms_version(), text),
+            lambda: (extract_keywords(text), extract_skills(text)),
+        )
+    return store.terms(store.add(kind, text, external_id))
+
+
+def analysis_key(cv_text, job_description):
+    """
+    Return the key the analysis of a CV and job description is cached under.
+    """
+    model = get_semantic_model()
+    # A newly trained model or edited skills taxonomy gives new results rather
+    # than cached ones without them
+    model_version = model.version if model is not None else ""
+    return content_hash(
+        ANALYSIS_VERSION, terms_version(), model_version, cv_text, job_description
+    )
+
+
+def _previous_match(previous):
+    match = match_cache.get(previous) if previous else None
+    if match is None or match.version != current_version():
+        return IncrementalMatch()
+    return match
+
+
+def analyse(cv_text, job_description, progress=None, incremental=False, previous=None):
+    """
+    Analyse a CV against a job description, once per pair of inputs.
+
+    The job description URL is fetched, keywords and taxonomy skills are
+    extracted from both documents and the match percentage (plus the semantic
+    one, if a model has been trained) is computed a single time. Every Analyze
+    callback reads the same cached result. progress, if given, is called with a short message
+    as each stage starts.
+
+    With incremental, the per-paragraph counts behind the result are kept and
+    those of previous (the analysis_key() of an earlier analysis, typically the
+    session's last) are reused, so only paragraphs not in that pair are
+    tokenized.
+    """
+
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    model = get_semantic_model()
+    key = analysis_key(cv_text, job_description)
+
+    fetch_failed = False
+
+    def run():
+        nonlocal fetch_failed
+        report("Reading job description...")
+        try:
+            job_text = handle_extraction(job_description, strict=True) or ""
+        except Exception as e:
+            print(e)
+            # Analysed as an empty job description, but not cached, so the
+            # next analysis fetches the URL again
+            fetch_failed = True
+            job_text = ""
+        document_bytes.observe(len(cv_text), "cv_text")
+        document_bytes.observe(len(job_text), "job_text")
+        report("Extracting keywords...")
+        match = cv_terms = job_terms = None
+        normalizer = get_normalizer()
+        lookups = normalizer.stats() if normalizer is not None else None
+        with timed("extract_terms"):
+            if incremental:
+                match = _previous_match(previous)
+                match.update(cv_text, job_text)
+                cv_terms = match.cv.keywords, match.cv.skills
+                job_terms = match.jd.keywords, match.jd.skills
+            cv_keywords, cv_skills = document_terms("cv", cv_text, terms=cv_terms)
+            # Keep the URL, so stored job descriptions can be traced to their source
+            source = job_description.strip() if job_text != job_description else None
+            job_keywords, job_skills = document_terms(
+                "jd", job_text, source, terms=job_terms
+            )
+        if normalizer is not None:
+            # Jobs run in their own processes, so report this analysis's lookups
+            # to the shared metrics rather than the process's memo statistics
+            stats = normalizer.stats()
+            normalize_lookups.inc("hit", stats["hits"] - lookups["hits"])
+            normalize_lookups.inc("miss", stats["misses"] - lookups["misses"])
+        report("Scoring...")
+        with timed("match_percentage"):
+            if match is not None:
+                similarity_score = match.score
+            else:
+                similarity_score = calculate_match_percentage(cv_text, job_text)
+        if match is not None and not fetch_failed:
+            match_cache.set(key, match)
+        semantic_score = None
+        if model is not None:
+            with timed("semantic_score"):
+                semantic_score = model.similarity(cv_text, job_text)
+        return {
+            "cv_text": cv_text,
+            "job_text": job_text,
+            "cv_keywords": cv_keywords,
+            "job_keywords": job_keywords,
+            "common_keywords": (
+                match.common_keywords
+                if match is not None
+                else cv_keywords & job_keywords
+            ),
+            "cv_skills": cv_skills,
+            "job_skills": job_skills,
+            "common_skills": (
+                match.common_skills if match is not None else cv_skills & job_skills
+            ),
+            "similarity_score": similarity_score,
+            "semantic_score": semantic_score,
+        }
+
+    return analysis_cache.get_or_compute(key, run, keep=lambda _: not fetch_failed)
+
+
+def _open_index():
+    global _stale_index
+    from inverted_index import MANIFEST, InvertedIndex
+
+    try:
+        stamp = os.stat(os.path.join(INDEX_DIR, MANIFEST)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if stamp == _stale_index:
+        return None
+    index = InvertedIndex(INDEX_DIR)
+    if not index.current or not index.exact:
+        print(
+            f"The CV index in {INDEX_DIR} was built with other keyword counts or "
+            "without score tokens; rebuild it with ingest.py or inverted_index.py."
+        )
+        _stale_index = stamp
+        return None
+    return index
+
+
+def _open_corpus():
+    if not os.path.isdir(CORPUS_DIR):
+        return None
+    from ranking import CVRanker
+
+    ranker = CVRanker.load(CORPUS_DIR)
+    if ranker.normalization != NORMALIZATION:
+        # Its terms would not match the keywords extracted now
+        print(
+            f"The CV corpus in {CORPUS_DIR} was built with normalization "
+            f"{ranker.normalization or 'off'}, not {NORMALIZATION or 'off'}; "
+            "rebuild it with ranking.py build."
+        )
+        return _STALE
+    return ranker
+
+
+def get_ranker():
+    """
+    Return the CV ranker, or None if no usable index or corpus has been built.
+
+    The inverted index is preferred: it shortlists from its posting lists,
+    scores only the shortlist and picks up CVs added or deleted since it was
+    opened. A stale index is skipped for the corpus until it is rebuilt. Both
+    give a CV the score calculate_match_percentage would.
+    """
+    global _index, _corpus
+    if _index is not None:
+        _index.refresh()
+        if _index.current and _index.exact:
+            return _index
+        _index = None
+    _index = _open_index()
+    if _index is not None:
+        return _index
+    if _corpus is None:
+        _corpus = _open_corpus()
+    return None if _corpus is _STALE else _corpus
+
+
+def get_semantic_model():
+    """
+    Return the LSA model for semantic scoring, or None if none has been trained.
+    """
+    from semantic import get_model
+
+    return get_model()
+
+
+def get_semantic_index():
+    """
+    Return the semantic CV index, or None if no embeddings have been built.
+    """
+    from semantic import get_index
+
+    return get_index()
@@ -0,0 +1,324 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+JSON API for scoring CVs against job descriptions without the Dash UI.
+
+    POST /api/score        {"cv_text": ..., "job_description": ...}
+    POST /api/score/batch  {"pairs": [{"id": ..., "cv_text": ..., "job_description": ...}]}
+    POST /api/rank         {"job_description": ..., "k": 50, "mode": "lexical"}
+    POST /api/gaps         {"cv_text": ..., "job_descriptions": [{"id": ..., "text": ...}]}
+                           or {"job_description": ..., "cvs": [{"id": ..., "text": ...}]}
+
+A job description may be text or a URL, as in the UI. In place of cv_text, a
+request may send the cv_id returned by POST /upload/cv (see uploads.py), so a
+CV file is uploaded and extracted once however many times it is scored. Every
+score comes with the keywords and taxonomy skills (see skills.py) the CV shares
+with the job description and the job description skills it is missing, most
+frequent first.
+/api/rank works from the corpus term matrix, so its lists are keywords
+(common_keywords and missing_keywords); with
+"mode": "semantic" it ranks by the LSA embeddings (see semantic.py) and gives
+scores only. A semantic_score is added to pair results once a model is trained.
+/api/gaps compares one CV with many job descriptions, or one job description
+with many CVs, and adds the skills most often missing across them (see gaps.py).
+
+Responses are gzip-compressed when the client accepts gzip. A batch can be sent
+as NDJSON, one pair per line, and is answered as NDJSON, one result per line as
+each pair is scored, when the client sends Accept: application/x-ndjson.
+"""
+
+import gzip
+import json
+import os
+import zlib
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from analysis import (
+    RANKING_TOP_K,
+    analyse,
+    get_ranker,
+    get_semantic_index,
+    handle_extraction,
+)
+from keywords import extract_keywords
+from uploads import load_cv
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+MAX_BATCH_PAIRS = int(os.environ.get("SKILLS_MATCH_API_MAX_BATCH", 10000))
+NDJSON = "application/x-ndjson"
+
+blueprint = Blueprint("api", __name__, url_prefix="/api")
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _accepts_gzip():
+    return "gzip" in request.headers.get("Accept-Encoding", "")
+
+
+def _json_response(payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if _accepts_gzip() and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status=status, mimetype="application/json", headers=headers)
+
+
+def _gzip_stream(chunks):
+    """
+    gzip a stream of byte strings, flushing after each so lines arrive promptly.
+    """
+    # wbits 31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _ndjson_response(records):
+    lines = (json.dumps(record).encode("utf-8") + b"\n" for record in records)
+    headers = {"Vary": "Accept-Encoding"}
+    if _accepts_gzip():
+        lines = _gzip_stream(lines)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(lines), mimetype=NDJSON, headers=headers)
+
+
+def _text(record, name):
+    value = record.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise BadRequest(f"{name} must be a non-empty string")
+    return value
+
+
+def _cv_text(record):
+    if "cv_id" not in record:
+        return _text(record, "cv_text")
+    text = load_cv(record["cv_id"])
+    if text is None:
+        raise BadRequest("cv_id is unknown or has expired; upload the CV again")
+    return text
+
+
+def _limit(record):
+    limit = record.get("limit")
+    # bool is a subclass of int, but true is not a limit
+    if limit is not None and (
+        not isinstance(limit, int) or isinstance(limit, bool) or limit < 0
+    ):
+        raise BadRequest("limit must be a non-negative integer")
+    return limit
+
+
+def match_result(cv_text, job_description, limit=None):
+    """
+    Score one CV against one job description.
+    """
+    analysis = analyse(cv_text, job_description)
+    missing = analysis["job_skills"] - analysis["cv_skills"]
+    result = {
+        "score": round(float(analysis["similarity_score"]), 2),
+        "common_keywords": [
+            keyword for keyword, _ in analysis["common_keywords"].most_common(limit)
+        ],
+        "common_skills": [
+            skill for skill, _ in analysis["common_skills"].most_common(limit)
+        ],
+        "missing_skills": [skill for skill, _ in missing.most_common(limit)],
+    }
+    if analysis["semantic_score"] is not None:
+        result["semantic_score"] = round(analysis["semantic_score"], 2)
+    return result
+
+
+def _read_json():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise BadRequest("request body must be a JSON object")
+    return payload
+
+
+def _iter_ndjson():
+    # Read line by line so a large batch is never held in memory
+    for number, line in enumerate(request.stream, 1):
+        if number > MAX_BATCH_PAIRS:
+            yield BadRequest(f"at most {MAX_BATCH_PAIRS} pairs per batch")
+            return
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield BadRequest(f"line {number} is not valid JSON")
+
+
+def _read_pairs():
+    """
+    Return the pairs of a batch request, from a JSON object or NDJSON lines.
+    """
+    if request.mimetype == NDJSON:
+        return _iter_ndjson()
+    pairs = _read_json().get("pairs")
+    if not isinstance(pairs, list):
+        raise BadRequest("pairs must be a list")
+    if len(pairs) > MAX_BATCH_PAIRS:
+        raise BadRequest(f"at most {MAX_BATCH_PAIRS} pairs per batch")
+    return pairs
+
+
+def _score_pairs(pairs):
+    for position, pair in enumerate(pairs):
+        if isinstance(pair, BadRequest):
+            yield {"id": position, "error": str(pair)}
+            continue
+        if not isinstance(pair, dict):
+            yield {"id": position, "error": "pair must be a JSON object"}
+            continue
+        result = {"id": pair.get("id", position)}
+        try:
+            result.update(
+                match_result(
+                    _cv_text(pair),
+                    _text(pair, "job_description"),
+                    _limit(pair),
+                )
+            )
+        except ValueError as e:
+            # One bad pair does not fail the rest of the batch
+            result["error"] = str(e)
+        yield result
+
+
+# Also covers scikit-learn rejecting text with no scorable words
+@blueprint.errorhandler(ValueError)
+def bad_request(error):
+    return _json_response({"error": str(error)}, status=400)
+
+
+@blueprint.route("/score", methods=["POST"])
+def score():
+    """
+    Score a single CV/job description pair.
+    """
+    payload = _read_json()
+    return _json_response(
+        match_result(
+            _cv_text(payload),
+            _text(payload, "job_description"),
+            _limit(payload),
+        )
+    )
+
+
+@blueprint.route("/score/batch", methods=["POST"])
+def score_batch():
+    """
+    Score many pairs in one request, optionally streamed back as NDJSON.
+    """
+    pairs = _read_pairs()
+    if NDJSON in request.headers.get("Accept", ""):
+        return _ndjson_response(_score_pairs(pairs))
+    return _json_response({"results": list(_score_pairs(pairs))})
+
+
+@blueprint.route("/rank", methods=["POST"])
+def rank():
+    """
+    Rank the stored CV corpus against one job description.
+    """
+    payload = _read_json()
+    job_description = _text(payload, "job_description")
+    limit = _limit(payload)
+    k = payload.get("k", RANKING_TOP_K)
+    if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+        raise BadRequest("k must be a positive integer")
+    mode = payload.get("mode", "lexical")
+    if mode == "semantic":
+        ranker = get_semantic_index()
+    elif mode == "lexical":
+        ranker = get_ranker()
+    else:
+        raise BadRequest('mode must be "lexical" or "semantic"')
+    if ranker is None:
+        return _json_response({"error": f"no {mode} CV index has been built"}, 503)
+
+    job_text = handle_extraction(job_description) or ""
+    job_keywords = [keyword for keyword, _ in extract_keywords(job_text).most_common()]
+    results = []
+    for position, (cv_id, cv_score) in enumerate(ranker.rank(job_text, k), 1):
+        result = {"rank": position, "cv_id": cv_id, "score": round(cv_score, 2)}
+        if mode == "lexical":
+            common = ranker.present_terms(cv_id, job_keywords)
+            present = set(common)
+            result["common_keywords"] = common[:limit]
+            result["missing_keywords"] = [
+                keyword for keyword in job_keywords if keyword not in present
+            ][:limit]
+        results.append(result)
+    return _json_response({"corpus_size": len(ranker), "results": results})
+
+
+def _read_documents(payload, name):
+    documents = payload.get(name)
+    if not isinstance(documents, list) or not documents:
+        raise BadRequest(f"{name} must be a non-empty list")
+    if len(documents) > MAX_BATCH_PAIRS:
+        raise BadRequest(f"at most {MAX_BATCH_PAIRS} {name} per request")
+    records = []
+    for position, document in enumerate(documents):
+        if not isinstance(document, dict):
+            raise BadRequest(f"{name} must be a list of JSON objects")
+        records.append(
+            {"id": document.get("id", position), "text": _text(document, "text")}
+        )
+    return records
+
+
+@blueprint.route("/gaps", methods=["POST"])
+def gaps():
+    """
+    Skill gaps of one CV against many job descriptions, or the reverse.
+    """
+    from gaps import skill_gaps
+
+    payload = _read_json()
+    limit = _limit(payload)
+    if "cv_text" in payload or "cv_id" in payload:
+        reference = _cv_text(payload)
+        records = _read_documents(payload, "job_descriptions")
+        kind = "jd"
+    else:
+        reference = handle_extraction(_text(payload, "job_description")) or ""
+        records = _read_documents(payload, "cvs")
+        kind = "cv"
+    result = skill_gaps(reference, records, kind)
+    return _json_response(
+        {
+            "results": list(result.rows()),
+            "most_missing": [
+                {"skill": skill, "count": count}
+                for skill, count in result.most_missing(limit)
+            ],
+        }
+    )
@@ -18,30 +18,51 @@
 
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html
-from dash.dependencies import Input, Output, State
-import plotly.graph_objects as go
-import docx2txt
-import PyPDF2
-from io import BytesIO
-import requests
-from bs4 import BeautifulSoup
-import nltk
-from nltk.corpus import stopwords
-from collections import Counter
-import base64
-from wordcloud import WordCloud
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-nltk.download("stopwords")
-stop_words = set(stopwords.words("english"))
-nltk.download("punkt")
+from dash import Patch, dash_table, dcc, html, no_update
+from dash.dependencies import ClientsideFunction, Input, Output, State
+import heapq
+import logging
+import os
+
+from analysis import (
+    CORPUS_DIR,
+    INDEX_DIR,
+    RANKING_TOP_K,
+    analyse,
+    analysis_key,
+    get_ranker,
+    get_semantic_index,
+    handle_extraction,
+)
+from api import blueprint as api_blueprint
+from compression import init_app as init_compression
+from extraction import MAX_FILE_BYTES
+from jobs import make_background_manager, worker_slot
+from metrics import init_app as init_metrics, timed
+from uploads import blueprint as upload_blueprint, document_text
+from wordclouds import blueprint as wordcloud_blueprint, wordcloud_url
+
+# Heavy libraries (plotly figures, wordcloud, scikit-learn, PyPDF2, docx2txt,
+# BeautifulSoup and NLTK itself) are imported inside the functions that use them,
+# so a worker starts without loading them. NLTK data comes from a local directory.
 
 app = dash.Dash(
-    __name__, external_stylesheets=[dbc.themes.BOOTSTRAP], title="skills_warrior"
+    __name__,
+    external_stylesheets=[dbc.themes.BOOTSTRAP],
+    title="skills_warrior",
+    # Analyze runs as background jobs in separate processes, see jobs.py
+    background_callback_manager=make_background_manager(),
 )
 server = app.server
+log = logging.getLogger(__name__)
+server.register_blueprint(wordcloud_blueprint)
+server.register_blueprint(api_blueprint)
+server.register_blueprint(upload_blueprint)
+init_metrics(server)
+init_compression(server)
+
+# Axes on the radar graph; hundreds of keywords make it unreadable and heavy
+RADAR_TOP_N = int(os.environ.get("SKILLS_MATCH_RADAR_TOP_N", 12))
 
 app.layout = dbc.Container(
     fluid=True,
@@ -61,30 +82,41 @@ app.layout = dbc.Container(
             dbc.Row(
                 [
                     dbc.Col(
-                        dcc.Upload(
-                            id="upload-cv",
-                            children=html.Div(
-                                ["Drag and Drop or ", html.A("Select a CV")]
+                        [
+                            dcc.Upload(
+                                id="upload-cv",
+                                children=html.Div(
+                                    ["Drag and Drop or ", html.A("Select a CV")]
+                                ),
+                                className="mt-2 mr-2 mb-2 text-center upload-hover rounded-3",
+                                style={
+                                    "width": "100%",
+                                    "height": "60px",
+                                    "lineHeight": "60px",
+                                    "borderWidth": "1px",
+                                    "borderStyle": "solid",
+                                    "borderColor": "black",
+                                    "borderRadius": "5px",
+                                    "boxShadow": "rgba(0, 0, 0, 0.24) 0px 3px 8px",
+                                    "backgroundColor": "white",
+                                },
+                                # Causes bar to change colour when a file is dragged over it
+                                style_active={
+                                    "backgroundColor": "rgba(39, 213, 245, 0.12)",
+                                    "borderColor": "green",
+                                },
+                                multiple=False,
+                                # Checked in the browser before the file is read
+                                max_size=MAX_FILE_BYTES,
                             ),
-                            className="mt-2 mr-2 mb-2 text-center upload-hover rounded-3",
-                            style={
-                                "width": "100%",
-                                "height": "60px",
-                                "lineHeight": "60px",
-                                "borderWidth": "1px",
-                                "borderStyle": "solid",
-                                "borderColor": "black",
-                                "borderRadius": "5px",
-                                "boxShadow": "rgba(0, 0, 0, 0.24) 0px 3px 8px",
-                                "backgroundColor": "white",
-                            },
-                            # Causes bar to change colour when a file is dragged over it
-                            style_active={
-                                "backgroundColor": "rgba(39, 213, 245, 0.12)",
-                                "borderColor": "green",
-                            },
-                            multiple=False,
-                        ),
+                            # The file is posted to /upload/cv from the browser (see
+                            # assets/clientside.js); callbacks get the returned document
+                            # ID, or the text once it has been edited, not the text itself
+                            dcc.Store(id="cv-upload"),
+                            dcc.Store(id="cv-document"),
+                            # A random ID per page load, set in the browser
+                            dcc.Store(id="session-id"),
+                        ],
                         width=12,
                     ),
                 ]
@@ -234,6 +266,7 @@ app.layout = dbc.Container(
                                         "fontSize": "calc(23vh + 3vw)",  # 80% of the card's height
                                         "height": "33vh",  # Set the height of the card
                                     },
+                                    children=html.H4(id="similarity-score-text"),
                                 ),
                                 # Insert the new H4 label with padding here
                                 html.Label(
@@ -257,6 +290,20 @@ app.layout = dbc.Container(
                                         i: "{}%".format(i) for i in range(0, 101, 10)
                                     },
                                 ),
+                                # Lexical (word overlap) or semantic (LSA) score
+                                dbc.RadioItems(
+                                    id="score-mode",
+                                    options=[
+                                        {"label": "Lexical", "value": "lexical"},
+                                        {"label": "Semantic", "value": "semantic"},
+                                    ],
+                                    value="lexical",
+                                    inline=True,
+                                    style={"marginLeft": "20px", "padding": "5px"},
+                                ),
+                                # Raw similarity scores from the last analysis run. The
+                                # mode and threshold colour are applied clientside.
+                                dcc.Store(id="similarity-store"),
                             ],
                             className="bs-100pct rounded-3 custom-border",
                         ),
@@ -305,11 +352,53 @@ app.layout = dbc.Container(
                         "padding": "20px",
                     },
                     className="d-flex align-items-start",
-                )
+                ),
+                # Progress of the background analysis job
+                dbc.Col(
+                    html.Div(id="analysis-progress"),
+                    width=9,
+                    style={"padding": "20px", "fontSize": "20px"},
+                ),
             ],
             # style={"marginBottom": "80px"},
             className="g-0",
         ),  # ROW END
+        # Row of one column. Ranks the stored CV corpus against the job description.
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.H4("Top CVs for this Job Description", className="m-2"),
+                        dbc.Button(
+                            "Rank CVs",
+                            id="rank-button",
+                            color="primary",
+                            n_clicks=0,
+                            className="m-2",
+                            style={
+                                "width": "150px",
+                                "minWidth": "100px",
+                            },
+                        ),
+                        html.Div(id="ranking-message", className="m-2"),
+                        dash_table.DataTable(
+                            id="ranking-table",
+                            columns=[
+                                {"name": "Rank", "id": "rank"},
+                                {"name": "CV", "id": "cv_id"},
+                                {"name": "Match %", "id": "score"},
+                            ],
+                            data=[],
+                            page_size=10,
+                            style_cell={"fontFamily": "Arial", "textAlign": "left"},
+                        ),
+                    ],
+                    width=12,
+                    style={"padding": "20px"},
+                )
+            ],
+            className="g-0",
+        ),  # ROW END
         # copyright bar at bottom of page
         dbc.Row(
             dbc.Col(
@@ -350,180 +439,157 @@ app.layout = dbc.Container(
 )
 
 
-def extract_text_from_cv(contents, filename):
+def radar_axes(common_keywords, job_keywords, n=RADAR_TOP_N):
     """
-    Extract text from CV in Word or PDF format.
+    Return the n shared terms the job description mentions most, with their
+    shared and job description counts.
     """
-    content_type, content_string = contents.split(",")
-    decoded = base64.b64decode(content_string)
-    try:
-        if "doc" in filename:
-            text = docx2txt.process(BytesIO(decoded))
-        elif "pdf" in filename:
-            reader = PyPDF2.PdfReader(BytesIO(decoded))
-            text = " ".join(
-                [reader.pages[i].extract_text() for i in range(len(reader.pages))]
-            )
-        else:
-            raise Exception("Invalid file type")
-    except Exception as e:
-        print(e)
-        return ""
-    return text
+    # A heap picks the top n without sorting every shared term
+    top = heapq.nlargest(
+        n, common_keywords, key=lambda k: (job_keywords[k], common_keywords[k])
+    )
+    return top, [common_keywords[k] for k in top], [job_keywords[k] for k in top]
 
 
-def extract_text_from_url(url):
+def radar_figure(theta, cv_counts, job_counts):
     """
-    Extract text from job description URL.
+    Return the radar figure of the CV and job description counts of terms.
     """
-    try:
-        res = requests.get(url)
-        soup = BeautifulSoup(res.text, "html.parser")
-        text_div = soup.find("div", id="md_skills")  # locate the div by id
-        if text_div:
-            text = " ".join(
-                p.text for p in text_div.find_all("p")
-            )  # get the text inside <p> tags within the div
-        else:
-            text = ""
-    except Exception as e:
-        print(e)
-        return ""
-    return text
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatterpolar(r=cv_counts, theta=theta, fill="toself", name="CV"))
+    fig.add_trace(
+        go.Scatterpolar(
+            r=job_counts, theta=theta, fill="toself", name="Job Description"
+        )
+    )
+    fig.update_layout(
+        polar=dict(radialaxis=dict(visible=True, range=[0, 5])),
+        showlegend=True,
+        legend=dict(orientation="h"),
+    )
+    return fig
 
 
-def extract_keywords(text):
+def session_analysis(cv_text, job_description, stored_scores, progress=None):
     """
-    Extract keywords from text.
+    Analyse a CV against a job description incrementally, from the counts behind
+    the session's last analysis (whose key is kept with its scores).
     """
-    words = nltk.word_tokenize(text)
-    words = [word.lower() for word in words if word.isalpha()]
-    words = [word for word in words if word not in stopwords.words("english")]
-    return Counter(words)
-
-
-def generate_wordcloud(text):
-    wordcloud = WordCloud(
-        width=800,
-        height=400,
-        background_color="white",
-        colormap="Greens",
-        # stopwords=stopwords.words("english"),
-        stopwords=stop_words,
-        min_font_size=10,
-    ).generate(text)
-    return wordcloud.to_image()
-
-
-def generate_wordcloud_jd(text):
-    wordcloud = WordCloud(
-        width=800,
-        height=400,
-        background_color="white",
-        colormap="Blues",  # Choose a different colormap for the JD WordCloud
-        stopwords=stop_words,
-        min_font_size=10,
-    ).generate(text)
-    return wordcloud.to_image()
+    previous = (stored_scores or {}).get("key")
+    return analyse(
+        cv_text, job_description, progress=progress, incremental=True, previous=previous
+    )
 
 
-@app.callback(
-    Output("cv-text", "value"),
+def generate_wordcloud(keywords):
+    """
+    Return the URL of the CV word cloud for a keyword Counter.
+    """
+    return wordcloud_url(keywords, colormap="Greens")
+
+
+def generate_wordcloud_jd(keywords):
+    """
+    Return the URL of the job description word cloud for a keyword Counter.
+    """
+    # Choose a different colormap for the JD WordCloud
+    return wordcloud_url(keywords, colormap="Blues")
+
+
+# Post an uploaded CV to /upload/cv and show its text. The file never goes through
+# a callback, and the callbacks below send its document ID instead of the text
+# until the text is edited. See assets/clientside.js.
+app.clientside_callback(
+    ClientsideFunction(namespace="skills_match", function_name="upload_cv"),
+    [Output("cv-text", "value"), Output("cv-upload", "data")],
     Input("upload-cv", "contents"),
     State("upload-cv", "filename"),
 )
-def update_cv_text(contents, filename):
-    """
-    Update CV text when a file is uploaded.
-    """
-    if contents:
-        text = extract_text_from_cv(contents, filename)
-        return text
-    return ""
+app.clientside_callback(
+    ClientsideFunction(namespace="skills_match", function_name="cv_document"),
+    Output("cv-document", "data"),
+    [Input("cv-text", "value"), Input("cv-upload", "data")],
+)
+# Dash keys a background job by the callback's inputs and gives its result to
+# the first poller, so the Analyze callbacks take the session ID as State: two
+# sessions clicking Analyze on the same CV and job description then get jobs
+# of their own, and n_clicks tells one session's clicks apart.
+app.clientside_callback(
+    ClientsideFunction(namespace="skills_match", function_name="session_id"),
+    Output("session-id", "data"),
+    Input("session-id", "id"),
+)
 
 
 @app.callback(
     [
         Output("radar-graph", "figure"),
-        Output("similarity-score", "children"),
+        Output("similarity-store", "data"),
         Output("radar-graph", "style"),
         Output("no-data-message", "style"),
     ],
-    [Input("analyze-button", "n_clicks"), Input("threshold-slider", "value")],
-    [State("cv-text", "value"), State("job-description", "value")],
+    Input("analyze-button", "n_clicks"),
+    [
+        State("cv-document", "data"),
+        State("job-description", "value"),
+        State("radar-graph", "style"),
+        State("similarity-store", "data"),
+        State("session-id", "data"),
+    ],
+    background=True,
+    progress=Output("analysis-progress", "children"),
+    cancel=[Input("clear-button", "n_clicks")],
 )
-def update_radar_graph(n_clicks, threshold, cv_text, job_description):
+def update_radar_graph(
+    set_progress, n_clicks, cv_document, job_description, style, stored_scores, _
+):
     """Update radar graph and similarity score when the analyze button is clicked."""
-    if n_clicks > 0 and cv_text and job_description:
-        if "http" in job_description:
-            job_description = extract_text_from_url(job_description)
-        cv_keywords = extract_keywords(cv_text)
-        job_keywords = extract_keywords(job_description)
-        common_keywords = cv_keywords & job_keywords
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatterpolar(
-                r=[common_keywords[keyword] for keyword in common_keywords],
-                theta=list(common_keywords.keys()),
-                fill="toself",
-                name="CV",
-            )
-        )
-        fig.add_trace(
-            go.Scatterpolar(
-                r=[job_keywords[keyword] for keyword in common_keywords],
-                theta=list(common_keywords.keys()),
-                fill="toself",
-                name="Job Description",
-            )
-        )
-        fig.update_layout(
-            polar=dict(radialaxis=dict(visible=True, range=[0, 5])),
-            showlegend=True,
-            legend=dict(orientation="h"),
-        )
+    import plotly.graph_objects as go
 
-        # Function to calculate the match percentage between the CV text and the job description
-        def calculate_match_percentage(text, jd):
-            vectorizer = CountVectorizer().fit_transform([text, jd])
-            vectors = vectorizer.toarray()
-            cosine_sim = cosine_similarity(vectors)
-            match_percentage = cosine_sim[0, 1] * 100  # Convert to percentage
-            return match_percentage
-
-        similarity_score = calculate_match_percentage(cv_text, job_description)
-        similarity_score_text = f"{similarity_score:.0f}%"
-
-        # Use the threshold value from the slider to set the color
-        similarity_score_color = "green" if similarity_score >= threshold else "red"
-        similarity_score_html = html.H4(
-            similarity_score_text,
-            style={
-                "color": similarity_score_color,
-                "font-family": "Arial",
-                "font-size": "128px",
-                "text-align": "center",
-            },
-        )
+    shown = (style or {}).get("display") == "block"
+    cv_text = document_text(cv_document)
 
-        wordcloud_img = generate_wordcloud(job_description)
-        img_bytes = BytesIO()
-        wordcloud_img.save(img_bytes, format="PNG")
+    if n_clicks > 0 and cv_text and job_description:
+        with worker_slot(on_wait=lambda: set_progress("Queued...")):
+            analysis = session_analysis(
+                cv_text, job_description, stored_scores, progress=set_progress
+            )
+        set_progress("")
+        # Plot the taxonomy skills both documents mention, falling back to the
+        # shared keywords when they have no known skill in common
+        if analysis["common_skills"]:
+            job_keywords = analysis["job_skills"]
+            common_keywords = analysis["common_skills"]
+        else:
+            job_keywords = analysis["job_keywords"]
+            common_keywords = analysis["common_keywords"]
+        scores = {
+            "lexical": float(analysis["similarity_score"]),
+            "semantic": analysis["semantic_score"],
+            "key": analysis_key(cv_text, job_description),
+        }
+        with timed("radar_figure"):
+            theta, cv_counts, job_counts = radar_axes(common_keywords, job_keywords)
+            if shown:
+                # The graph is already drawn: send only the new points, not
+                # the whole figure and its template again
+                fig = Patch()
+                fig["data"][0]["r"] = cv_counts
+                fig["data"][0]["theta"] = theta
+                fig["data"][1]["r"] = job_counts
+                fig["data"][1]["theta"] = theta
+                return fig, scores, no_update, no_update
+            fig = radar_figure(theta, cv_counts, job_counts)
 
         # If data available, hide no-data-message and show the graph
-        return fig, similarity_score_html, {"display": "block"}, {"display": "none"}
+        return fig, scores, {"display": "block"}, {"display": "none"}
 
     return (
-        go.Figure(),
-        html.H4(
-            "Awaiting Analysis run",
-            style={
-                "color": "black",
-                "font-family": "Arial",
-                "font-size": "20px",
-                "text-align": "center",
-            },
-        ),
+        # Nothing to clear if no graph is drawn
+        go.Figure() if shown else no_update,
+        None,
         {"display": "none"},
         {
             "display": "flex",
@@ -535,46 +601,87 @@ def update_radar_graph(n_clicks, threshold, cv_text, job_description):
     )
 
 
+# Colour the stored score against the slider threshold in the browser, so a slider
+# drag never goes back to the server. See assets/clientside.js.
+app.clientside_callback(
+    ClientsideFunction(namespace="skills_match", function_name="colour_score"),
+    [
+        Output("similarity-score-text", "children"),
+        Output("similarity-score-text", "style"),
+    ],
+    [
+        Input("similarity-store", "data"),
+        Input("threshold-slider", "value"),
+        Input("score-mode", "value"),
+    ],
+)
+
+
 @app.callback(
+    [Output("ranking-table", "data"), Output("ranking-message", "children")],
+    Input("rank-button", "n_clicks"),
+    [State("job-description", "value"), State("score-mode", "value")],
+)
+def update_ranking(n_clicks, job_description, mode):
+    """
+    Rank the stored CVs against the job description when Rank CVs is clicked.
+    """
+    if not n_clicks or not job_description:
+        return [], ""
+    if mode == "semantic":
+        ranker = get_semantic_index()
+        if ranker is None:
+            return [], "No semantic CV embeddings; run semantic.py train and embed"
+    else:
+        ranker = get_ranker()
+        if ranker is None:
+            return [], f"No CV index at {INDEX_DIR} or corpus at {CORPUS_DIR}"
+    job_text = handle_extraction(job_description)
+    ranked = ranker.rank(job_text or "", RANKING_TOP_K)
+    rows = [
+        {"rank": position, "cv_id": cv_id, "score": f"{score:.0f}%"}
+        for position, (cv_id, score) in enumerate(ranked, 1)
+    ]
+    return rows, f"Top {len(rows)} of {len(ranker)} CVs"
+
+
+# In the browser, so typing in the text boxes does not post them on every key
+app.clientside_callback(
+    ClientsideFunction(namespace="skills_match", function_name="enable_buttons"),
     [Output("analyze-button", "disabled"), Output("clear-button", "disabled")],
     [Input("cv-text", "value"), Input("job-description", "value")],
 )
-def update_buttons(cv_text, job_description):
-    empty_fields = not bool(cv_text and job_description)
-    return empty_fields, empty_fields
+
+
+def word_cloud_placeholder(message):
+    return (
+        None,
+        {"display": "none"},
+        html.Div(
+            message,
+            style={
+                "display": "flex",
+                "justifyContent": "center",
+                "alignItems": "center",
+                "fontSize": "20px",
+                "height": "550px",
+            },
+        ),
+    )
 
 
 def handle_analysis_run(n_clicks):
     if n_clicks is None:
-        return (
-            None,
-            {"display": "none"},
-            html.Div(
-                "Awaiting analysis run",
-                style={
-                    "display": "flex",
-                    "justifyContent": "center",
-                    "alignItems": "center",
-                    "fontSize": "20px",
-                    "height": "550px",
-                },
-            ),
-        )
+        return word_cloud_placeholder("Awaiting analysis run")
     return None
 
 
-def handle_extraction(text):
-    if text is not None and "http" in text:
-        text = extract_text_from_url(text)
-    return text
+def word_cloud_error(which):
+    log.exception("Generating the %s word cloud failed", which)
+    return word_cloud_placeholder("The word cloud could not be generated")
 
 
-def handle_wordcloud_generation(wordcloud_img):
-    img_bytes = BytesIO()
-    wordcloud_img.save(img_bytes, format="PNG")
-    img_bytes = img_bytes.getvalue()
-    wordcloud_img_b64 = base64.b64encode(img_bytes).decode()
-    src = "data:image/png;base64,{}".format(wordcloud_img_b64)
+def handle_wordcloud_generation(src):
     return src, {"display": "block"}, ""
 
 
@@ -585,19 +692,29 @@ def handle_wordcloud_generation(wordcloud_img):
         Output("word-cloud-placeholder", "children"),
     ],
     Input("analyze-button", "n_clicks"),
-    State("cv-text", "value"),
+    [
+        State("cv-document", "data"),
+        State("job-description", "value"),
+        State("similarity-store", "data"),
+        State("session-id", "data"),
+    ],
+    background=True,
+    cancel=[Input("clear-button", "n_clicks")],
 )
-def update_word_cloud(n_clicks, cv_text):
+def update_word_cloud(n_clicks, cv_document, job_description, stored_scores, _):
     run_status = handle_analysis_run(n_clicks)
     if run_status is not None:
         return run_status
     try:
-        cv_text = handle_extraction(cv_text)
-        if cv_text:
-            wordcloud_img = generate_wordcloud(cv_text)
-            return handle_wordcloud_generation(wordcloud_img)
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        cv_text = document_text(cv_document)
+        if cv_text and job_description:
+            with worker_slot():
+                analysis = session_analysis(cv_text, job_description, stored_scores)
+                cv_keywords = analysis["cv_keywords"]
+                src = generate_wordcloud(cv_keywords)
+            return handle_wordcloud_generation(src)
+    except Exception:
+        return word_cloud_error("CV")
     return handle_analysis_run(None)
 
 
@@ -608,19 +725,31 @@ def update_word_cloud(n_clicks, cv_text):
         Output("word-cloud-jd-placeholder", "children"),
     ],
     Input("analyze-button", "n_clicks"),
-    State("job-description", "value"),
+    [
+        State("cv-document", "data"),
+        State("job-description", "value"),
+        State("similarity-store", "data"),
+        State("session-id", "data"),
+    ],
+    background=True,
+    cancel=[Input("clear-button", "n_clicks")],
 )
-def update_word_cloud_jd(n_clicks, job_description):
+def update_word_cloud_jd(n_clicks, cv_document, job_description, stored_scores, _):
     run_status = handle_analysis_run(n_clicks)
     if run_status is not None:
         return run_status
     try:
-        job_description = handle_extraction(job_description)
-        if job_description:
-            wordcloud_img = generate_wordcloud_jd(job_description)
-            return handle_wordcloud_generation(wordcloud_img)
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        cv_text = document_text(cv_document)
+        if cv_text and job_description:
+            with worker_slot():
+                analysis = session_analysis(cv_text, job_description, stored_scores)
+                job_keywords = analysis["job_keywords"]
+                if not job_keywords:
+                    return handle_analysis_run(None)
+                src = generate_wordcloud_jd(job_keywords)
+            return handle_wordcloud_generation(src)
+    except Exception:
+        return word_cloud_error("job description")
     return handle_analysis_run(None)
 
 
@@ -0,0 +1,96 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    skills_match: {
+        // Show the stored similarity score for the selected mode (lexical or
+        // semantic) in green or red against the match threshold. Runs in the
+        // browser on every slider move or mode switch.
+        colour_score: function (scores, threshold, mode) {
+            var message = {
+                color: "black",
+                fontFamily: "Arial",
+                fontSize: "20px",
+                textAlign: "center",
+            };
+            if (scores === null || scores === undefined) {
+                return ["Awaiting Analysis run", message];
+            }
+            var score = scores[mode];
+            if (score === null || score === undefined) {
+                return ["No semantic model trained", message];
+            }
+            return [
+                Math.round(score) + "%",
+                {
+                    color: score >= threshold ? "green" : "red",
+                    fontFamily: "Arial",
+                    fontSize: "128px",
+                    textAlign: "center",
+                },
+            ];
+        },
+
+        // Post an uploaded CV to the server's /upload/cv route as multipart form
+        // data and show the extracted text. dcc.Upload has already read the file
+        // into a data URL, which the browser turns back into the file's bytes.
+        upload_cv: function (contents, filename) {
+            var no_update = window.dash_clientside.no_update;
+            if (!contents) {
+                return [no_update, no_update];
+            }
+            var config = JSON.parse(
+                document.getElementById("_dash-config").textContent
+            );
+            var url = config.requests_pathname_prefix + "upload/cv?text=1";
+            return fetch(contents)
+                .then(function (response) {
+                    return response.blob();
+                })
+                .then(function (blob) {
+                    var form = new FormData();
+                    form.append("file", blob, filename || "cv");
+                    return fetch(url, { method: "POST", body: form });
+                })
+                .then(function (response) {
+                    return response.json().then(function (body) {
+                        if (!response.ok) {
+                            throw new Error(body.error || response.statusText);
+                        }
+                        return [
+                            body.text,
+                            { id: body.id, filename: body.filename, text: body.text },
+                        ];
+                    });
+                })
+                .catch(function (error) {
+                    console.error("CV upload failed:", error);
+                    return ["", null];
+                });
+        },
+
+        // What the Analyze callbacks get for the CV: the uploaded document's ID
+        // while the text box still holds its text, otherwise the text as edited.
+        // Comparing the strings is cheap next to posting them.
+        cv_document: function (cv_text, upload) {
+            if (!cv_text) {
+                return null;
+            }
+            if (upload && upload.text === cv_text) {
+                return { id: upload.id };
+            }
+            return { text: cv_text };
+        },
+
+        // A random ID for this page load, sent with every Analyze click so
+        // that Dash keys the background jobs of different sessions apart.
+        session_id: function () {
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        },
+
+        enable_buttons: function (cv_text, job_description) {
+            var empty = !(cv_text && job_description);
+            return [empty, empty];
+        },
+    },
+});
@@ -0,0 +1,527 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Drive the app's callback endpoint with many concurrent simulated users.
+
+Each user session replays what the browser sends to the server: uploading a CV
+(a multipart POST to /upload/cv, see uploads.py), then through
+/_dash-update-component clicking Analyze (update_radar_graph, update_word_cloud
+and update_word_cloud_jd at once, with the uploaded CV's document ID) and
+clicking it again. Background callbacks are polled at their own interval until
+the result is ready, as dash-renderer does, so their latency includes queueing
+for a job. The threshold slider and the Analyze button state are clientside
+callbacks and send nothing to the server.
+
+Sessions are generated from synthetic CVs and job descriptions (a few
+distinct ones, so later uploads are recognised as returning CVs and sessions
+analyse the same pairs at once, each with its own session ID as the browser
+has) and can be saved with --record and replayed with --replay. For each
+callback the throughput, p50, p95 and p99 latency and error rate are
+reported.
+
+Against a running server:
+
+    python benchmarks/loadtest.py --url http://127.0.0.1:8051 --concurrency 8
+
+Or start gunicorn for each combination of web worker processes, threads per
+worker and background job slots (SKILLS_MATCH_WORKERS, see jobs.py; as
+configured in the environment unless --job-slots is given):
+
+    python benchmarks/loadtest.py --workers 1 2 4 --threads 1 4 --sessions 100
+    python benchmarks/loadtest.py --workers 2 --job-slots 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jobs import WORKERS as JOB_SLOTS  # noqa: E402
+from synthetic import generate_cv, generate_jd, to_docx  # noqa: E402
+
+ENDPOINT = "/_dash-update-component"
+UPLOAD = "/upload/cv"
+# The callbacks an Analyze click triggers together
+ANALYZE = ("update_radar_graph", "update_word_cloud", "update_word_cloud_jd")
+
+
+class Connection:
+    """
+    Minimal keep-alive HTTP/1.1 client on asyncio streams.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", content_type="application/json"):
+        """
+        Return (status, body) for one request, reconnecting if the server
+        closed the connection since the last one.
+        """
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(
+                    self.host, self.port
+                )
+            try:
+                return await self._exchange(method, path, body, content_type)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if not reused or attempt:
+                    raise
+
+    async def _exchange(self, method, path, body, content_type):
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            "Accept-Encoding: gzip\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status_line = await self.reader.readuntil(b"\r\n")
+        version, status = status_line.decode("latin-1").split()[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if version == "HTTP/1.0" or not keep_alive:
+            await self.close()
+        if headers.get("content-encoding") == "gzip":
+            data = gzip.decompress(data)
+        return int(status), data
+
+
+def load_callbacks():
+    """
+    Return {callback name: spec} for the app's server-side callbacks, with
+    the output, inputs, state and polling interval the browser would use.
+    """
+    import app
+
+    callbacks = {}
+    for output, spec in app.app.callback_map.items():
+        if "callback" not in spec:
+            continue
+        outputs = [
+            {"id": part.rsplit(".", 1)[0], "property": part.rsplit(".", 1)[1]}
+            for part in output.strip(".").split("...")
+        ]
+        interval = (spec.get("long") or {}).get("interval")
+        callbacks[spec["callback"].__name__] = {
+            "output": output,
+            "outputs": outputs if output.startswith("..") else outputs[0],
+            "inputs": spec["inputs"],
+            "state": spec["state"],
+            "interval": interval / 1000 if interval else None,
+        }
+    return callbacks
+
+
+def generate_sessions(count, distinct=10, words=800):
+    """
+    Return count recorded sessions, each a list of steps; each step is a list
+    of callback calls the browser makes at the same time.
+    """
+    sessions = []
+    for number in range(count):
+        seed = number % distinct
+        cv_text = generate_cv(words, seed)
+        job = generate_jd(300, seed)
+        session_id = uuid.uuid4().hex
+        upload = {
+            "filename": f"cv_{seed}.docx",
+            "data": base64.b64encode(to_docx(cv_text)).decode("ascii"),
+        }
+
+        def analyze(clicks):
+            # The radar is drawn after the first click, so later ones are patches
+            style = {"display": "block" if clicks > 1 else "none"}
+            return [
+                {
+                    "callback": name,
+                    "changed": ["analyze-button.n_clicks"],
+                    "values": {
+                        "analyze-button.n_clicks": clicks,
+                        "radar-graph.style": style,
+                        "job-description.value": job,
+                        "session-id.data": session_id,
+                    },
+                }
+                for name in ANALYZE
+            ]
+
+        sessions.append(
+            [
+                [{"callback": "upload_cv", "upload": upload}],
+                analyze(1),
+                analyze(2),
+            ]
+        )
+    return sessions
+
+
+def multipart_body(upload):
+    """
+    Return (body, content type) of a multipart form posting an upload as "file".
+    """
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; '
+        f'filename="{upload["filename"]}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    )
+    body = (
+        head.encode("utf-8")
+        + base64.b64decode(upload["data"])
+        + f"\r\n--{boundary}--\r\n".encode("ascii")
+    )
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def request_body(spec, call, session_values=None):
+    # Values the session learnt from the server, such as the uploaded CV's ID
+    values = {**(session_values or {}), **call["values"]}
+
+    def props(items):
+        return [
+            {**item, "value": values.get(f"{item['id']}.{item['property']}")}
+            for item in items
+        ]
+
+    return {
+        "output": spec["output"],
+        "outputs": spec["outputs"],
+        "inputs": props(spec["inputs"]),
+        "state": props(spec["state"]),
+        "changedPropIds": call["changed"],
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        # {(callback, error message): count}
+        self.failures = Counter()
+
+    def record(self, name, seconds, error=None):
+        self.latencies.setdefault(name, [])
+        self.errors.setdefault(name, 0)
+        if error is not None:
+            self.errors[name] += 1
+            self.failures[name, error] += 1
+        else:
+            self.latencies[name].append(seconds)
+
+    def summary(self, elapsed):
+        results = {}
+        for name, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            total = len(ordered) + self.errors[name]
+            results[name] = {
+                "requests": total,
+                "errors": self.errors[name],
+                "error_rate": self.errors[name] / total if total else 0.0,
+                "per_second": len(ordered) / elapsed,
+                "p50": percentile(ordered, 50),
+                "p95": percentile(ordered, 95),
+                "p99": percentile(ordered, 99),
+            }
+        return results
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+async def upload_cv(connection, call, stats, session_values):
+    """
+    Post a CV to the upload route and keep its document ID for the callbacks.
+    """
+    body, content_type = multipart_body(call["upload"])
+    start = time.perf_counter()
+    try:
+        status, data = await connection.request("POST", UPLOAD, body, content_type)
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}")
+        session_values["cv-document.data"] = {"id": json.loads(data)["id"]}
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        stats.record(call["callback"], time.perf_counter() - start, error)
+        return
+    stats.record(call["callback"], time.perf_counter() - start)
+
+
+async def call_callback(connection, spec, call, stats, timeout, session_values=None):
+    """
+    Make one callback call, polling a background callback until it finishes.
+    """
+    body = json.dumps(request_body(spec, call, session_values)).encode()
+    start = time.perf_counter()
+    path = ENDPOINT
+    try:
+        while True:
+            status, data = await connection.request("POST", path, body)
+            if status == 204:
+                break
+            if status != 200:
+                raise RuntimeError(f"HTTP {status}")
+            payload = json.loads(data)
+            if "response" in payload or spec["interval"] is None:
+                break
+            if "cacheKey" in payload:
+                query = {"cacheKey": payload["cacheKey"], "job": payload["job"]}
+                path = f"{ENDPOINT}?{urlencode(query)}"
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(call["callback"])
+            await asyncio.sleep(spec["interval"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        stats.record(call["callback"], time.perf_counter() - start, error)
+        return
+    stats.record(call["callback"], time.perf_counter() - start)
+
+
+async def run_load(url, sessions, callbacks, concurrency, timeout=120):
+    """
+    Replay sessions with at most concurrency users at a time. Returns
+    (Stats, elapsed seconds).
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    queue = asyncio.Queue()
+    for session in sessions:
+        queue.put_nowait(session)
+    stats = Stats()
+
+    async def user():
+        # One connection per request a step makes at once, as a browser would
+        width = max(len(step) for session in sessions for step in session)
+        connections = [Connection(host, port) for _ in range(width)]
+        try:
+            while not queue.empty():
+                session = queue.get_nowait()
+                session_values = {}
+                for step in session:
+                    await asyncio.gather(
+                        *(
+                            (
+                                upload_cv(connection, call, stats, session_values)
+                                if "upload" in call
+                                else call_callback(
+                                    connection,
+                                    callbacks[call["callback"]],
+                                    call,
+                                    stats,
+                                    timeout,
+                                    session_values,
+                                )
+                            )
+                            for connection, call in zip(connections, step)
+                        )
+                    )
+        finally:
+            for connection in connections:
+                await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return stats, time.perf_counter() - start
+
+
+def wait_until_up(url, process, timeout=120):
+    from urllib.request import urlopen
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("the server exited during startup")
+        try:
+            with urlopen(url + "/_dash-layout", timeout=5):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit(f"the server did not start within {timeout}s")
+
+
+def start_gunicorn(workers, threads, port, job_slots=JOB_SLOTS):
+    """
+    Start gunicorn serving the app with this many workers and threads, and
+    this many background jobs running at once.
+    """
+    env = dict(os.environ, SKILLS_MATCH_WORKERS=str(job_slots))
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "app:server",
+        "--workers",
+        str(workers),
+        "--threads",
+        str(threads),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--timeout",
+        "300",
+    ]
+    return subprocess.Popen(
+        command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+
+def report(results, elapsed, sessions, label=""):
+    print(f"\n{label}{sessions} sessions in {elapsed:.1f}s")
+    print(
+        f"{'callback':<24}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<24}{result['requests']:>9}{result['per_second']:>8.1f}"
+            f"{result['p50'] * 1000:>9.0f}{result['p95'] * 1000:>9.0f}"
+            f"{result['p99'] * 1000:>9.0f}{result['error_rate']:>8.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8051")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--distinct", type=int, default=10, help="distinct CVs")
+    parser.add_argument("--words", type=int, default=800, help="words per CV")
+    parser.add_argument("--record", help="save the generated sessions to this file")
+    parser.add_argument("--replay", help="replay sessions saved with --record")
+    parser.add_argument(
+        "--workers", type=int, nargs="+", help="start gunicorn with these worker counts"
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "--job-slots",
+        type=int,
+        nargs="+",
+        default=[JOB_SLOTS],
+        help="background jobs run at once, for gunicorn (SKILLS_MATCH_WORKERS)",
+    )
+    parser.add_argument("--port", type=int, default=8060, help="port for gunicorn")
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="seconds before a call fails"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            sessions = json.load(f)
+    else:
+        sessions = generate_sessions(args.sessions, args.distinct, args.words)
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(sessions, f)
+    callbacks = load_callbacks()
+    runs = []
+
+    def sweep(url, server):
+        for concurrency in args.concurrency:
+            stats, elapsed = asyncio.run(
+                run_load(url, sessions, callbacks, concurrency, args.timeout)
+            )
+            run = {**server, "concurrency": concurrency, "elapsed": elapsed}
+            run["callbacks"] = stats.summary(elapsed)
+            runs.append(run)
+            label = " ".join(
+                f"{k}={v}" for k, v in {**server, "concurrency": concurrency}.items()
+            )
+            report(run["callbacks"], elapsed, len(sessions), f"{label}: ")
+            for (name, error), count in stats.failures.most_common(5):
+                print(f"  {count} x {name}: {error}")
+
+    if args.workers:
+        url = f"http://127.0.0.1:{args.port}"
+        for workers in args.workers:
+            for threads in args.threads:
+                for job_slots in args.job_slots:
+                    process = start_gunicorn(workers, threads, args.port, job_slots)
+                    server = {
+                        "workers": workers,
+                        "threads": threads,
+                        "job_slots": job_slots,
+                    }
+                    try:
+                        wait_until_up(url, process)
+                        sweep(url, server)
+                    finally:
+                        process.terminate()
+                        process.wait()
+    else:
+        sweep(args.url, {})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"sessions": len(sessions), "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
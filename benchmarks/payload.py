@@ -0,0 +1,158 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Measure the bytes the server sends to the browser.
+
+For the Analyze radar callback on synthetic CVs of several sizes, compares the
+figure with one axis per shared term (how it used to be drawn), the bounded
+first render and the Patch sent on later clicks, raw and gzipped; "vs before"
+is the uncompressed all-axes response over what is sent now. It also
+fetches the page, layout and JavaScript bundles from the Flask server with and
+without Accept-Encoding: gzip.
+
+    python benchmarks/payload.py --words 300 1500 6000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_cv, generate_jd  # noqa: E402
+
+
+def _size(outputs):
+    """
+    Return the raw size of callback outputs as Dash serializes them, and the
+    size the server sends (gzipped unless it is too small to be worth it).
+    """
+    from dash import no_update
+    from plotly.io.json import to_json_plotly
+
+    from compression import LEVEL, MIN_BYTES
+
+    # Dash leaves no_update outputs out of the response
+    body = to_json_plotly([o for o in outputs if o is not no_update]).encode()
+    if len(body) < MIN_BYTES:
+        return len(body), len(body)
+    return len(body), len(gzip.compress(body, LEVEL))
+
+
+def radar_payloads(words, seed=0):
+    """
+    Return {case: (raw bytes, bytes sent)} for the radar callback on one pair.
+    """
+    import app
+    from analysis import analyse
+
+    cv_text = generate_cv(words, seed)
+    job_description = generate_jd(max(300, words // 2), seed)
+    analysis = analyse(cv_text, job_description)
+    if analysis["common_skills"]:
+        common, job = analysis["common_skills"], analysis["job_skills"]
+    else:
+        common, job = analysis["common_keywords"], analysis["job_keywords"]
+    theta = list(common)
+    unbounded = app.radar_figure(
+        theta, [common[k] for k in theta], [job[k] for k in theta]
+    )
+    scores = {"lexical": float(analysis["similarity_score"]), "semantic": None}
+    styles = [{"display": "block"}, {"display": "none"}]
+
+    def callback(style):
+        return app.update_radar_graph(
+            lambda message: None,
+            1,
+            {"text": cv_text},
+            job_description,
+            style,
+            None,
+            "s",
+        )
+
+    return {
+        "axes": (len(theta), min(len(theta), app.RADAR_TOP_N)),
+        "all axes": _size([unbounded, scores, *styles]),
+        "first render": _size(callback({"display": "none"})),
+        "repeat (Patch)": _size(callback({"display": "block"})),
+    }
+
+
+def server_payloads():
+    """
+    Return {path: (identity bytes, gzip bytes)} for the page and its assets.
+    """
+    import app
+
+    client = app.server.test_client()
+    page = client.get("/").get_data(as_text=True)
+    paths = ["/", "/_dash-layout", "/_dash-dependencies"]
+    paths += re.findall(r'src="(/_dash-component-suites/[^"]+)"', page)
+    results = {}
+    for path in paths:
+        plain = client.get(path, headers={"Accept-Encoding": "identity"})
+        packed = client.get(path, headers={"Accept-Encoding": "gzip"})
+        results[path] = (len(plain.get_data()), len(packed.get_data()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[300, 1500, 6000])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    record = {"radar": {}, "server": server_payloads()}
+    print(
+        f"{'radar callback':<32}{'axes':>6}{'bytes':>10}{'sent':>10}{'vs before':>11}"
+    )
+    for words in args.words:
+        payloads = radar_payloads(words)
+        record["radar"][words] = payloads
+        before = payloads["all axes"][0]
+        for case in ("all axes", "first render", "repeat (Patch)"):
+            raw, packed = payloads[case]
+            axes = payloads["axes"][case != "all axes"]
+            print(
+                f"{f'{words} words, {case}':<32}{axes:>6}{raw:>10}{packed:>10}"
+                f"{before / packed:>10.1f}x"
+            )
+
+    print(f"\n{'server response':<60}{'bytes':>10}{'gzip':>10}{'ratio':>8}")
+    total_plain = total_packed = 0
+    for path, (plain, packed) in record["server"].items():
+        total_plain += plain
+        total_packed += packed
+        name = path if len(path) <= 58 else "..." + path[-55:]
+        print(f"{name:<60}{plain:>10}{packed:>10}{plain / packed:>7.1f}x")
+    ratio = total_plain / total_packed
+    print(f"{'total':<60}{total_plain:>10}{total_packed:>10}{ratio:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Time each stage of the matching pipeline on synthetic CVs of several sizes.
+
+Stages are PDF and Word extraction (what /upload/cv runs on an uploaded file),
+extract_keywords, calculate_match_percentage, word cloud
+rendering, end to end from PDF bytes to both word clouds, and edit_rescore:
+re-scoring a CV after a one-line edit with the counts kept from the previous
+version (see incremental.py). Caches are bypassed so every call does the full
+work. For each stage and CV size the
+median and p95 time, throughput and peak traced memory are reported.
+
+Results can be saved as a baseline and later runs compared with it; a stage
+whose median is slower than its baseline by more than the threshold is flagged
+and the exit status is non-zero.
+
+    python benchmarks/pipeline.py --save-baseline
+    python benchmarks/pipeline.py --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_cv, generate_jd, to_docx, to_pdf  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", ".baseline.json")
+
+
+def _stages():
+    """
+    Return {name: (function of one document, input size function)}.
+
+    Each function takes a document dict with the CV as text, PDF and Word bytes
+    plus a job description.
+    """
+    from analysis import calculate_match_percentage
+    from extraction import extract_text
+    from keywords import extract_keywords
+    from wordclouds import (
+        MAX_WORDS,
+        WORDCLOUD_FORMAT,
+        WORDCLOUD_HEIGHT,
+        WORDCLOUD_WIDTH,
+        render_wordcloud,
+    )
+
+    def wordcloud(keywords, colormap):
+        return render_wordcloud(
+            dict(keywords.most_common(MAX_WORDS)),
+            colormap,
+            WORDCLOUD_WIDTH,
+            WORDCLOUD_HEIGHT,
+            WORDCLOUD_FORMAT,
+        )
+
+    def end_to_end(doc):
+        cv_text = extract_text(doc["pdf"])
+        cv_keywords = extract_keywords(cv_text)
+        job_keywords = extract_keywords(doc["jd"])
+        calculate_match_percentage(cv_text, doc["jd"])
+        wordcloud(cv_keywords, "Greens")
+        wordcloud(job_keywords, "Blues")
+
+    def edit_rescore(doc):
+        # Alternate between the CV and its edited copy, so every call is an edit
+        doc["edits"] += 1
+        text = doc["edited"] if doc["edits"] % 2 else doc["text"]
+        doc["match"].update(text, doc["jd"])
+
+    def text_bytes(doc):
+        return len(doc["text"].encode("utf-8"))
+
+    return {
+        "extract_pdf": (lambda doc: extract_text(doc["pdf"]), lambda d: len(d["pdf"])),
+        "extract_docx": (
+            lambda doc: extract_text(doc["docx"]),
+            lambda d: len(d["docx"]),
+        ),
+        "extract_keywords": (lambda doc: extract_keywords(doc["text"]), text_bytes),
+        "match_percentage": (
+            lambda doc: calculate_match_percentage(doc["text"], doc["jd"]),
+            text_bytes,
+        ),
+        "wordcloud": (
+            lambda doc: wordcloud(doc["keywords"], "Greens"),
+            text_bytes,
+        ),
+        "end_to_end": (end_to_end, lambda d: len(d["pdf"])),
+        "edit_rescore": (edit_rescore, text_bytes),
+    }
+
+
+def make_documents(words, count):
+    """
+    Return count synthetic CVs of about this many words, with job descriptions
+    and a copy of the CV with one line edited.
+    """
+    from incremental import IncrementalMatch
+    from keywords import extract_keywords
+
+    documents = []
+    for seed in range(count):
+        text = generate_cv(words, seed)
+        lines = text.splitlines()
+        lines[len(lines) // 2] += " Led the migration of batch jobs to Kubernetes."
+        job_description = generate_jd(300, seed)
+        match = IncrementalMatch()
+        match.update(text, job_description)
+        documents.append(
+            {
+                "text": text,
+                "pdf": to_pdf(text),
+                "docx": to_docx(text),
+                "jd": job_description,
+                "keywords": extract_keywords(text),
+                "edited": "\n".join(lines),
+                "match": match,
+                "edits": 0,
+            }
+        )
+    return documents
+
+
+def measure(function, size, documents, repeat):
+    """
+    Time function over the documents and trace its peak memory on one call.
+    """
+    # Warm up lazy imports and first-use loading outside the timings
+    function(documents[0])
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(documents[i % len(documents)])
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(documents[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    median = statistics.median(timings)
+    mean_bytes = statistics.mean(size(doc) for doc in documents)
+    return {
+        "median": median,
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "docs_per_second": 1 / median if median else 0.0,
+        "mb_per_second": mean_bytes / median / 1e6 if median else 0.0,
+        "input_bytes": int(mean_bytes),
+        "peak_memory": peak,
+    }
+
+
+def run(sizes, count, repeat, selected=None):
+    """
+    Return {"<stage>/<words>": result} for every stage and CV size.
+    """
+    stages = _stages()
+    results = {}
+    for words in sizes:
+        documents = make_documents(words, count)
+        for name, (function, size) in stages.items():
+            if selected and name not in selected:
+                continue
+            results[f"{name}/{words}"] = measure(function, size, documents, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the keys whose median is more than threshold slower than the baseline.
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before and result["median"] > before["median"] * (1 + threshold):
+            regressions.append(key)
+    return regressions
+
+
+def report(results, baseline=None, regressions=()):
+    print(
+        f"{'stage':<28}{'median ms':>11}{'p95 ms':>10}{'docs/s':>10}"
+        f"{'MB/s':>9}{'peak MB':>9}{'vs base':>9}"
+    )
+    for key, result in results.items():
+        line = (
+            f"{key:<28}{result['median'] * 1000:>11.2f}{result['p95'] * 1000:>10.2f}"
+            f"{result['docs_per_second']:>10.1f}{result['mb_per_second']:>9.2f}"
+            f"{result['peak_memory'] / 1e6:>9.1f}"
+        )
+        before = (baseline or {}).get(key)
+        if before:
+            change = result["median"] / before["median"] - 1
+            line += f"{change:>+9.0%}"
+        if key in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[300, 1500, 6000])
+    parser.add_argument("--docs", type=int, default=5, help="CVs per size")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per stage")
+    parser.add_argument("--stages", nargs="+", help="only run these stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store this run as the baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="flag stages slower than the baseline by more than this fraction",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.words, args.docs, args.repeat, args.stages)
+    record = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        report(results)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline or {}, args.threshold)
+    report(results, baseline, regressions)
+    if regressions:
+        print(f"{len(regressions)} stage(s) more than {args.threshold:.0%} slower")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
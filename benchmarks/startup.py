@@ -0,0 +1,90 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Measure how long a fresh worker takes to import app.py and serve its first page.
+
+Each run starts a new interpreter with outbound network connections disabled, so
+anything that tries to download at import time fails the check. Exits non-zero
+when the median startup time is over the budget.
+
+    python benchmarks/startup.py --runs 5 --budget 1.0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import socket, time
+
+def _no_network(*args, **kwargs):
+    raise OSError("network access during startup")
+
+socket.socket.connect = _no_network
+socket.create_connection = _no_network
+
+start = time.perf_counter()
+import app
+app.server.test_client().get("/")
+print(time.perf_counter() - start)
+"""
+
+
+def measure(runs):
+    """
+    Return the startup time in seconds of each of runs fresh interpreters.
+    """
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="median startup budget in seconds"
+    )
+    args = parser.parse_args()
+
+    timings = measure(args.runs)
+    median = statistics.median(timings)
+    print(
+        f"startup: median {median:.3f}s, min {min(timings):.3f}s, "
+        f"max {max(timings):.3f}s over {args.runs} runs (budget {args.budget:.3f}s)"
+    )
+    if median > args.budget:
+        print("startup budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
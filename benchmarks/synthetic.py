@@ -0,0 +1,269 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Generate synthetic CVs and job descriptions for benchmarks.
+
+Documents are built from a seeded random generator, so the same seed always
+gives the same corpus. Sentences mix everyday English with skills drawn from a
+Zipf-like distribution, as real CVs mention a few skills often and many rarely.
+to_pdf() and to_docx() write minimal but valid files that the app's extractors
+read, without needing a PDF or Word library.
+
+    python benchmarks/synthetic.py fixtures --count 20 --words 300 1500 6000
+"""
+
+import argparse
+import json
+import os
+import random
+import zipfile
+from io import BytesIO
+
+SKILLS = """
+python java javascript typescript sql nosql postgresql mysql mongodb redis
+kafka spark hadoop airflow dbt snowflake bigquery aws azure gcp docker
+kubernetes terraform ansible jenkins git linux bash django flask fastapi
+react angular vue nodejs graphql rest microservices pandas numpy scikit-learn
+tensorflow pytorch nlp statistics tableau powerbi excel agile scrum jira
+leadership communication stakeholder management mentoring budgeting
+forecasting negotiation compliance gdpr security networking ci/cd testing
+selenium pytest devops sre monitoring prometheus grafana elasticsearch
+""".split()
+
+FILLER = """
+the a an and or of to in for with on at by from as is was were be been have
+has had will would can could should team project projects company role work
+worked working experience years delivered delivering built building designed
+designing led leading improved improving responsible business customers data
+systems platform services product products new across multiple key strong
+large scale high quality performance process processes development support
+including within using across day ensuring successful results clients teams
+""".split()
+
+ROLES = [
+    "Software Engineer",
+    "Data Scientist",
+    "Data Engineer",
+    "DevOps Engineer",
+    "Project Manager",
+    "Business Analyst",
+]
+
+SECTIONS = ["Profile", "Experience", "Skills", "Education", "Achievements"]
+
+
+def _skill_weights(rng):
+    # Shuffle so each document favours different skills, then weight by 1/rank
+    skills = SKILLS[:]
+    rng.shuffle(skills)
+    return skills, [1 / rank for rank in range(1, len(skills) + 1)]
+
+
+def _sentence(rng, skills, weights, skill_ratio):
+    length = rng.randint(8, 22)
+    words = []
+    for _ in range(length):
+        if rng.random() < skill_ratio:
+            words.append(rng.choices(skills, weights)[0])
+        else:
+            words.append(rng.choice(FILLER))
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def _document(rng, words, headings, skill_ratio):
+    skills, weights = _skill_weights(rng)
+    lines = []
+    count = 0
+    while count < words:
+        if count == 0 or rng.random() < 0.08:
+            lines.append("")
+            lines.append(rng.choice(headings))
+        sentence = _sentence(rng, skills, weights, skill_ratio)
+        lines.append(sentence)
+        count += sentence.count(" ") + 1
+    return "\n".join(lines).strip()
+
+
+def generate_cv(words=1500, seed=0):
+    """
+    Return a synthetic CV of about this many words.
+    """
+    rng = random.Random(f"cv:{seed}")
+    return f"Curriculum Vitae\n{rng.choice(ROLES)}\n" + _document(
+        rng, words, SECTIONS, skill_ratio=0.2
+    )
+
+
+def generate_jd(words=300, seed=0):
+    """
+    Return a synthetic job description of about this many words.
+    """
+    rng = random.Random(f"jd:{seed}")
+    headings = ["About the role", "Requirements", "Nice to have", "Benefits"]
+    return f"{rng.choice(ROLES)}\n" + _document(rng, words, headings, skill_ratio=0.3)
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text, width):
+    for paragraph in text.splitlines():
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                yield line
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        yield line
+
+
+def to_pdf(text, lines_per_page=50, width=90):
+    """
+    Return text laid out as a multi-page PDF with one Helvetica text stream per page.
+    """
+    lines = list(_wrap(text, width))
+    pages = [
+        lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)
+    ] or [[]]
+    # Objects 1-3 are the catalog, the page tree and the font; each page then
+    # takes two objects, the page and its content stream
+    objects = {}
+    kids = []
+    for number, page in enumerate(pages):
+        page_id, stream_id = 4 + 2 * number, 5 + 2 * number
+        kids.append(f"{page_id} 0 R")
+        body = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        body += [f"({_pdf_escape(line)}) Tj T*" for line in page]
+        body.append("ET")
+        stream = "\n".join(body).encode("latin-1", "replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {stream_id} 0 R >>"
+        ).encode()
+        objects[stream_id] = (
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(kids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode()
+    objects[3] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for object_id in range(1, len(objects) + 1):
+        offsets.append(out.tell())
+        out.write(f"{object_id} 0 obj\n".encode() + objects[object_id] + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n".encode()
+    )
+    return out.getvalue()
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    "</Relationships>"
+)
+
+
+def to_docx(text):
+    """
+    Return text as a Word document with one paragraph per line.
+    """
+    from xml.sax.saxutils import escape
+
+    paragraphs = "".join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>'
+        for line in text.splitlines()
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+        f'wordprocessingml/2006/main"><w:body>{paragraphs}</w:body></w:document>'
+    )
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        docx.writestr("_rels/.rels", _RELS)
+        docx.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+def write_fixtures(directory, count=10, sizes=(300, 1500, 6000), jd_words=300):
+    """
+    Write CVs as .txt, .pdf and .docx for each size, plus cvs.jsonl and jds.jsonl.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "cvs.jsonl"), "w", encoding="utf-8") as cvs:
+        for words in sizes:
+            for seed in range(count):
+                cv_id = f"cv_{words}_{seed:04d}"
+                text = generate_cv(words, seed)
+                cvs.write(json.dumps({"id": cv_id, "text": text}) + "\n")
+                base = os.path.join(directory, cv_id)
+                with open(base + ".txt", "w", encoding="utf-8") as f:
+                    f.write(text)
+                with open(base + ".pdf", "wb") as f:
+                    f.write(to_pdf(text))
+                with open(base + ".docx", "wb") as f:
+                    f.write(to_docx(text))
+    with open(os.path.join(directory, "jds.jsonl"), "w", encoding="utf-8") as jds:
+        for seed in range(count):
+            text = generate_jd(jd_words, seed)
+            jds.write(json.dumps({"id": f"jd_{seed:04d}", "text": text}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=10, help="CVs per size")
+    parser.add_argument("--words", type=int, nargs="+", default=[300, 1500, 6000])
+    parser.add_argument("--jd-words", type=int, default=300)
+    args = parser.parse_args()
+
+    write_fixtures(args.directory, args.count, args.words, args.jd_words)
+    print(
+        f"{args.count * len(args.words)} CVs and {args.count} JDs -> {args.directory}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Root directory for the caches that are shared between processes
+CACHE_DIR = os.environ.get("SKILLS_MATCH_CACHE_DIR", ".cache")
+
+_MISSING = object()
+
+
+def content_hash(*parts):
+    """
+    Return a stable hex digest for one or more pieces of text.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def pid_alive(pid):
+    """
+    Return whether process pid is running (a zombie waiting to be reaped is not).
+    """
+    import psutil
+
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache with an optional time-to-live per entry.
+
+    Dash runs callbacks on several threads, so get_or_compute() holds a lock per
+    key while the value is built. Callbacks that ask for the same key at the
+    same time wait for the first one instead of repeating the work.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0]):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for key, calling compute() once on a miss.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have filled the entry while we waited
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and not self._expired(entry[0]):
+                    self._data.move_to_end(key)
+                    # The miss above was really a wait on a shared computation
+                    self.misses -= 1
+                    self.hits += 1
+                    return entry[1]
+            try:
+                value = compute()
+                self.set(key, value)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return hit/miss counts and the current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Cache on local disk, shared by every process, with the LRUCache interface.
+
+    Backed by diskcache (SQLite plus files) with least-recently-used eviction
+    once size_limit bytes are stored. get_or_compute() takes a lock in the
+    cache itself, so processes asking for the same key compute it only once.
+    Hit and miss counts cover every process. They are added up in memory and
+    written with the metrics (see metrics.py) rather than in the cache, so a
+    lookup writes nothing and the counts are never evicted or counted in len().
+
+    Caches are created at import, before gunicorn (see gunicorn.conf.py) or the
+    job forkserver forks, and a SQLite connection must not be used on both
+    sides of a fork, so each process opens the cache itself on first use.
+    """
+
+    def __init__(self, directory, size_limit=256 * 1024 * 1024, ttl=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.size_limit = size_limit
+        self._disk = None
+        self._pid = None
+
+    @property
+    def _cache(self):
+        if self._pid != os.getpid():
+            import diskcache
+
+            self._disk = diskcache.Cache(
+                self.directory,
+                size_limit=self.size_limit,
+                eviction_policy="least-recently-used",
+            )
+            self._pid = os.getpid()
+        return self._disk
+
+    def _count(self, name):
+        from metrics import count
+
+        count(("cache", self.directory, name))
+
+    def get(self, key, default=None):
+        value = self._cache.get(key, default=_MISSING, retry=True)
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    def set(self, key, value):
+        self._cache.set(key, value, expire=self.ttl, retry=True)
+
+    @contextmanager
+    def _key_lock(self, key, lock_timeout, poll_interval=0.05):
+        """
+        Hold the lock computing key, across processes and threads.
+
+        Like the job slots in jobs.py, the lock records its owner's pid and a
+        lock whose owner has died is reclaimed at once: Dash terminates a job
+        superseded by another click, possibly while it holds the lock. The
+        lock also expires after lock_timeout seconds in case the pid is reused.
+        """
+        cache = self._cache
+        name = f"__lock__:{key}"
+        owner = (os.getpid(), threading.get_ident(), time.time_ns())
+        while not cache.add(name, owner, expire=lock_timeout, retry=True):
+            holder = cache.get(name, retry=True)
+            if holder is not None and not pid_alive(holder[0]):
+                with cache.transact(retry=True):
+                    if cache.get(name) == holder:
+                        cache.delete(name)
+                continue
+            time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            with cache.transact(retry=True):
+                if cache.get(name) == owner:
+                    cache.delete(name)
+
+    def get_or_compute(self, key, compute, lock_timeout=120, keep=None):
+        """
+        Return the cached value for key, calling compute() once on a miss.
+
+        keep, if given, is called with the computed value, which is only cached
+        if it returns true (a result built from a failed download, say).
+        """
+        value = self._cache.get(key, default=_MISSING, retry=True)
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+        with self._key_lock(key, lock_timeout):
+            value = self._cache.get(key, default=_MISSING, retry=True)
+            if value is not _MISSING:
+                # Computed by another process while we waited
+                self._count("hits")
+                return value
+            self._count("misses")
+            value = compute()
+            if keep is None or keep(value):
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        self._cache.clear(retry=True)
+
+    def stats(self):
+        """
+        Return hit/miss counts across all processes and the current size.
+        """
+        from metrics import total
+
+        hits = total(("cache", self.directory, "hits"))
+        misses = total(("cache", self.directory, "misses"))
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "size": self._cache.volume(),
+            "maxsize": self.size_limit,
+        }
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,94 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+gzip compression of the server's text responses: callback JSON from
+/_dash-update-component, the Dash layout and the component JavaScript bundles.
+
+Bundles carry an ETag, so each one is compressed once and the compressed body
+is kept for later requests. Responses that are already encoded (the JSON API
+compresses its own), streamed or smaller than MIN_BYTES are sent as they are.
+SKILLS_MATCH_GZIP=0 turns compression off, e.g. behind a proxy that does it.
+"""
+
+import gzip
+import os
+from collections import OrderedDict
+
+from flask import request
+
+ENABLED = os.environ.get("SKILLS_MATCH_GZIP", "1") != "0"
+LEVEL = int(os.environ.get("SKILLS_MATCH_GZIP_LEVEL", 6))
+# Responses smaller than this are not worth compressing
+MIN_BYTES = 1024
+COMPRESSIBLE = (
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "text/",
+)
+CACHE_ENTRIES = 64
+
+_compressed = OrderedDict()
+
+
+def _compress(body, etag):
+    if etag is None:
+        return gzip.compress(body, LEVEL, mtime=0)
+    key = (request.path, etag)
+    if key in _compressed:
+        _compressed.move_to_end(key)
+        return _compressed[key]
+    compressed = gzip.compress(body, LEVEL, mtime=0)
+    _compressed[key] = compressed
+    if len(_compressed) > CACHE_ENTRIES:
+        _compressed.popitem(last=False)
+    return compressed
+
+
+def compress_response(response):
+    """
+    gzip a response if the client accepts it and it is worth compressing.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or not response.mimetype.startswith(COMPRESSIBLE)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    # The quality, so "gzip;q=0" is a refusal rather than a mention
+    if not request.accept_encodings["gzip"]:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_BYTES:
+        return response
+    etag = response.headers.get("ETag") if request.method == "GET" else None
+    response.set_data(_compress(body, etag))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_app(server):
+    """
+    Compress the responses of a Flask server.
+    """
+    if ENABLED:
+        server.after_request(compress_response)
@@ -0,0 +1,245 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Near-duplicate detection for CVs, so re-uploads, lightly edited copies and the
+PDF and Word versions of one CV are stored and indexed as a single document.
+
+Each text is reduced to the set of its five-word shingles and summarised by a
+MinHash signature, whose agreement with another signature estimates the Jaccard
+similarity of the two shingle sets. Signatures are split into bands and hashed
+into buckets (locality-sensitive hashing), so only documents sharing a bucket
+are compared and a lookup does not scan the whole corpus.
+
+Signatures and buckets are kept in the document store (see store.py), so every
+worker sees the CVs already stored. Deduplication needs that store, which is
+off unless SKILLS_MATCH_STORE is set: without it nothing is recorded and every
+upload counts as new. SKILLS_MATCH_DEDUP_THRESHOLD sets the
+estimated similarity at which two CVs count as one; SKILLS_MATCH_DEDUP=0 turns
+deduplication off.
+"""
+
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+ENABLED = os.environ.get("SKILLS_MATCH_DEDUP", "1") != "0"
+THRESHOLD = float(os.environ.get("SKILLS_MATCH_DEDUP_THRESHOLD", 0.9))
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket
+BANDS = 16
+# Largest prime below 2**32; with multipliers below 2**31 the hashes fit uint64
+_PRIME = 4294967291
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """
+    Return the 32-bit hashes of the distinct size-word shingles of text.
+    """
+    words = _WORD.findall(text.lower())
+    grams = {
+        " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+    }
+    grams.discard("")
+    return np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class MinHasher:
+    """
+    MinHash over NUM_PERM universal hash functions (a * x + b) mod prime.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**31, num_perm, dtype=np.uint64)
+
+    def signature(self, text, chunk=4096):
+        """
+        Return the uint32 MinHash signature of text, or None if it has no words.
+        """
+        values = shingles(text)
+        if not len(values):
+            return None
+        signature = np.full(len(self.a), _PRIME, dtype=np.uint64)
+        # In chunks, so a long document never needs a huge temporary matrix
+        for start in range(0, len(values), chunk):
+            block = values[start : start + chunk, None]
+            hashed = (block * self.a + self.b) % _PRIME
+            np.minimum(signature, hashed.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+
+def similarity(signature, other):
+    """
+    Return the estimated Jaccard similarity of two signatures.
+    """
+    return float(np.mean(signature == other))
+
+
+def band_buckets(signature, bands=BANDS):
+    """
+    Return one bucket per band: a signed 64-bit hash of that band's rows.
+    """
+    return [
+        int.from_bytes(
+            hashlib.blake2b(band.tobytes(), digest_size=8).digest(),
+            "big",
+            signed=True,
+        )
+        for band in np.split(signature, bands)
+    ]
+
+
+class LSHIndex:
+    """
+    In-memory LSH buckets for the documents seen by one process.
+    """
+
+    def __init__(self, bands=BANDS):
+        self.bands = bands
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band, bucket in enumerate(band_buckets(signature, self.bands)):
+            self.buckets[band, bucket].append(key)
+
+    def candidates(self, signature):
+        """
+        Return [(key, signature)] for documents sharing a bucket with signature.
+        """
+        keys = set()
+        for band, bucket in enumerate(band_buckets(signature, self.bands)):
+            keys.update(self.buckets.get((band, bucket), ()))
+        return [(key, self.signatures[key]) for key in keys]
+
+
+def best_match(signature, candidates, threshold=THRESHOLD):
+    """
+    Return the (key, similarity) of the most similar candidate at or above
+    threshold, or None.
+    """
+    best = None
+    for key, other in candidates:
+        score = similarity(signature, other)
+        if score >= threshold and (best is None or score > best[1]):
+            best = (key, score)
+    return best
+
+
+class Deduplicator:
+    """
+    Finds the canonical copy of a document among those already stored and,
+    optionally, those seen earlier by this process (for a bulk load whose
+    batches are not stored yet).
+    """
+
+    def __init__(self, kind="cv", store=None, threshold=THRESHOLD, in_memory=True):
+        self.kind = kind
+        self.store = store
+        self.threshold = threshold
+        self.index = LSHIndex() if in_memory else None
+
+    def find(self, signature):
+        """
+        Return ("store", document id, similarity) or ("memory", key, similarity)
+        for the closest earlier copy, or None if the document is new.
+        """
+        matches = []
+        if self.store is not None:
+            rows = self.store.signature_candidates(self.kind, band_buckets(signature))
+            candidates = [(row[0], np.frombuffer(row[1], np.uint32)) for row in rows]
+            match = best_match(signature, candidates, self.threshold)
+            if match is not None:
+                matches.append(("store", *match))
+        if self.index is not None:
+            match = best_match(
+                signature, self.index.candidates(signature), self.threshold
+            )
+            if match is not None:
+                matches.append(("memory", *match))
+        return max(matches, key=lambda m: m[2]) if matches else None
+
+    def remember(self, key, signature):
+        if self.index is not None:
+            self.index.add(key, signature)
+
+
+_hasher = None
+
+
+def get_hasher():
+    global _hasher
+    if _hasher is None:
+        _hasher = MinHasher()
+    return _hasher
+
+
+def signature(text):
+    """
+    Return the MinHash signature of text, or None if it has no words.
+    """
+    return get_hasher().signature(text)
+
+
+def record_duplicate(kind, text, external_id=None):
+    """
+    Store text, or record it as a near-duplicate of a stored document, and
+    return the ID of the stored document it duplicates, or None if it is new.
+
+    The text itself is always what gets analysed: the relation only groups
+    copies, so the corpus and the indexes hold one entry per group.
+    """
+    from store import get_store
+
+    store = get_store()
+    if not ENABLED or store is None or not text or not text.strip():
+        return None
+    doc_id = store.find(kind, text)
+    if doc_id is None:
+        duplicate = store.duplicate_of(kind, text)
+        if duplicate is not None:
+            return duplicate[0]
+    text_signature = signature(text)
+    if text_signature is None:
+        return None
+    if doc_id is None:
+        match = Deduplicator(kind, store, in_memory=False).find(text_signature)
+        if match is not None:
+            _, canonical_id, score = match
+            store.add_duplicate(kind, text, canonical_id, score, external_id)
+            return canonical_id
+        doc_id = store.add(kind, text, external_id)
+    # Documents stored before deduplication get their signature on first sight
+    store.add_signature(doc_id, text_signature.tobytes(), band_buckets(text_signature))
+    return None
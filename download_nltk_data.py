@@ -0,0 +1,33 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Fetch the NLTK resources the app needs into its local data directory.
+
+Run this once when building an image or setting up a checkout. The app itself
+never downloads anything at startup.
+"""
+
+import nltk
+
+from keywords import NLTK_DATA_DIR
+
+if __name__ == "__main__":
+    # WordNet is only used with SKILLS_MATCH_NORMALIZE=lemma
+    for resource in ("stopwords", "punkt", "wordnet"):
+        nltk.download(resource, download_dir=NLTK_DATA_DIR)
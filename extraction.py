@@ -0,0 +1,256 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import os
+import signal
+import threading
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+# Limits on a single CV. A 300-page scanned portfolio should not pin a worker:
+# PDFs are read a page at a time and stop at the page or character cap, Word
+# files are refused if they unzip to more than MAX_UNZIPPED_BYTES, and the
+# whole extraction is stopped once it has run for MAX_SECONDS.
+MAX_FILE_BYTES = int(os.environ.get("SKILLS_MATCH_MAX_FILE_BYTES", 20 * 1024 * 1024))
+MAX_UNZIPPED_BYTES = int(
+    os.environ.get("SKILLS_MATCH_MAX_UNZIPPED_BYTES", 5 * MAX_FILE_BYTES)
+)
+MAX_PDF_PAGES = int(os.environ.get("SKILLS_MATCH_MAX_PDF_PAGES", 50))
+MAX_SECONDS = float(os.environ.get("SKILLS_MATCH_MAX_EXTRACT_SECONDS", 10))
+MAX_CHARS = int(os.environ.get("SKILLS_MATCH_MAX_CHARS", 200_000))
+
+PDF = "pdf"
+DOCX = "docx"
+DOC = "doc"
+
+
+class ExtractionError(ValueError):
+    """
+    Raised when a file is not a supported CV or breaks an extraction limit.
+    """
+
+
+def detect_type(head):
+    """
+    Identify a document from its first bytes rather than its file name.
+    """
+    # Some PDF writers put junk before the header; readers accept it within 1 KB
+    if b"%PDF-" in head[:1024]:
+        return PDF
+    if head.startswith(b"PK\x03\x04"):
+        return DOCX
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return DOC
+    return None
+
+
+def iter_pdf_pages(reader, max_pages=None, max_seconds=None):
+    """
+    Yield the text of each page of an open PdfReader, one page at a time.
+    """
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    for number, page in enumerate(reader.pages):
+        if max_pages is not None and number >= max_pages:
+            return
+        if deadline is not None and time.monotonic() > deadline:
+            return
+        yield page.extract_text() or ""
+
+
+def extract_cv(
+    source,
+    max_bytes=MAX_FILE_BYTES,
+    max_pages=MAX_PDF_PAGES,
+    max_seconds=MAX_SECONDS,
+    max_chars=MAX_CHARS,
+    measure_memory=False,
+    max_unzipped_bytes=MAX_UNZIPPED_BYTES,
+):
+    """
+    Extract text from a Word or PDF CV given as bytes or a binary file object.
+
+    Returns a dict with the text, the detected type, the number of PDF pages
+    read, whether a limit cut the text short and, if measure_memory is set,
+    the peak Python memory used in bytes. Raises ExtractionError if the file
+    breaks a size limit or takes longer than max_seconds to read.
+    """
+    stream = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    if max_bytes is not None and size > max_bytes:
+        raise ExtractionError(f"File is {size} bytes, over the {max_bytes} limit")
+    stream.seek(0)
+    kind = detect_type(stream.read(1024))
+    stream.seek(0)
+    if kind == DOC:
+        raise ExtractionError("Legacy .doc files are not supported, save as .docx")
+    if kind is None:
+        raise ExtractionError("Invalid file type")
+    args = (kind, max_pages, max_chars, max_unzipped_bytes, measure_memory)
+    if max_seconds is None:
+        return _extract(stream, *args)
+    return _with_deadline(max_seconds, stream, *args)
+
+
+class _DeadlineExceeded(BaseException):
+    """
+    Raised by the extraction alarm. Not an Exception, so the broad except
+    clauses inside the PDF reader cannot swallow it.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise _DeadlineExceeded
+
+
+def _with_deadline(seconds, stream, *args):
+    """
+    Run _extract, stopping it after seconds even in the middle of a page.
+
+    In the main thread of a process, such as an ingest worker, a SIGALRM
+    interrupts the reader. Signals cannot be used from the threads that serve
+    web requests, so there the file is read in a child of the background job
+    forkserver, which is killed at the deadline.
+    """
+    timeout = ExtractionError(f"Reading the file took longer than {seconds:g}s")
+    if threading.current_thread() is not threading.main_thread():
+        return _in_child(seconds, timeout, stream, *args)
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        # Repeats, in case an alarm lands in a __del__, which swallows it
+        signal.setitimer(signal.ITIMER_REAL, seconds, 0.1)
+        try:
+            return _extract(stream, *args)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except _DeadlineExceeded:
+        raise timeout from None
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _in_child(seconds, timeout, stream, *args):
+    import multiprocess
+
+    # The background job forkserver (see jobs.py), which has the readers
+    # imported (see warmup.py)
+    context = multiprocess.get_context("forkserver")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(
+        target=_child, args=(sender, stream.read()) + args, daemon=True
+    )
+    child.start()
+    sender.close()
+    try:
+        if not receiver.poll(seconds):
+            raise timeout
+        ok, value = receiver.recv()
+    except EOFError:
+        raise ExtractionError("The file could not be read") from None
+    finally:
+        if child.is_alive():
+            child.kill()
+        child.join()
+        receiver.close()
+    if not ok:
+        raise value
+    return value
+
+
+def _child(sender, data, *args):
+    try:
+        reply = True, _extract(BytesIO(data), *args)
+    except ExtractionError as e:
+        reply = False, e
+    except Exception as e:
+        # Reader exceptions do not always pickle
+        reply = False, RuntimeError(f"{type(e).__name__}: {e}")
+    sender.send(reply)
+    sender.close()
+
+
+def _extract(stream, kind, max_pages, max_chars, max_unzipped_bytes, measure_memory):
+    if measure_memory:
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    try:
+        if kind == DOCX:
+            result = _extract_docx(stream, max_chars, max_unzipped_bytes)
+        else:
+            result = _extract_pdf(stream, max_pages, max_chars)
+        if measure_memory:
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        if measure_memory and not already_tracing:
+            tracemalloc.stop()
+    return result
+
+
+def _extract_docx(stream, max_chars, max_unzipped_bytes):
+    import docx2txt
+
+    # Zip bombs: the declared sizes are enforced when the parts are read
+    with zipfile.ZipFile(stream) as archive:
+        unzipped = sum(info.file_size for info in archive.infolist())
+    if max_unzipped_bytes is not None and unzipped > max_unzipped_bytes:
+        raise ExtractionError(
+            f"Word file unzips to {unzipped} bytes,"
+            f" over the {max_unzipped_bytes} limit"
+        )
+    stream.seek(0)
+    text = docx2txt.process(stream)
+    truncated = max_chars is not None and len(text) > max_chars
+    return {
+        "text": text[:max_chars] if truncated else text,
+        "type": DOCX,
+        "pages": None,
+        "truncated": truncated,
+    }
+
+
+def _extract_pdf(stream, max_pages, max_chars):
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(stream)
+    parts, length = [], 0
+    for page_text in iter_pdf_pages(reader, max_pages):
+        parts.append(page_text)
+        length += len(page_text) + 1
+        if max_chars is not None and length >= max_chars:
+            break
+    return {
+        "text": " ".join(parts),
+        "type": PDF,
+        "pages": len(parts),
+        "truncated": len(parts) < len(reader.pages),
+    }
+
+
+def extract_text(data, filename=None):
+    """
+    Extract text from the bytes of a CV in Word or PDF format.
+
+    The type is detected from the content; filename is only kept for callers
+    that still pass it. Raises on unsupported or unreadable files; callers
+    decide whether to log, retry or skip.
+    """
+    return extract_cv(data)["text"]
@@ -0,0 +1,371 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Fetch job descriptions from job board URLs.
+
+JobFetcher keeps a pooled keep-alive requests session with strict connect and
+read timeouts. Responses are cached on disk with their ETag/Last-Modified
+validators, so a repeat fetch is a conditional request that usually comes back
+304 Not Modified. The parsed md_skills text is cached alongside the response
+and by URL in a disk cache shared by every process, so neither the download nor
+the HTML parse is repeated, whichever web worker or job asks for the URL next.
+fetch_many() fetches a batch of URLs on a thread pool with a concurrency limit
+per host.
+
+URLs come from users (the UI and /api/score), so a fetch is bounded: pages
+over SKILLS_MATCH_MAX_JOB_PAGE_BYTES are refused, the whole download, redirects
+included, is cut off after SKILLS_MATCH_FETCH_DEADLINE seconds, and only http
+and https URLs on hosts resolving to public addresses are fetched, at every
+redirect. SKILLS_MATCH_FETCH_HOSTS restricts fetching to a comma-separated list
+of job board domains, and SKILLS_MATCH_FETCH_PRIVATE=1 allows private addresses
+(an intranet job board).
+
+    python fetcher.py urls.txt > jobs.jsonl
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from cache import CACHE_DIR, DiskCache, content_hash
+
+CONNECT_TIMEOUT = float(os.environ.get("SKILLS_MATCH_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("SKILLS_MATCH_READ_TIMEOUT", 10))
+HTTP_CACHE_DIR = os.environ.get("SKILLS_MATCH_HTTP_CACHE", ".http_cache")
+# Parsed text younger than this is used without asking the server again
+TEXT_CACHE_TTL = float(os.environ.get("SKILLS_MATCH_URL_TTL", 900))
+TEXT_CACHE_BYTES = int(os.environ.get("SKILLS_MATCH_URL_CACHE_BYTES", 64 * 1024**2))
+MAX_PAGE_BYTES = int(os.environ.get("SKILLS_MATCH_MAX_JOB_PAGE_BYTES", 2 * 1024**2))
+# The read timeout applies to each read; this bounds the whole download
+FETCH_DEADLINE = float(os.environ.get("SKILLS_MATCH_FETCH_DEADLINE", 20))
+ALLOWED_HOSTS = [
+    host.strip().lower()
+    for host in os.environ.get("SKILLS_MATCH_FETCH_HOSTS", "").split(",")
+    if host.strip()
+]
+ALLOW_PRIVATE = os.environ.get("SKILLS_MATCH_FETCH_PRIVATE", "0") == "1"
+MAX_REDIRECTS = 5
+
+
+class FetchError(ValueError):
+    """
+    Raised for a URL that may not be fetched, or a page over the size limit.
+    """
+
+
+def check_url(url, allowed_hosts=ALLOWED_HOSTS, allow_private=ALLOW_PRIVATE):
+    """
+    Raise FetchError unless url is http or https on an allowed host, and,
+    unless allow_private is set, every address the host resolves to is public.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise FetchError(f"Only http and https URLs can be fetched, not {url!r}")
+    host = parts.hostname.lower()
+    if allowed_hosts and not any(
+        host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts
+    ):
+        raise FetchError(f"{host} is not an allowed job board")
+    if allow_private:
+        return
+    try:
+        addresses = socket.getaddrinfo(host, parts.port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        # Left to requests, which reports it as a connection error
+        return
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise FetchError(f"{host} is not a public address")
+
+
+def _response_socket(res):
+    """
+    Return the socket a streamed requests response is read from, or None.
+    """
+    connection = res.raw.connection
+    if connection is not None and connection.sock is not None:
+        return connection.sock
+    # http.client lets go of the socket of a response that closes its
+    # connection, which is then only held by the file the body is read from
+    stream = getattr(getattr(res.raw, "_fp", None), "fp", None)
+    return getattr(getattr(stream, "raw", None), "_sock", None)
+
+
+def _shutdown(sock):
+    # Wakes a read blocked on the socket, which close() does not
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def parse_job_text(html):
+    """
+    Return the text of the <p> tags inside the md_skills div of a job page.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    text_div = soup.find("div", id="md_skills")  # locate the div by id
+    if text_div:
+        # get the text inside <p> tags within the div
+        return " ".join(p.text for p in text_div.find_all("p"))
+    return ""
+
+
+class JobFetcher:
+    """
+    Pooled, cached fetcher for job description pages.
+    """
+
+    def __init__(
+        self,
+        cache_dir=HTTP_CACHE_DIR,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        pool_size=32,
+        per_host=4,
+        text_cache=None,
+        max_bytes=MAX_PAGE_BYTES,
+        deadline=FETCH_DEADLINE,
+        allowed_hosts=ALLOWED_HOSTS,
+        allow_private=ALLOW_PRIVATE,
+    ):
+        self.cache_dir = cache_dir
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.allowed_hosts = allowed_hosts
+        self.allow_private = allow_private
+        self.pool_size = pool_size
+        self.per_host = per_host
+        if text_cache is None:
+            text_cache = DiskCache(
+                os.path.join(CACHE_DIR, "job_texts"),
+                size_limit=TEXT_CACHE_BYTES,
+                ttl=TEXT_CACHE_TTL,
+            )
+        self.text_cache = text_cache
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _cache_path(self, url):
+        return os.path.join(self.cache_dir, content_hash(url) + ".json")
+
+    def _read_cached(self, url):
+        try:
+            with open(self._cache_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cached(self, url, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _download(self, url):
+        cached = self._read_cached(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        deadline = time.monotonic() + self.deadline
+        with self._host_limit(url):
+            res = self._get(url, headers, deadline)
+            try:
+                if res.status_code == 304 and cached:
+                    return cached["text"]
+                res.raise_for_status()
+                body = self._read_body(res, deadline)
+            finally:
+                res.close()
+        text = parse_job_text(body.decode(res.encoding or "utf-8", errors="replace"))
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._write_cached(
+                url, {"etag": etag, "last_modified": last_modified, "text": text}
+            )
+        return text
+
+    def _timed_out(self, url):
+        import requests
+
+        return requests.Timeout(f"{url} took longer than {self.deadline:g}s")
+
+    def _get(self, url, headers, deadline):
+        """
+        Send the request, following redirects only to URLs check_url() allows.
+        """
+        import requests
+
+        for _ in range(MAX_REDIRECTS + 1):
+            check_url(url, self.allowed_hosts, self.allow_private)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._timed_out(url)
+            res = self.session.get(
+                url,
+                headers=headers,
+                timeout=tuple(min(t, remaining) for t in self.timeout),
+                stream=True,
+                allow_redirects=False,
+            )
+            if not res.is_redirect:
+                return res
+            url = urljoin(res.url, res.headers["Location"])
+            res.close()
+        raise requests.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects")
+
+    def _read_body(self, res, deadline):
+        """
+        Read a streamed response, refusing it past max_bytes and cutting it off
+        at the deadline.
+        """
+        length = res.headers.get("Content-Length", "")
+        too_large = FetchError(f"Job page is over the {self.max_bytes} byte limit")
+        if length.isdigit() and int(length) > self.max_bytes:
+            raise too_large
+        sock = _response_socket(res)
+        watchdog = None
+        if sock is not None:
+            watchdog = threading.Timer(
+                max(0, deadline - time.monotonic()), _shutdown, (sock,)
+            )
+            watchdog.start()
+        chunks, size = [], 0
+        try:
+            for chunk in res.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise too_large
+                chunks.append(chunk)
+        except Exception:
+            if time.monotonic() >= deadline:
+                raise self._timed_out(res.url) from None
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        # A body without a Content-Length just ends when the socket is shut
+        if time.monotonic() >= deadline:
+            raise self._timed_out(res.url)
+        return b"".join(chunks)
+
+    def fetch(self, url):
+        """
+        Return the md_skills text of a job description URL.
+
+        Raises requests exceptions on network errors, timeouts (including the
+        overall deadline) and HTTP errors, and FetchError for a URL that may
+        not be fetched or a page over the size limit.
+        """
+        return self.text_cache.get_or_compute(url, lambda: self._download(url))
+
+    def fetch_many(self, urls, max_workers=32):
+        """
+        Fetch many URLs concurrently. Returns {url: text}, with "" for failures.
+        """
+
+        def fetch_one(url):
+            try:
+                return url, self.fetch(url)
+            except Exception as e:
+                print(f"{url}: {e}", file=sys.stderr)
+                return url, ""
+
+        unique = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(pool.map(fetch_one, unique))
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Return the shared JobFetcher, creating it on first use.
+    """
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_lock:
+            if _default_fetcher is None:
+                _default_fetcher = JobFetcher()
+    return _default_fetcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch job descriptions in bulk.")
+    parser.add_argument("urls", help="file with one job description URL per line")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.urls, encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+    fetcher = JobFetcher(per_host=args.per_host)
+    for url, text in fetcher.fetch_many(urls, max_workers=args.workers).items():
+        print(json.dumps({"id": url, "text": text}))
+
+
+if __name__ == "__main__":
+    main()
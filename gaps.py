@@ -0,0 +1,256 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Skill gaps of one CV against many job descriptions, or many CVs against one.
+
+Every document becomes a row of a sparse 0/1 matrix over the skills taxonomy
+(see skills.py), so the skills each pair shares, the job description skills
+the CV is missing and the CV skills the job description does not ask for are
+three sparse matrix operations for the whole batch rather than a Counter
+comparison per pair. Column sums of the missing matrix give the skills most
+often missing across the batch.
+
+    python gaps.py cv cv.txt jds.jsonl --output gaps.csv --summary missing.csv
+    python gaps.py jd job.txt cvs.jsonl --output gaps.parquet
+
+Skill counts are read from the document store when one is configured (see
+store.py), so repeat runs over the same documents skip extraction.
+"""
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from skills import extract_skills, get_matcher
+from store import get_store
+
+OTHER_KIND = {"cv": "jd", "jd": "cv"}
+
+
+def document_skills(kind, records):
+    """
+    Return the skill Counter of each {"id": ..., "text": ...} record.
+    """
+    records = list(records)
+    store = get_store()
+    if store is None:
+        return [extract_skills(record["text"]) for record in records]
+    ids = store.add_many(kind, records)
+    return [skills for _, skills in store.terms_many(ids)]
+
+
+def skill_matrix(skill_counts, vocabulary):
+    """
+    Return a CSR matrix with a 1 for each skill (column) of each document (row).
+    """
+    indptr = [0]
+    indices = []
+    for counts in skill_counts:
+        indices.extend(vocabulary[skill] for skill in counts if skill in vocabulary)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int8)
+    shape = (len(indptr) - 1, len(vocabulary))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape)
+
+
+class SkillGaps:
+    """
+    Present, missing and extra skills of each document against a reference.
+
+    present, missing and extra are documents x skills 0/1 CSR matrices. missing
+    holds job description skills the CV lacks; extra holds CV skills the job
+    description does not mention.
+    """
+
+    def __init__(self, ids, skills, present, missing, extra):
+        self.ids = list(ids)
+        self.skills = np.asarray(skills, dtype=object)
+        self.present = present
+        self.missing = missing
+        self.extra = extra
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def compute(cls, reference, documents, kind, skills=None):
+        """
+        Compare the skill Counters of many documents against a reference one.
+
+        kind is what the documents are: "jd" for one CV against many job
+        descriptions, "cv" for many CVs against one job description. documents
+        is a list of (id, Counter) pairs.
+        """
+        if kind not in OTHER_KIND:
+            raise ValueError('kind must be "cv" or "jd"')
+        skills = skills if skills is not None else get_matcher().skills
+        vocabulary = {skill: i for i, skill in enumerate(skills)}
+        ids = [doc_id for doc_id, _ in documents]
+        matrix = skill_matrix([counts for _, counts in documents], vocabulary)
+        reference_row = skill_matrix([reference], vocabulary)
+        # The reference repeated on every row, as a sparse matrix
+        repeated = sparse.csr_matrix(np.ones((len(ids), 1), dtype=np.int8))
+        repeated = repeated @ reference_row
+        present = matrix.multiply(reference_row).tocsr()
+        if kind == "jd":
+            required, offered = matrix, repeated
+        else:
+            required, offered = repeated, matrix
+        missing = required - present
+        extra = offered - present
+        missing.eliminate_zeros()
+        extra.eliminate_zeros()
+        return cls(ids, skills, present, missing, extra)
+
+    def _names(self, matrix, row):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        return sorted(self.skills[matrix.indices[start:end]])
+
+    def coverage(self):
+        """
+        Return the share of the job description skills present, per document.
+        """
+        present = np.asarray(self.present.sum(axis=1), dtype=np.float64).ravel()
+        missing = np.asarray(self.missing.sum(axis=1), dtype=np.float64).ravel()
+        required = present + missing
+        return np.divide(
+            present, required, out=np.zeros_like(present), where=required > 0
+        )
+
+    def rows(self):
+        """
+        Yield one dict per document with its coverage and skill lists.
+        """
+        coverage = self.coverage()
+        for row, doc_id in enumerate(self.ids):
+            yield {
+                "id": doc_id,
+                "coverage": round(float(coverage[row]) * 100, 2),
+                "present": self._names(self.present, row),
+                "missing": self._names(self.missing, row),
+                "extra": self._names(self.extra, row),
+            }
+
+    def most_missing(self, n=None):
+        """
+        Return [(skill, number of documents missing it)], most missed first.
+        """
+        counts = np.asarray(self.missing.sum(axis=0)).ravel()
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0][:n]
+        return [(self.skills[i], int(counts[i])) for i in order]
+
+    def to_csv(self, path, separator="; "):
+        """
+        Write one line per document, joining each skill list with separator.
+        """
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "coverage", "present", "missing", "extra"])
+            for row in self.rows():
+                writer.writerow(
+                    [
+                        row["id"],
+                        row["coverage"],
+                        separator.join(row["present"]),
+                        separator.join(row["missing"]),
+                        separator.join(row["extra"]),
+                    ]
+                )
+
+    def to_parquet(self, path):
+        """
+        Write one row per document with list columns. Needs pyarrow.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = list(self.rows())
+        columns = ["id", "coverage", "present", "missing", "extra"]
+        table = pa.table({name: [row[name] for row in rows] for name in columns})
+        pq.write_table(table, path)
+
+    def summary_to_csv(self, path):
+        """
+        Write the most commonly missing skills with their counts and shares.
+        """
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["skill", "missing", "share"])
+            for skill, count in self.most_missing():
+                writer.writerow([skill, count, round(count / len(self) * 100, 2)])
+
+
+def skill_gaps(reference_text, records, kind):
+    """
+    Return the SkillGaps of {"id": ..., "text": ...} records of the given kind
+    against one reference document of the other kind.
+    """
+    records = list(records)
+    (reference,) = document_skills(OTHER_KIND[kind], [{"text": reference_text}])
+    documents = document_skills(kind, records)
+    ids = [record.get("id", i) for i, record in enumerate(records)]
+    return SkillGaps.compute(reference, list(zip(ids, documents)), kind)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill gaps against many documents.")
+    parser.add_argument(
+        "reference_kind",
+        choices=["cv", "jd"],
+        help="cv: one CV against many job descriptions; jd: one job description "
+        "against many CVs",
+    )
+    parser.add_argument("reference", help="text file of the CV or job description")
+    parser.add_argument("documents", help="JSONL file of the other documents")
+    parser.add_argument("--output", help="per-document gaps (.csv or .parquet)")
+    parser.add_argument("--summary", help="most commonly missing skills (.csv)")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    from ranking import read_jsonl
+
+    with open(args.reference, encoding="utf-8") as f:
+        reference_text = f.read()
+    records = [{"id": i, "text": text} for i, text in read_jsonl(args.documents)]
+    start = time.perf_counter()
+    gaps = skill_gaps(reference_text, records, OTHER_KIND[args.reference_kind])
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        if os.path.splitext(args.output)[1] == ".parquet":
+            try:
+                gaps.to_parquet(args.output)
+            except ImportError:
+                parser.error("Parquet output needs pyarrow (pip install pyarrow)")
+        else:
+            gaps.to_csv(args.output)
+    if args.summary:
+        gaps.summary_to_csv(args.summary)
+    print(f"{len(gaps)} documents in {elapsed:.2f}s; most often missing:")
+    for skill, count in gaps.most_missing(args.top):
+        print(f"{count:>6}  {skill}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+
+"""
+gunicorn settings for serving the app with several worker processes.
+
+    python -m gunicorn app:server
+
+gunicorn reads this file from the working directory. Stopwords, the sentence
+tokenizer, the skill automaton, the vectorizer vocabularies and the word cloud
+renderer are loaded once in the master before the workers are forked (see
+warmup.py), and frozen out of the garbage collector's reach, so the workers
+share those pages copy-on-write rather than each loading its own. The app
+itself is imported by each worker, so no connection or thread crosses a fork.
+Results are shared through the disk caches under SKILLS_MATCH_CACHE_DIR, which
+every worker and job process reads and writes.
+"""
+
+import gc
+import os
+
+bind = os.environ.get("SKILLS_MATCH_BIND", "127.0.0.1:8050")
+workers = int(os.environ.get("SKILLS_MATCH_WEB_WORKERS", 2))
+threads = int(os.environ.get("SKILLS_MATCH_WEB_THREADS", 4))
+timeout = 120
+
+
+def on_starting(server):
+    from warmup import preload
+
+    preload()
+    # Objects loaded so far live as long as the workers; keeping the collector
+    # from touching them keeps their pages shared
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Uploads are extracted in children of the job forkserver (see
+    # extraction.py), so start it now rather than on the first upload or job
+    from multiprocess import forkserver
+
+    forkserver.ensure_running()
@@ -0,0 +1,209 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Re-scoring a CV and job description as they are edited.
+
+Users edit the CV or job description in the text boxes and click Analyze again.
+The counts behind a match are kept per paragraph (one line of text), so the new
+text is compared with the previous one paragraph by paragraph and only the
+paragraphs that changed are tokenized. The document totals, their squared
+norms, the dot product behind the cosine score and the common keywords and
+skills are then adjusted by the difference: apart from splitting and hashing
+the lines, the work is proportional to the edit rather than to the documents.
+This relies on keywords and skills never spanning a line break.
+
+The score is the cosine similarity of the documents' token counts, tokenized as
+scikit-learn's CountVectorizer does by default, so (unless SKILLS_MATCH_NORMALIZE
+is set, see normalize.py) it equals what calculate_match_percentage computed
+with CountVectorizer and what ranking.py computes for its corpus.
+"""
+
+import hashlib
+import math
+import re
+from collections import Counter
+
+from keywords import KEYWORDS_VERSION, extract_keywords
+from normalize import normalize_counts
+from skills import extract_skills, get_matcher
+
+# CountVectorizer's default token_pattern, applied to the lowercased text
+_SCORE_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def score_tokens(text):
+    """
+    Return the Counter of the tokens the match percentage is computed from.
+    """
+    return normalize_counts(Counter(_SCORE_TOKEN.findall(text.lower())))
+
+
+def match_percentage(tokens, other):
+    """
+    Return the cosine similarity of two token Counters as a percentage.
+    """
+    if len(other) < len(tokens):
+        tokens, other = other, tokens
+    dot = sum(count * other[token] for token, count in tokens.items() if token in other)
+    return _percentage(dot, _norm2(tokens), _norm2(other))
+
+
+def _norm2(counts):
+    return sum(count * count for count in counts.values())
+
+
+def _percentage(dot, norm2, other_norm2):
+    if not norm2 or not other_norm2:
+        return 0.0
+    return dot / math.sqrt(norm2 * other_norm2) * 100
+
+
+def _paragraph_key(paragraph):
+    return hashlib.blake2b(paragraph.encode("utf-8"), digest_size=16).digest()
+
+
+def _apply(counts, delta):
+    """
+    Add delta to counts in place and return the change in their squared norm.
+    """
+    change = 0
+    for term, difference in delta.items():
+        if not difference:
+            continue
+        old = counts.get(term, 0)
+        new = old + difference
+        change += new * new - old * old
+        if new:
+            counts[term] = new
+        else:
+            del counts[term]
+    return change
+
+
+class DocumentCounts:
+    """
+    Keyword, skill and score token counts of a document, with the counts of
+    each of its paragraphs.
+    """
+
+    def __init__(self):
+        # Paragraph key -> [occurrences, keywords, skills, tokens]; plain dicts
+        # pickle much faster than Counters
+        self.paragraphs = {}
+        self.keywords = Counter()
+        self.skills = Counter()
+        self.tokens = Counter()
+        self.norm2 = 0
+
+    def update(self, text):
+        """
+        Make these the counts of text, tokenizing only paragraphs not already
+        counted. Return the changes to the keyword, skill and token counts.
+        """
+        wanted = Counter()
+        texts = {}
+        for paragraph in text.splitlines():
+            if paragraph.strip():
+                key = _paragraph_key(paragraph)
+                wanted[key] += 1
+                texts[key] = paragraph
+        deltas = (Counter(), Counter(), Counter())
+        for key in wanted.keys() | self.paragraphs.keys():
+            entry = self.paragraphs.get(key)
+            change = wanted[key] - (entry[0] if entry is not None else 0)
+            if not change:
+                continue
+            if entry is None:
+                paragraph = texts[key]
+                entry = [
+                    0,
+                    dict(extract_keywords(paragraph)),
+                    dict(extract_skills(paragraph)),
+                    dict(score_tokens(paragraph)),
+                ]
+                self.paragraphs[key] = entry
+            entry[0] += change
+            for counts, delta in zip(entry[1:], deltas):
+                for term, count in counts.items():
+                    delta[term] += count * change
+            if not entry[0]:
+                del self.paragraphs[key]
+        keyword_delta, skill_delta, token_delta = deltas
+        _apply(self.keywords, keyword_delta)
+        _apply(self.skills, skill_delta)
+        self.norm2 += _apply(self.tokens, token_delta)
+        return deltas
+
+
+def _update_common(common, counts, other, changed):
+    for term in changed:
+        count = min(counts[term], other[term])
+        if count:
+            common[term] = count
+        else:
+            common.pop(term, None)
+
+
+def current_version():
+    """
+    Return the version of the counts; kept counts of another version are stale.
+    """
+    return f"{KEYWORDS_VERSION}/{get_matcher().version}"
+
+
+class IncrementalMatch:
+    """
+    The match between a CV and a job description, updated as they are edited.
+    """
+
+    def __init__(self):
+        self.version = current_version()
+        self.cv = DocumentCounts()
+        self.jd = DocumentCounts()
+        self.dot = 0
+        self.common_keywords = Counter()
+        self.common_skills = Counter()
+
+    def update(self, cv_text, job_text):
+        """
+        Update the counts, common keywords and skills and the score to those of
+        a new pair of texts.
+        """
+        for document, other, text in (
+            (self.cv, self.jd, cv_text),
+            (self.jd, self.cv, job_text),
+        ):
+            keyword_delta, skill_delta, token_delta = document.update(text)
+            self.dot += sum(
+                difference * other.tokens.get(token, 0)
+                for token, difference in token_delta.items()
+            )
+            _update_common(
+                self.common_keywords, self.cv.keywords, self.jd.keywords, keyword_delta
+            )
+            _update_common(
+                self.common_skills, self.cv.skills, self.jd.skills, skill_delta
+            )
+
+    @property
+    def score(self):
+        """
+        The match percentage of the current texts.
+        """
+        return _percentage(self.dot, self.cv.norm2, self.jd.norm2)
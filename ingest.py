@@ -0,0 +1,521 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Bulk-load a directory of Word and PDF CVs.
+
+Text is extracted in a process pool with the same code as the upload box. It is
+written as JSONL ({"id", "path", "text", ...} per line, ready for ranking.py
+build), added straight to an inverted index and/or loaded into the document
+store with its keyword and skill counts, in batches as files complete.
+
+Near-duplicates (re-saved, lightly edited or PDF and Word copies of one CV, see
+dedup.py) are collapsed onto the first copy: only that one is written, indexed
+and stored, and the others are recorded in the checkpoint as its duplicates.
+With --store, CVs stored by earlier runs count as first copies too.
+
+Every file under the directory is considered and kept if its content is a
+Word or PDF document (see extraction.detect_type), whatever its name.
+
+Finished files are recorded in a checkpoint file, so an interrupted run picks
+up where it stopped. Files that still fail after the retries are quarantined:
+recorded in the checkpoint with their error and optionally copied aside. Files
+that break an extraction limit are not retried, and when a worker process dies
+the files it might have been reading are retried one at a time, so only the
+file that kills its worker is quarantined.
+
+    python ingest.py cvs/ --output cvs.jsonl --index index --workers 8
+    python ingest.py cvs/ --store skills_match.db
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from extraction import ExtractionError, detect_type, extract_cv
+
+
+def find_cvs(source):
+    """
+    Yield the paths, relative to source, of every Word or PDF file under it,
+    recognised from its first bytes rather than its name.
+    """
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                with open(path, "rb") as f:
+                    head = f.read(1024)
+            except OSError:
+                continue
+            if detect_type(head) is not None:
+                yield os.path.relpath(path, source)
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def process_file(
+    source,
+    relpath,
+    with_keywords,
+    measure_memory=False,
+    with_skills=False,
+    with_signature=False,
+    with_tokens=False,
+):
+    """
+    Extract one CV. Runs in a worker process.
+    """
+    path = os.path.join(source, relpath)
+    # Hand the open file to the extractor so PDFs are read page by page
+    with open(path, "rb") as f:
+        result = extract_cv(f, measure_memory=measure_memory)
+    record = {
+        "id": relpath,
+        "path": relpath,
+        "text": result["text"],
+        "pages": result["pages"],
+        "truncated": result["truncated"],
+    }
+    if measure_memory:
+        record["peak_memory"] = result["peak_memory"]
+    if with_keywords:
+        from keywords import extract_keywords
+
+        record["keywords"] = dict(extract_keywords(result["text"]))
+    if with_skills:
+        from skills import extract_skills
+
+        record["skills"] = dict(extract_skills(result["text"]))
+    if with_signature:
+        from dedup import signature
+
+        record["signature"] = signature(result["text"])
+    if with_tokens:
+        from incremental import score_tokens
+
+        record["tokens"] = dict(score_tokens(result["text"]))
+    return record, os.path.getsize(path)
+
+
+class Checkpoint:
+    """
+    Append-only record of finished and quarantined files for resuming a run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by the interruption we are resuming from
+                        continue
+                    self.done[entry["path"]] = (entry["size"], entry["mtime"])
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, relpath, key):
+        return self.done.get(relpath) == tuple(key)
+
+    def mark(self, relpath, key, status="ok", error=None, duplicate_of=None):
+        entry = {"path": relpath, "size": key[0], "mtime": key[1], "status": status}
+        if error is not None:
+            entry["error"] = error
+        if duplicate_of is not None:
+            entry["duplicate_of"] = duplicate_of
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self.done[relpath] = tuple(key)
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """
+    Throttled progress and throughput line on stderr.
+    """
+
+    def __init__(self, total, interval=1.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.bytes = 0
+        self.peak_memory = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, nbytes=0, failed=False, peak_memory=0, duplicate=False):
+        self.done += 1
+        self.peak_memory = max(self.peak_memory, peak_memory)
+        self.bytes += nbytes
+        self.failed += failed
+        self.duplicates += duplicate
+        now = time.perf_counter()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            self.report(end="\r")
+
+    def report(self, end="\n"):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        line = (
+            f"{self.done}/{self.total} files  "
+            f"{self.done / elapsed:.1f} files/s  "
+            f"{self.bytes / elapsed / 1e6:.2f} MB/s  "
+            f"{self.failed} quarantined"
+        )
+        if self.duplicates:
+            line += f"  {self.duplicates} duplicates"
+        if self.peak_memory:
+            line += f"  peak {self.peak_memory / 1e6:.1f} MB/file"
+        sys.stderr.write(line + end)
+        sys.stderr.flush()
+
+
+class Sink:
+    """
+    Writes completed records in batches to JSONL, an inverted index and/or a
+    document store, then marks them done in the checkpoint. With a
+    deduplicator, near-duplicates of earlier records are only checkpointed,
+    once the record they duplicate has been written.
+    """
+
+    def __init__(
+        self,
+        checkpoint,
+        output=None,
+        index=None,
+        batch_size=200,
+        store=None,
+        deduplicator=None,
+    ):
+        self.checkpoint = checkpoint
+        self.output = open(output, "a", encoding="utf-8") if output else None
+        self.index = index
+        self.store = store
+        self.deduplicator = deduplicator
+        self.batch_size = batch_size
+        self.pending = []
+        # (record, canonical record id, similarity) waiting for their canonical
+        # document to be stored
+        self.duplicates = []
+        # Checkpoint entries of duplicates of records in this run, written with
+        # the next flush, so a resumed run never skips a duplicate whose
+        # canonical record was lost
+        self.duplicate_marks = []
+        # Store document id of each record stored by this run
+        self.document_ids = {}
+
+    def add(self, record, key):
+        """
+        Queue a record for writing. Returns True if it was a duplicate instead.
+        """
+        signature = record.get("signature")
+        if self.deduplicator is not None and signature is not None:
+            match = self.deduplicator.find(signature)
+            if match is not None:
+                source, canonical, score = match
+                if source == "store":
+                    canonical_id = self.store.get(canonical)["external_id"] or canonical
+                    self.store.add_duplicate(
+                        "cv", record["text"], canonical, score, record["id"]
+                    )
+                    self.checkpoint.mark(
+                        record["path"], key, "duplicate", None, canonical_id
+                    )
+                else:
+                    if self.store is not None:
+                        self.duplicates.append((record, canonical, score))
+                        if canonical in self.document_ids:
+                            self._store_duplicates()
+                    self.duplicate_marks.append((record["path"], key, canonical))
+                return True
+            self.deduplicator.remember(record["id"], signature)
+        self.pending.append((record, key))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return False
+
+    def flush(self):
+        if self.pending:
+            self._write_pending()
+        # Their canonical records have been written now, by this flush or earlier
+        for relpath, key, canonical in self.duplicate_marks:
+            self.checkpoint.mark(relpath, key, "duplicate", None, canonical)
+        self.duplicate_marks = []
+
+    def _write_pending(self):
+        if self.output is not None:
+            for record, _ in self.pending:
+                line = {
+                    k: v
+                    for k, v in record.items()
+                    if k not in ("keywords", "skills", "signature", "tokens")
+                }
+                self.output.write(json.dumps(line) + "\n")
+            self.output.flush()
+        if self.index is not None:
+            from collections import Counter
+
+            self.index.add_counts(
+                [record["id"] for record, _ in self.pending],
+                [Counter(record["keywords"]) for record, _ in self.pending],
+                [Counter(record["tokens"]) for record, _ in self.pending],
+            )
+        if self.store is not None:
+            self._store_pending()
+        for record, key in self.pending:
+            self.checkpoint.mark(record["path"], key)
+        self.pending = []
+
+    def _store_pending(self):
+        from dedup import band_buckets
+
+        records = [record for record, _ in self.pending]
+        ids = self.store.add_many("cv", records)
+        for record, doc_id in zip(records, ids):
+            self.document_ids[record["id"]] = doc_id
+            signature = record.get("signature")
+            if signature is not None:
+                buckets = band_buckets(signature)
+                self.store.add_signature(doc_id, signature.tobytes(), buckets)
+        self._store_duplicates()
+
+    def _store_duplicates(self):
+        waiting = []
+        for record, canonical, score in self.duplicates:
+            if canonical in self.document_ids:
+                canonical_id = self.document_ids[canonical]
+                self.store.add_duplicate(
+                    "cv", record["text"], canonical_id, score, record["id"]
+                )
+            else:
+                waiting.append((record, canonical, score))
+        self.duplicates = waiting
+
+    def close(self):
+        self.flush()
+        if self.output is not None:
+            self.output.close()
+
+
+def ingest(
+    source,
+    output=None,
+    index_path=None,
+    checkpoint_path=None,
+    workers=None,
+    retries=1,
+    quarantine_dir=None,
+    batch_size=200,
+    measure_memory=False,
+    store_path=None,
+    dedup=True,
+):
+    """
+    Extract every CV under source, skipping files finished by an earlier run.
+    """
+    if checkpoint_path is None:
+        if output is None and index_path is None:
+            checkpoint_path = store_path + ".ingest.done"
+        else:
+            checkpoint_path = (output or os.path.join(index_path, "ingest")) + ".done"
+    index = None
+    if index_path is not None:
+        from inverted_index import InvertedIndex
+
+        index = InvertedIndex(index_path)
+        if not index.current:
+            # Fail before extracting anything rather than at the first batch
+            raise ValueError(
+                f"{index_path} holds other keyword counts; give a new --index"
+            )
+    store = None
+    if store_path is not None:
+        from store import DocumentStore
+
+        store = DocumentStore(store_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    deduplicator = None
+    if dedup:
+        from dedup import Deduplicator
+
+        deduplicator = Deduplicator("cv", store)
+
+    todo = []
+    for relpath in find_cvs(source):
+        key = _file_key(os.path.join(source, relpath))
+        if not checkpoint.is_done(relpath, key):
+            todo.append((relpath, key))
+    progress = Progress(len(todo))
+    sink = Sink(checkpoint, output, index, batch_size, store, deduplicator)
+    attempts = {}
+    workers = workers or os.cpu_count()
+    with_terms = index is not None or store is not None
+
+    def quarantine(relpath, key, error):
+        print(f"\nquarantined {relpath}: {error}", file=sys.stderr)
+        if quarantine_dir is not None:
+            target = os.path.join(quarantine_dir, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(os.path.join(source, relpath), target)
+        checkpoint.mark(relpath, key, "quarantined", str(error))
+        progress.update(failed=True)
+
+    def run(files, workers):
+        """
+        Extract files in a pool of workers. Returns the files in flight if a
+        worker died, which breaks the pool, after taking no more files.
+        """
+        crashed = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+
+            def submit(relpath, key):
+                try:
+                    future = pool.submit(
+                        process_file,
+                        source,
+                        relpath,
+                        with_terms,
+                        measure_memory,
+                        store is not None,
+                        deduplicator is not None,
+                        index is not None,
+                    )
+                except BrokenProcessPool:
+                    # Broken before its other futures have reported it
+                    crashed.append((relpath, key))
+                    return
+                running[future] = (relpath, key)
+
+            # Keep a bounded number of files in flight so memory stays flat
+            for relpath, key in files:
+                submit(relpath, key)
+                if crashed or len(running) >= workers * 4:
+                    break
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    relpath, key = running.pop(future)
+                    try:
+                        record, nbytes = future.result()
+                    except BrokenProcessPool:
+                        crashed.append((relpath, key))
+                        continue
+                    except ExtractionError as e:
+                        # Too large, too slow or a legacy .doc: the same again
+                        quarantine(relpath, key, e)
+                    except Exception as e:
+                        attempts[relpath] = attempts.get(relpath, 0) + 1
+                        if attempts[relpath] <= retries:
+                            if crashed:
+                                crashed.append((relpath, key))
+                            else:
+                                submit(relpath, key)
+                            continue
+                        quarantine(relpath, key, e)
+                    else:
+                        duplicate = sink.add(record, key)
+                        progress.update(
+                            nbytes,
+                            peak_memory=record.get("peak_memory", 0),
+                            duplicate=duplicate,
+                        )
+                    next_file = None if crashed else next(files, None)
+                    if next_file is not None:
+                        submit(*next_file)
+        return crashed
+
+    try:
+        files = iter(todo)
+        suspects = []
+        while True:
+            crashed = run(files, workers)
+            if not crashed:
+                break
+            suspects.extend(crashed)
+        # Retried alone, so only the file that kills its worker is quarantined
+        for relpath, key in suspects:
+            if run(iter([(relpath, key)]), 1):
+                quarantine(relpath, key, "the worker process died reading it")
+    finally:
+        sink.close()
+        checkpoint.close()
+    progress.report()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a directory of CVs.")
+    parser.add_argument(
+        "source", help="directory of Word and PDF CVs, found by content"
+    )
+    parser.add_argument("--output", help="append extracted text to this JSONL file")
+    parser.add_argument("--index", help="add CVs to this inverted index directory")
+    parser.add_argument("--store", help="add CVs to this document store database")
+    parser.add_argument("--checkpoint", help="resume file (default: <output>.done)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--quarantine-dir", help="copy failed files here")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument(
+        "--keep-duplicates",
+        action="store_true",
+        help="load near-duplicate CVs instead of collapsing them",
+    )
+    parser.add_argument(
+        "--measure-memory",
+        action="store_true",
+        help="record each file's peak extraction memory (slower)",
+    )
+    args = parser.parse_args()
+    if not args.output and not args.index and not args.store:
+        parser.error("give --output, --index and/or --store")
+
+    ingest(
+        args.source,
+        output=args.output,
+        index_path=args.index,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        retries=args.retries,
+        quarantine_dir=args.quarantine_dir,
+        batch_size=args.batch_size,
+        measure_memory=args.measure_memory,
+        store_path=args.store,
+        dedup=not args.keep_duplicates,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+On-disk inverted index over the CV corpus.
+
+Every CV is reduced to the keyword counts extract_keywords produces, and the
+index maps each keyword to a posting list of (document, term frequency) pairs.
+The index is a directory of immutable segments. Each segment stores its posting
+lists as two flat numpy arrays that are memory-mapped when the index is opened,
+plus a lexicon of term -> (start, end) offsets into them. A query reads only
+the posting lists for its own keywords.
+
+The posting lists only shortlist CVs, by the cosine of their keyword counts.
+Each segment also keeps every CV's score tokens (the counts the match
+percentage is computed from) as a memory-mapped forward index, and the
+shortlist is rescored exactly from them: search() gives a CV the same score as
+calculate_match_percentage against its text, and analysis.get_ranker() serves
+Rank CVs and /api/rank from the index once one exists. CVs sharing no keyword
+with the job description are not scored.
+
+Adding CVs writes a new segment, and deleting a CV records a tombstone, so the
+corpus never has to be rebuilt. compact() merges the segments and drops deleted
+documents when there are enough of them to matter.
+
+    python inverted_index.py add index_dir cvs.jsonl
+    python inverted_index.py delete index_dir cv-123 cv-456
+    python inverted_index.py search index_dir job.txt -k 50
+"""
+
+import argparse
+import json
+import os
+import shutil
+from collections import Counter
+
+import numpy as np
+
+from incremental import match_percentage, score_tokens
+from keywords import KEYWORDS_VERSION, extract_keywords
+
+MANIFEST = "manifest.json"
+SHORTLIST = int(os.environ.get("SKILLS_MATCH_INDEX_SHORTLIST", 500))
+
+
+def _write_json(path, data):
+    # Write then rename so a crash never leaves a half-written file behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class _Segment:
+    """
+    One immutable, memory-mapped block of posting lists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, "docs.npy"))
+        self.norms = np.load(os.path.join(path, "norms.npy"))
+        with open(os.path.join(path, "segment.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.lexicon = data["lexicon"]
+        self.cv_ids = data["cv_ids"]
+        # Score tokens per document, absent from segments written before them
+        self.tokens = data.get("tokens")
+        if self.tokens is not None:
+            self.token_offsets = np.load(
+                os.path.join(path, "token_offsets.npy"), mmap_mode="r"
+            )
+            self.token_ids = np.load(os.path.join(path, "token_ids.npy"), mmap_mode="r")
+            self.token_tfs = np.load(os.path.join(path, "token_tfs.npy"), mmap_mode="r")
+
+    def postings(self, term):
+        span = self.lexicon.get(term)
+        if span is None:
+            return None
+        start, end = span
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def token_counts(self, doc):
+        """
+        Return the Counter of score tokens of a document in this segment.
+        """
+        position = int(np.searchsorted(self.docs, doc))
+        start, end = self.token_offsets[position], self.token_offsets[position + 1]
+        tokens = self.tokens
+        return Counter(
+            {
+                tokens[token]: tf
+                for token, tf in zip(
+                    self.token_ids[start:end].tolist(),
+                    self.token_tfs[start:end].tolist(),
+                )
+            }
+        )
+
+    @staticmethod
+    def write(path, docs, cv_ids, keyword_counts, token_counts=None):
+        """
+        Write a segment for the given document numbers, ids and keyword Counters,
+        plus their score token Counters if given.
+        """
+        postings = {}
+        for doc, counts in zip(docs, keyword_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+        lexicon = {}
+        doc_ids, tfs = [], []
+        for term in sorted(postings):
+            start = len(doc_ids)
+            for doc, tf in postings[term]:
+                doc_ids.append(doc)
+                tfs.append(tf)
+            lexicon[term] = (start, len(doc_ids))
+        norms = [
+            float(np.sqrt(sum(tf * tf for tf in counts.values())))
+            for counts in keyword_counts
+        ]
+        os.makedirs(path)
+        np.save(os.path.join(path, "doc_ids.npy"), np.asarray(doc_ids, np.uint32))
+        np.save(os.path.join(path, "tfs.npy"), np.asarray(tfs, np.uint32))
+        np.save(os.path.join(path, "docs.npy"), np.asarray(docs, np.uint32))
+        np.save(os.path.join(path, "norms.npy"), np.asarray(norms, np.float32))
+        data = {"lexicon": lexicon, "cv_ids": list(cv_ids)}
+        if token_counts is not None:
+            tokens = sorted(set().union(*token_counts))
+            numbers = {token: number for number, token in enumerate(tokens)}
+            offsets, token_ids, token_tfs = [0], [], []
+            for counts in token_counts:
+                for token, tf in counts.items():
+                    token_ids.append(numbers[token])
+                    token_tfs.append(tf)
+                offsets.append(len(token_ids))
+            np.save(
+                os.path.join(path, "token_offsets.npy"), np.asarray(offsets, np.uint64)
+            )
+            np.save(
+                os.path.join(path, "token_ids.npy"), np.asarray(token_ids, np.uint32)
+            )
+            np.save(
+                os.path.join(path, "token_tfs.npy"), np.asarray(token_tfs, np.uint32)
+            )
+            data["tokens"] = tokens
+        _write_json(os.path.join(path, "segment.json"), data)
+
+
+class InvertedIndex:
+    """
+    Segmented keyword index over CVs with incremental add and delete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._manifest_mtime = None
+        self._open()
+
+    def _open(self):
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if os.path.exists(manifest_path):
+            self._manifest_mtime = os.stat(manifest_path).st_mtime_ns
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        else:
+            manifest = {
+                "segments": [],
+                "next_doc": 0,
+                "deleted": [],
+                "version": KEYWORDS_VERSION,
+            }
+        self.next_doc = manifest["next_doc"]
+        # The KEYWORDS_VERSION of the counts; indexes from before it was
+        # recorded have None and must be rebuilt to be searched or added to
+        self.version = manifest.get("version")
+        self.segments = [
+            _Segment(os.path.join(self.path, name)) for name in manifest["segments"]
+        ]
+        self.deleted = set(manifest["deleted"])
+        self._load_documents()
+
+    def refresh(self):
+        """
+        Reopen the index if another process (ingest.py, say) has changed it.
+        """
+        try:
+            mtime = os.stat(os.path.join(self.path, MANIFEST)).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._manifest_mtime:
+            self._open()
+
+    def _load_documents(self):
+        # Per-document lookups indexed by document number
+        self.norms = np.zeros(self.next_doc, np.float32)
+        self.doc_cv_ids = [None] * self.next_doc
+        self.doc_segments = np.zeros(self.next_doc, np.int32)
+        self.live_docs = {}
+        for number, segment in enumerate(self.segments):
+            self.norms[segment.docs] = segment.norms
+            self.doc_segments[segment.docs] = number
+            for doc, cv_id in zip(segment.docs.tolist(), segment.cv_ids):
+                self.doc_cv_ids[doc] = cv_id
+                if doc not in self.deleted:
+                    self.live_docs[cv_id] = doc
+
+    def _save_manifest(self):
+        _write_json(
+            os.path.join(self.path, MANIFEST),
+            {
+                "segments": [os.path.basename(s.path) for s in self.segments],
+                "next_doc": self.next_doc,
+                "deleted": sorted(self.deleted),
+                "version": self.version,
+            },
+        )
+        self._manifest_mtime = os.stat(os.path.join(self.path, MANIFEST)).st_mtime_ns
+
+    def __len__(self):
+        return len(self.live_docs)
+
+    def __contains__(self, cv_id):
+        return cv_id in self.live_docs
+
+    @property
+    def current(self):
+        """
+        Whether the index was built with the keyword counts extracted now.
+        """
+        return self.version == KEYWORDS_VERSION
+
+    @property
+    def exact(self):
+        """
+        Whether every segment keeps the score tokens that exact scores need.
+        """
+        return all(segment.tokens is not None for segment in self.segments)
+
+    @property
+    def vocabulary(self):
+        """
+        The keywords of the indexed CVs.
+        """
+        return dict.fromkeys(
+            term for segment in self.segments for term in segment.lexicon
+        )
+
+    def add(self, documents):
+        """
+        Index an iterable of (cv_id, text) pairs as one new segment.
+
+        A cv_id that is already indexed is replaced.
+        """
+        cv_ids, keyword_counts, token_counts = [], [], []
+        for cv_id, text in documents:
+            cv_ids.append(cv_id)
+            keyword_counts.append(extract_keywords(text))
+            token_counts.append(score_tokens(text))
+        return self.add_counts(cv_ids, keyword_counts, token_counts)
+
+    def add_counts(self, cv_ids, keyword_counts, token_counts=None):
+        """
+        Index precomputed keyword and score token Counters as one new segment.
+
+        Without token_counts, searches fall back to keyword cosine scores.
+        """
+        if not cv_ids:
+            return 0
+        if not self.current:
+            raise ValueError(
+                f"{self.path} holds keyword counts of version {self.version}, not "
+                f"{KEYWORDS_VERSION}; index the CVs into a new directory"
+            )
+        # The last occurrence of a repeated id wins, as with separate adds
+        latest = {cv_id: i for i, cv_id in enumerate(cv_ids)}
+        keep = sorted(latest.values())
+        cv_ids = [cv_ids[i] for i in keep]
+        keyword_counts = [keyword_counts[i] for i in keep]
+        if token_counts is not None:
+            token_counts = [token_counts[i] for i in keep]
+        for cv_id in cv_ids:
+            if cv_id in self.live_docs:
+                self.deleted.add(self.live_docs[cv_id])
+        docs = list(range(self.next_doc, self.next_doc + len(cv_ids)))
+        name = f"seg-{docs[0]:010d}"
+        _Segment.write(
+            os.path.join(self.path, name), docs, cv_ids, keyword_counts, token_counts
+        )
+        self.next_doc += len(cv_ids)
+        self.segments.append(_Segment(os.path.join(self.path, name)))
+        self._save_manifest()
+        self._load_documents()
+        return len(cv_ids)
+
+    def delete(self, cv_ids):
+        """
+        Remove CVs from the index. Returns how many were found.
+        """
+        removed = 0
+        for cv_id in cv_ids:
+            doc = self.live_docs.pop(cv_id, None)
+            if doc is not None:
+                self.deleted.add(doc)
+                removed += 1
+        if removed:
+            self._save_manifest()
+        return removed
+
+    def compact(self):
+        """
+        Merge every segment into one and drop deleted documents.
+        """
+        if len(self.segments) <= 1 and not self.deleted:
+            return
+        per_doc = {}
+        for segment in self.segments:
+            for term, (start, end) in segment.lexicon.items():
+                docs = segment.doc_ids[start:end].tolist()
+                tfs = segment.tfs[start:end].tolist()
+                for doc, tf in zip(docs, tfs):
+                    if doc not in self.deleted:
+                        per_doc.setdefault(doc, {})[term] = tf
+        docs = sorted(self.live_docs.values())
+        cv_ids = [self.doc_cv_ids[doc] for doc in docs]
+        keyword_counts = [Counter(per_doc.get(doc, {})) for doc in docs]
+        token_counts = None
+        if self.exact:
+            token_counts = [self._token_counts(doc) for doc in docs]
+        old_segments = self.segments
+        name = f"seg-{self.next_doc:010d}-compact"
+        _Segment.write(
+            os.path.join(self.path, name), docs, cv_ids, keyword_counts, token_counts
+        )
+        self.segments = [_Segment(os.path.join(self.path, name))]
+        self.deleted = set()
+        self._save_manifest()
+        for segment in old_segments:
+            shutil.rmtree(segment.path, ignore_errors=True)
+        self._load_documents()
+
+    def _token_counts(self, doc):
+        return self.segments[self.doc_segments[doc]].token_counts(doc)
+
+    def candidates(self, keyword_counts):
+        """
+        Return (document numbers, dot products) for live CVs sharing a keyword.
+        """
+        doc_parts, weight_parts = [], []
+        for term, query_tf in keyword_counts.items():
+            for segment in self.segments:
+                postings = segment.postings(term)
+                if postings is not None:
+                    doc_parts.append(postings[0])
+                    weight_parts.append(postings[1].astype(np.float64) * query_tf)
+        if not doc_parts:
+            return np.empty(0, np.int64), np.empty(0)
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        dots = np.bincount(inverse, weights=np.concatenate(weight_parts))
+        if self.deleted:
+            live = ~np.isin(docs, list(self.deleted))
+            docs, dots = docs[live], dots[live]
+        return docs, dots
+
+    def exact_scores(self, docs, query_text):
+        """
+        Return the match percentage of each document against the query, as
+        calculate_match_percentage gives it, from their stored score tokens.
+        """
+        query_tokens = score_tokens(query_text)
+        return [match_percentage(self._token_counts(doc), query_tokens) for doc in docs]
+
+    def search(self, query_text, k=50, shortlist=SHORTLIST, rescore=None):
+        """
+        Return the top k (cv_id, score) pairs for a job description.
+
+        The posting lists shortlist the best matches by keyword cosine, and the
+        shortlist is rescored: by rescore, if given, which is called with the
+        shortlisted cv_ids and returns their scores, and otherwise with
+        exact_scores(). An index written before score tokens were kept scores
+        by keyword cosine (as a percentage).
+        """
+        keyword_counts = extract_keywords(query_text)
+        docs, dots = self.candidates(keyword_counts)
+        if not len(docs):
+            return []
+        query_norm = np.sqrt(sum(tf * tf for tf in keyword_counts.values()))
+        scores = dots / (self.norms[docs] * query_norm) * 100
+        limit = min(max(k, shortlist), len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        cv_ids = [self.doc_cv_ids[doc] for doc in docs[top]]
+        if rescore is not None:
+            ranked = zip(cv_ids, rescore(cv_ids))
+        elif self.exact:
+            ranked = zip(cv_ids, self.exact_scores(docs[top].tolist(), query_text))
+        else:
+            ranked = zip(cv_ids, scores[top].tolist())
+        return sorted(ranked, key=lambda pair: -pair[1])[:k]
+
+    def rank(self, jd_text, k=50):
+        """
+        Return the top k (cv_id, match percentage) pairs, best first, like
+        CVRanker.rank.
+        """
+        return self.search(jd_text, k)
+
+    def present_terms(self, cv_id, terms):
+        """
+        Return the terms, in the order given, that occur in the CV with this id.
+        """
+        doc = self.live_docs[cv_id]
+        if self.exact:
+            present = self._token_counts(doc)
+        else:
+            present = set()
+            for term in terms:
+                for segment in self.segments:
+                    postings = segment.postings(term)
+                    if postings is None:
+                        continue
+                    position = np.searchsorted(postings[0], doc)
+                    if position < len(postings[0]) and postings[0][position] == doc:
+                        present.add(term)
+        return [term for term in terms if term in present]
+
+
+def main():
+    from ranking import read_jsonl
+
+    parser = argparse.ArgumentParser(description="Maintain or query a CV index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="index a JSONL file of CVs")
+    add.add_argument("index")
+    add.add_argument("source")
+    delete = commands.add_parser("delete", help="remove CVs by id")
+    delete.add_argument("index")
+    delete.add_argument("cv_ids", nargs="+")
+    compact = commands.add_parser("compact", help="merge segments")
+    compact.add_argument("index")
+    search = commands.add_parser("search", help="rank CVs for a job")
+    search.add_argument("index")
+    search.add_argument("job_description", help="path to a job description text file")
+    search.add_argument("-k", type=int, default=50)
+    args = parser.parse_args()
+
+    index = InvertedIndex(args.index)
+    if args.command == "add":
+        print(f"indexed {index.add(read_jsonl(args.source))} CVs")
+    elif args.command == "delete":
+        print(f"deleted {index.delete(args.cv_ids)} CVs")
+    elif args.command == "compact":
+        index.compact()
+        print(f"{len(index)} CVs in {len(index.segments)} segment(s)")
+    else:
+        with open(args.job_description, encoding="utf-8") as f:
+            jd_text = f.read()
+        for position, (cv_id, score) in enumerate(index.search(jd_text, args.k), 1):
+            print(f"{position:>4}  {score:6.2f}%  {cv_id}")
+
+
+if __name__ == "__main__":
+    main()
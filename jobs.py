@@ -0,0 +1,156 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Background execution of the Analyze callbacks.
+
+The Analyze callbacks are Dash background callbacks. A click returns at once,
+the work runs in a separate process and the browser polls for the result, so
+the web workers stay free however long an analysis takes. Jobs and their
+progress are kept in a diskcache directory, with no broker to run. Clicking
+Analyze again terminates the job it supersedes, and Clear terminates the
+running jobs (Dash does both for background callbacks).
+
+Dash starts one process per job, so at most WORKERS jobs run at once: each
+job takes a worker slot before doing any work and waits, reported as queued,
+until one is free. A slot records its owner's pid, and a slot whose owner has
+died is reclaimed, so a cancelled job never leaks its slot.
+
+Jobs are forked from a forkserver, a single-threaded process that has imported
+the app and loaded its models (see warmup.py), not from the web server itself:
+a child forked from a busy threaded server can inherit a lock (SQLite's, for
+one) held by another thread at that moment and hang on its first query.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from cache import CACHE_DIR, pid_alive
+
+JOB_CACHE_DIR = os.path.join(CACHE_DIR, "jobs")
+WORKERS = int(os.environ.get("SKILLS_MATCH_WORKERS", os.cpu_count() or 1))
+
+_slots = None
+_manager = None
+
+
+def _run_job(registry_key, *args):
+    """
+    Run a job in a forkserver child with the callback the child registered
+    when it imported the app, so the callback is never pickled. The job's
+    metrics are flushed as it ends: a multiprocessing child exits without
+    running atexit handlers.
+    """
+    try:
+        _manager.func_registry[registry_key](*args)
+    finally:
+        from metrics import flush
+
+        flush()
+
+
+def make_background_manager(callbacks_module="app"):
+    """
+    Return the Dash background callback manager backed by a local disk cache.
+
+    callbacks_module is the module defining the background callbacks, which
+    the forkserver imports once, with warmup, so that each job starts warm. It
+    is imported by name even when the app is run as a script: multiprocessing
+    does not preload "__main__" in a forkserver, and a job re-running the
+    script against modules already imported takes only milliseconds.
+    """
+    global _manager
+    import diskcache
+    import multiprocess
+    import psutil
+    from dash import DiskcacheManager
+
+    context = multiprocess.get_context("forkserver")
+    context.set_forkserver_preload([callbacks_module, "warmup"])
+
+    class ForkserverManager(DiskcacheManager):
+        def call_job_fn(self, key, job_fn, args, context_):
+            registry_key = next(
+                k for k, fn in self.func_registry.items() if fn is job_fn
+            )
+            process = context.Process(
+                target=_run_job,
+                args=(registry_key, key, self._make_progress_key(key), args, context_),
+            )
+            process.start()
+            return process.pid
+
+        # The forkserver reaps a finished job at once, so it can vanish between
+        # Dash checking that its pid exists and looking the process up
+        def terminate_job(self, job):
+            try:
+                super().terminate_job(job)
+            except psutil.NoSuchProcess:
+                pass
+
+        def job_running(self, job):
+            try:
+                return super().job_running(job)
+            except psutil.NoSuchProcess:
+                return False
+
+    _manager = ForkserverManager(diskcache.Cache(JOB_CACHE_DIR))
+    return _manager
+
+
+def _slot_cache():
+    global _slots
+    if _slots is None:
+        import diskcache
+
+        _slots = diskcache.Cache(os.path.join(CACHE_DIR, "worker_slots"))
+    return _slots
+
+
+@contextmanager
+def worker_slot(on_wait=None, poll_interval=0.1):
+    """
+    Hold one of the WORKERS job slots for the duration of the block.
+
+    on_wait is called once if the job has to queue for a slot.
+    """
+    cache = _slot_cache()
+    pid = os.getpid()
+    waiting = False
+    while True:
+        for number in range(WORKERS):
+            key = f"slot:{number}"
+            if cache.add(key, pid, retry=True):
+                try:
+                    yield
+                finally:
+                    with cache.transact(retry=True):
+                        if cache.get(key) == pid:
+                            cache.delete(key)
+                return
+            holder = cache.get(key, retry=True)
+            if holder is not None and not pid_alive(holder):
+                # The job holding this slot was terminated; free it
+                with cache.transact(retry=True):
+                    if cache.get(key) == holder:
+                        cache.delete(key)
+        if not waiting and on_wait is not None:
+            on_wait()
+        waiting = True
+        time.sleep(poll_interval)
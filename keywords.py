@@ -0,0 +1,236 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import os
+import pickle
+import re
+from collections import Counter
+from functools import lru_cache
+
+from normalize import NORMALIZATION, normalize_counts
+
+# NLTK resources are read from this directory and never downloaded at runtime.
+# The English stopword list is vendored here; run download_nltk_data.py once at
+# build time to add the Punkt sentence model.
+NLTK_DATA_DIR = os.environ.get(
+    "SKILLS_MATCH_NLTK_DATA",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"),
+)
+
+
+def punkt_path(language="english"):
+    """
+    Return where the Punkt sentence model for a language is installed (NLTK
+    loads the PY3 copy of the model the download unpacks).
+    """
+    return os.path.join(
+        NLTK_DATA_DIR, "tokenizers", "punkt", "PY3", f"{language}.pickle"
+    )
+
+
+# Bump whenever extract_keywords would give different counts for the same text,
+# so stored counts (see store.py) are recomputed. 2: sentences end at line breaks.
+TOKENIZER_VERSION = 2
+# Without the Punkt model sentences are split by an untrained tokenizer, which
+# splits (and so counts) differently, so its counts are versioned apart
+PUNKT_INSTALLED = os.path.exists(punkt_path())
+_TOKENIZER = (
+    str(TOKENIZER_VERSION) if PUNKT_INSTALLED else f"{TOKENIZER_VERSION}-untrained"
+)
+# The version of the counts extract_keywords gives, with the sentence splitter
+# and the normalization in use
+KEYWORDS_VERSION = f"{_TOKENIZER}:{NORMALIZATION}" if NORMALIZATION else _TOKENIZER
+
+# A whitespace-delimited chunk that nltk.word_tokenize would split into at most
+# one alphabetic word plus brackets and trailing punctuation, e.g. "(Python),".
+# Anything else goes through the full NLTK tokenizer.
+_SIMPLE_CHUNK = re.compile(r"[(\[{<]?([^\W\d_]+)[)\]}>]?[,;:?!]?")
+# The last chunk of a sentence may also carry the sentence-final period.
+_SIMPLE_LAST_CHUNK = re.compile(r"[(\[{<]?([^\W\d_]+)[)\]}>]?[,;:?!]?\.?")
+_CHUNK = re.compile(r"\S+")
+
+# Whole words that the NLTK tokenizer splits in two (its MacIntyre contractions).
+_CONTRACTIONS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+
+def load_stopwords(language="english"):
+    """
+    Return the vendored NLTK stopword list for a language as a frozenset.
+    """
+    path = os.path.join(NLTK_DATA_DIR, "corpora", "stopwords", language)
+    with open(path, encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+def load_sentence_tokenizer(language="english"):
+    """
+    Load the Punkt sentence tokenizer from the local NLTK data directory.
+
+    Falls back to an untrained Punkt tokenizer, with a warning, rather than
+    reaching for the network when the model has not been installed. For
+    English, whether it is installed was settled when this module was
+    imported, so the tokenizer always matches KEYWORDS_VERSION.
+    """
+    from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+    path = punkt_path(language)
+    installed = PUNKT_INSTALLED if language == "english" else os.path.exists(path)
+    if installed:
+        # What nltk.data.load does for a pickle, without searching its other
+        # data directories
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    print(
+        f"Punkt model for {language} not found under {NLTK_DATA_DIR}; "
+        "run download_nltk_data.py. Using an untrained sentence splitter, "
+        f"keyword counts version {KEYWORDS_VERSION}."
+    )
+    return PunktSentenceTokenizer()
+
+
+class KeywordExtractor:
+    """
+    Count the non-stopword alphabetic words in a document.
+
+    Produces the same counts as running nltk.word_tokenize on each line,
+    lowercasing the alphabetic tokens and dropping English stopwords, but in one
+    pass over the text. Lines are split into sentences with Punkt as before, and
+    no sentence spans two lines, so a document's counts are the sum of its
+    lines' counts (which incremental.py relies on). Within a sentence, plain
+    words and words with simple punctuation are matched with a precompiled
+    regex. Only unusual chunks such as "don't" or "Node.js" are handed to the
+    NLTK word tokenizer.
+
+    With normalize, the counted words are then stemmed or lemmatized as
+    SKILLS_MATCH_NORMALIZE says (see normalize.py).
+    """
+
+    def __init__(self, stop_words=None, language="english", normalize=True):
+        if stop_words is None:
+            stop_words = load_stopwords(language)
+        self.stop_words = frozenset(stop_words)
+        self.language = language
+        self.normalize = normalize
+        self._sentences = load_sentence_tokenizer(language)
+
+    def iter_words(self, text):
+        """
+        Yield the lowercased alphabetic words of text, stopwords included.
+        """
+        for line in text.splitlines():
+            for sentence in self._sentences.tokenize(line):
+                yield from self._sentence_words(sentence)
+
+    def _sentence_words(self, sentence):
+        chunks = list(_CHUNK.finditer(sentence))
+        last = len(chunks) - 1
+        for i, chunk in enumerate(chunks):
+            word = chunk.group()
+            if i == last:
+                match = _SIMPLE_LAST_CHUNK.fullmatch(word)
+            else:
+                match = _SIMPLE_CHUNK.fullmatch(word)
+            if match is not None and match.group(1).isalpha():
+                word = match.group(1).lower()
+                if word in _CONTRACTIONS:
+                    yield from _CONTRACTIONS[word]
+                else:
+                    yield word
+                continue
+            yield from self._tokenize_chunk(sentence, chunk, i == last)
+
+    def _tokenize_chunk(self, sentence, chunk, is_last):
+        # The NLTK rules only look past a chunk at the whitespace that follows
+        # it, so tokenizing the chunk with that whitespace gives the same words.
+        end = chunk.end()
+        while end < len(sentence) and sentence[end].isspace():
+            end += 1
+        return _nltk_words(sentence[chunk.start() : end], is_last)
+
+    def extract(self, text):
+        """
+        Return a Counter of the keywords in text.
+        """
+        stop_words = self.stop_words
+        counts = Counter(
+            word for word in self.iter_words(text) if word not in stop_words
+        )
+        return normalize_counts(counts) if self.normalize else counts
+
+    def extract_many(self, texts):
+        """
+        Return a list of keyword Counters, one per text.
+        """
+        return [self.extract(text) for text in texts]
+
+
+_word_tokenizer = None
+
+
+@lru_cache(maxsize=16384)
+def _nltk_words(text, is_last):
+    """
+    Return the lowercased alphabetic words NLTK finds in one chunk.
+
+    Inner chunks get a placeholder word appended so the tokenizer does not treat
+    them as the end of the sentence and split off a trailing period. Odd chunks
+    such as "don't" repeat a lot, so results are memoized.
+    """
+    global _word_tokenizer
+    if _word_tokenizer is None:
+        from nltk.tokenize import NLTKWordTokenizer
+
+        _word_tokenizer = NLTKWordTokenizer()
+    tokens = _word_tokenizer.tokenize(text if is_last else text + "x")
+    if not is_last:
+        tokens = tokens[:-1]
+    return tuple(token.lower() for token in tokens if token.isalpha())
+
+
+_default_extractor = None
+
+
+def get_extractor():
+    """
+    Return the shared English KeywordExtractor, building it on first use.
+    """
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = KeywordExtractor()
+    return _default_extractor
+
+
+def extract_keywords(text):
+    """
+    Extract keywords from text.
+    """
+    return get_extractor().extract(text)
+
+
+def extract_keywords_many(texts):
+    """
+    Extract keywords from each of a batch of texts.
+    """
+    return get_extractor().extract_many(texts)
@@ -0,0 +1,328 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Per-stage timings, document sizes, error counts and cache statistics.
+
+Wrap a stage in `with timed("stage"):` or decorate a function with
+@timed("stage") to record its latency, and count it as an error if it raises.
+The Analyze stages run in background job processes, so observations are kept
+in a diskcache directory that every process updates atomically, and /metrics
+serves them in the Prometheus text format. A process adds its observations up
+in memory and writes them in one transaction every
+SKILLS_MATCH_METRICS_FLUSH_SECONDS, when a job ends and when it exits, so a
+timed stage costs a dictionary update rather than a write to SQLite.
+SKILLS_MATCH_METRICS=0 turns recording off, leaving the timers as no-ops.
+
+With SKILLS_MATCH_PROFILE_DIR set, a request sent with an X-Profile: 1 header
+(or ?profile=1) is run under cProfile and the stats are written to that
+directory. The JSON API runs the whole analysis inside the request, so
+profiling a call to /api/score profiles one analysis end to end.
+"""
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, g, request
+
+from cache import CACHE_DIR
+
+METRICS_DIR = os.path.join(CACHE_DIR, "metrics")
+ENABLED = os.environ.get("SKILLS_MATCH_METRICS", "1") != "0"
+FLUSH_SECONDS = float(os.environ.get("SKILLS_MATCH_METRICS_FLUSH_SECONDS", 5))
+PROFILE_DIR = os.environ.get("SKILLS_MATCH_PROFILE_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 2e7)
+# Sums are stored as integers (diskcache increments are integer only)
+_SUM_SCALE = 1_000_000
+
+_store = None
+_histograms = {}
+_counters = {}
+_caches = {}
+# Increments not yet written to the store, by key
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+blueprint = Blueprint("metrics", __name__)
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        import diskcache
+
+        _store = diskcache.Cache(METRICS_DIR)
+    return _store
+
+
+def _add(*increments):
+    """
+    Add (key, amount) increments to this process's pending observations, and
+    flush them once FLUSH_SECONDS have passed since the last flush.
+    """
+    with _pending_lock:
+        for key, amount in increments:
+            _pending[key] = _pending.get(key, 0) + amount
+        due = time.monotonic() - _last_flush >= FLUSH_SECONDS
+    if due:
+        flush()
+
+
+def flush():
+    """
+    Write this process's pending observations to the store in one transaction.
+    """
+    global _pending, _last_flush
+    with _pending_lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    store = _get_store()
+    with store.transact(retry=True):
+        for key, amount in pending.items():
+            store.incr(key, amount, retry=True)
+
+
+def _forget_pending():
+    # A forked child (a job, a web worker) starts with its parent's pending
+    # observations, which the parent writes itself
+    global _pending, _pending_lock, _last_flush
+    _pending = {}
+    _pending_lock = threading.Lock()
+    _last_flush = time.monotonic()
+
+
+os.register_at_fork(after_in_child=_forget_pending)
+atexit.register(flush)
+
+
+def count(key, amount=1):
+    """
+    Add to a count shared between processes that /metrics does not report by
+    itself, such as a DiskCache's hits and misses. Batched like observations.
+    """
+    if ENABLED:
+        _add((key, amount))
+
+
+def total(key):
+    """
+    Return a count kept with count(), including this process's unflushed part.
+    """
+    with _pending_lock:
+        pending = _pending.get(key, 0)
+    return _get_store().get(key, 0, retry=True) + pending
+
+
+class Histogram:
+    """
+    Prometheus histogram with one label, shared between processes.
+    """
+
+    def __init__(self, name, description, label, buckets):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        _histograms[name] = self
+
+    def observe(self, value, label_value):
+        if not ENABLED:
+            return
+        bucket = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        _add(
+            ((self.name, label_value, "bucket", bucket), 1),
+            ((self.name, label_value, "count"), 1),
+            ((self.name, label_value, "sum"), int(value * _SUM_SCALE)),
+        )
+
+
+class Counter:
+    """
+    Prometheus counter with one label, shared between processes.
+    """
+
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        _counters[name] = self
+
+    def inc(self, label_value, amount=1):
+        if ENABLED:
+            _add(((self.name, label_value), amount))
+
+
+stage_seconds = Histogram(
+    "skills_match_stage_seconds",
+    "Time spent in each analysis stage.",
+    "stage",
+    LATENCY_BUCKETS,
+)
+document_bytes = Histogram(
+    "skills_match_document_bytes",
+    "Size of uploaded CVs and extracted texts.",
+    "kind",
+    SIZE_BUCKETS,
+)
+errors = Counter(
+    "skills_match_errors_total", "Exceptions raised by each analysis stage.", "stage"
+)
+normalize_lookups = Counter(
+    "skills_match_normalize_lookups_total",
+    "Lookups in the word normalization memo table, by result (hit or miss).",
+    "result",
+)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Record the duration of a block, or of a function when used as a decorator.
+    """
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
+
+
+def register_cache(name, cache):
+    """
+    Report a cache's hit and miss counts (anything with a stats() method).
+    """
+    _caches[name] = cache
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    Return every metric in the Prometheus text exposition format.
+
+    Other processes' observations appear once they flush them: with their
+    first observation after FLUSH_SECONDS, at the end of a job or on exit.
+    """
+    histograms = {}
+    counters = {}
+    if ENABLED:
+        flush()
+        store = _get_store()
+        for key in store.iterkeys():
+            value = store.get(key, 0, retry=True)
+            if key[0] in _histograms:
+                series = histograms.setdefault(key[0], {}).setdefault(key[1], {})
+                series[key[2:]] = value
+            elif key[0] in _counters:
+                counters.setdefault(key[0], {})[key[1]] = value
+
+    lines = []
+    for name, histogram in _histograms.items():
+        lines.append(f"# HELP {name} {histogram.description}")
+        lines.append(f"# TYPE {name} histogram")
+        for label_value, values in sorted(histograms.get(name, {}).items()):
+            label = f'{histogram.label}="{_label(label_value)}"'
+            cumulative = 0
+            bounds = [_number(b) for b in histogram.buckets] + ["+Inf"]
+            for i, bound in enumerate(bounds):
+                cumulative += values.get(("bucket", i), 0)
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            total = values.get(("sum",), 0) / _SUM_SCALE
+            lines.append(f"{name}_sum{{{label}}} {_number(total)}")
+            lines.append(f"{name}_count{{{label}}} {values.get(('count',), 0)}")
+    for name, counter in _counters.items():
+        lines.append(f"# HELP {name} {counter.description}")
+        lines.append(f"# TYPE {name} counter")
+        for label_value, value in sorted(counters.get(name, {}).items()):
+            lines.append(f'{name}{{{counter.label}="{_label(label_value)}"}} {value}')
+
+    stats = {name: cache.stats() for name, cache in _caches.items()}
+    for metric, field, kind, description in [
+        ("skills_match_cache_hits_total", "hits", "counter", "Cache hits."),
+        ("skills_match_cache_misses_total", "misses", "counter", "Cache misses."),
+        ("skills_match_cache_hit_ratio", "hit_ratio", "gauge", "Cache hit ratio."),
+        ("skills_match_cache_size", "size", "gauge", "Cache size (bytes on disk)."),
+    ]:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in stats.items():
+            lines.append(f'{metric}{{cache="{name}"}} {_number(values[field])}')
+    return "\n".join(lines) + "\n"
+
+
+@blueprint.route("/metrics")
+def serve_metrics():
+    return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _wants_profile():
+    return request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1"
+
+
+def _start_profile():
+    if _wants_profile():
+        import cProfile
+
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _stop_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = request.path.strip("/").replace("/", "_") or "index"
+        path = os.path.join(
+            PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.prof"
+        )
+        profiler.dump_stats(path)
+        response.headers["X-Profile-Path"] = path
+    return response
+
+
+def init_app(server):
+    """
+    Add /metrics and, if PROFILE_DIR is set, per-request profiling to a server.
+    """
+    server.register_blueprint(blueprint)
+    if PROFILE_DIR:
+        server.before_request(_start_profile)
+        server.after_request(_stop_profile)
@@ -0,0 +1,256 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+
+"""
+Optional normalization of words to a common form, so "developer", "developers"
+and "developing" count as one keyword and one score token.
+
+SKILLS_MATCH_NORMALIZE chooses the method: "stem" (NLTK's Snowball stemmer,
+e.g. "develop"), "lemma" (WordNet lemmas, which stay readable words, e.g.
+"developer" and "develop"; run download_nltk_data.py for the WordNet data) or
+empty, the default, to count words as they are written.
+
+Stemming every token would multiply the cost of keyword extraction, so words
+are normalized after counting, once per distinct word in a document, through a
+process-wide memo table from surface form to normalized form. Word frequencies
+are Zipfian, so most lookups hit it once it holds the common vocabulary. It is
+bounded by SKILLS_MATCH_NORMALIZE_MEMO entries; once full it keeps what it has
+and normalizes further words without storing them. warm() fills it ahead of
+time, e.g. from the CV corpus vocabulary before job processes are forked (see
+warmup.py), and stats() reports its hit rate.
+
+    python normalize.py cvs.jsonl --method stem
+"""
+
+import argparse
+import os
+from collections import Counter
+
+NORMALIZATION = os.environ.get("SKILLS_MATCH_NORMALIZE", "").strip().lower()
+METHODS = ("stem", "lemma")
+MEMO_SIZE = int(os.environ.get("SKILLS_MATCH_NORMALIZE_MEMO", 200_000))
+
+
+def load_method(method, language="english"):
+    """
+    Return a function from a lowercased word to its normalized form.
+
+    Falls back to the stemmer, with a warning, when the WordNet data for
+    lemmatization has not been installed.
+    """
+    if method not in METHODS:
+        raise ValueError(f"normalization must be one of {METHODS}, not {method!r}")
+    from nltk.stem import SnowballStemmer
+
+    if method == "lemma":
+        import nltk
+        from nltk.stem import WordNetLemmatizer
+
+        from keywords import NLTK_DATA_DIR
+
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        try:
+            # Also finds the zipped corpus nltk.download leaves
+            nltk.data.find("corpora/wordnet/")
+        except LookupError:
+            print(
+                f"WordNet not found under {NLTK_DATA_DIR}; run "
+                "download_nltk_data.py. Stemming instead of lemmatizing."
+            )
+            return SnowballStemmer(language).stem
+        lemmatize = WordNetLemmatizer().lemmatize
+        # Plural nouns, then verb forms: "developers" -> "developer",
+        # "developing" -> "develop"
+        return lambda word: lemmatize(lemmatize(word, "n"), "v")
+    return SnowballStemmer(language).stem
+
+
+class Normalizer:
+    """
+    Normalizes words through a bounded memo table of surface form to normal
+    form.
+
+    Lookups are counted once per distinct word in each normalized Counter.
+    """
+
+    def __init__(self, method="stem", maxsize=MEMO_SIZE, language="english"):
+        self.method = method
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._normalize = load_method(method, language)
+        self._memo = {}
+
+    def normalize(self, word):
+        """
+        Return the normalized form of a lowercased word.
+        """
+        form = self._memo.get(word)
+        if form is None:
+            self.misses += 1
+            form = self._remember(word)
+        else:
+            self.hits += 1
+        return form
+
+    def _remember(self, word):
+        form = self._normalize(word)
+        if len(self._memo) < self.maxsize:
+            self._memo[word] = form
+        return form
+
+    def normalize_counts(self, counts):
+        """
+        Return a Counter of the normalized forms of a Counter's words, with the
+        counts of words sharing a form added together.
+        """
+        memo = self._memo
+        normalized = Counter()
+        misses = 0
+        for word, count in counts.items():
+            form = memo.get(word)
+            if form is None:
+                misses += 1
+                form = self._remember(word)
+            normalized[form] += count
+        self.hits += len(counts) - misses
+        self.misses += misses
+        return normalized
+
+    def warm(self, words):
+        """
+        Normalize words into the memo table ahead of use, in the order given,
+        until it is full. Return the number of words added.
+        """
+        memo = self._memo
+        added = 0
+        for word in words:
+            if len(memo) >= self.maxsize:
+                break
+            if word not in memo:
+                memo[word] = self._normalize(word)
+                added += 1
+        return added
+
+    def clear(self):
+        self._memo.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        Return hit/miss counts and the size of the memo table.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._memo),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._memo)
+
+
+_normalizer = None
+
+
+def get_normalizer():
+    """
+    Return the process-wide Normalizer, or None if normalization is off.
+    """
+    global _normalizer
+    if _normalizer is None and NORMALIZATION:
+        _normalizer = Normalizer(NORMALIZATION)
+    return _normalizer
+
+
+def normalize_counts(counts):
+    """
+    Return counts with their words normalized, or unchanged if normalization
+    is off.
+    """
+    normalizer = get_normalizer()
+    return normalizer.normalize_counts(counts) if normalizer is not None else counts
+
+
+def warm_from_corpus():
+    """
+    Fill the memo table from the vocabulary of the CV corpus, if normalization
+    is on and a corpus has been built. Return the number of words added.
+    """
+    normalizer = get_normalizer()
+    if normalizer is None:
+        return 0
+    from analysis import get_ranker
+
+    ranker = get_ranker()
+    if ranker is None:
+        return 0
+    return normalizer.warm(ranker.vocabulary)
+
+
+def main():
+    from keywords import KeywordExtractor
+    from ranking import read_jsonl
+
+    parser = argparse.ArgumentParser(
+        description="Report how often the normalization memo table is hit on a "
+        "corpus of documents."
+    )
+    parser.add_argument("documents", help='JSONL file of {"id", "text"} lines')
+    parser.add_argument("--method", choices=METHODS, default=NORMALIZATION or "stem")
+    parser.add_argument("--maxsize", type=int, default=MEMO_SIZE)
+    parser.add_argument(
+        "--warm",
+        type=float,
+        default=0.0,
+        help="fraction of the documents whose vocabulary is warmed in first",
+    )
+    args = parser.parse_args()
+
+    extractor = KeywordExtractor(normalize=False)
+    texts = [text for _, text in read_jsonl(args.documents)]
+    split = int(len(texts) * args.warm)
+    normalizer = Normalizer(args.method, args.maxsize)
+    vocabulary = Counter()
+    for counts in extractor.extract_many(texts[:split]):
+        vocabulary.update(counts)
+    # Most frequent first, so a full table holds the head of the distribution
+    normalizer.warm(word for word, _ in vocabulary.most_common())
+
+    words = forms = 0
+    for counts in extractor.extract_many(texts[split:]):
+        normalized = normalizer.normalize_counts(counts)
+        words += len(counts)
+        forms += len(normalized)
+    stats = normalizer.stats()
+    print(
+        f"{len(texts) - split} documents ({split} warmed): {words} distinct words "
+        f"per document normalized to {forms}; {len(normalizer)} words in the memo "
+        f"table, hit ratio {stats['hit_ratio']:.1%} "
+        f"({stats['hits']} hits, {stats['misses']} misses)"
+    )
+
+
+if __name__ == "__main__":
+    main()
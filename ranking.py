@@ -0,0 +1,246 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Rank a job description against a corpus of CVs.
+
+The CV corpus is vectorized once with the same CountVectorizer settings that
+calculate_match_percentage uses, its words normalized the same way (see
+normalize.py), and kept as a sparse CSR term matrix with precomputed row
+norms. Scoring a job description is one sparse matrix-vector
+product followed by a top-k selection, and gives the same percentage as
+comparing the job description with each CV in turn.
+
+Build a corpus from a JSONL file of {"id": ..., "text": ...} lines with
+
+    python ranking.py build cvs.jsonl corpus_dir
+"""
+
+import argparse
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+from normalize import NORMALIZATION, Normalizer, get_normalizer
+
+
+class CVRanker:
+    """
+    Sparse CV term matrix with a fitted vocabulary for one-JD-to-many-CV ranking.
+    """
+
+    def __init__(self, cv_ids, vocabulary, matrix, normalization=NORMALIZATION):
+        self.cv_ids = list(cv_ids)
+        self.vocabulary = vocabulary
+        # The normalization the vocabulary's words went through, "" for none
+        self.normalization = normalization
+        self.matrix = sp.csr_matrix(matrix, dtype=np.float64)
+        self.norms = np.sqrt(
+            np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel()
+        )
+        self._analyzer = None
+        self._normalizer = None
+        self._rows = None
+
+    @classmethod
+    def fit(cls, cv_ids, cv_texts, normalization=NORMALIZATION):
+        """
+        Build a ranker by vectorizing every CV text.
+        """
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        vectorizer = CountVectorizer()
+        matrix = vectorizer.fit_transform(cv_texts)
+        ranker = cls(cv_ids, vectorizer.vocabulary_, matrix, normalization)
+        if normalization:
+            # Add up the columns of the words sharing a normal form
+            normalize = ranker.normalizer.normalize
+            vocabulary, words, forms = {}, [], []
+            for word, column in sorted(vectorizer.vocabulary_.items()):
+                words.append(column)
+                forms.append(vocabulary.setdefault(normalize(word), len(vocabulary)))
+            merge = sp.csr_matrix(
+                (np.ones(len(words)), (words, forms)),
+                shape=(len(words), len(vocabulary)),
+            )
+            ranker = cls(cv_ids, vocabulary, matrix @ merge, normalization)
+        return ranker
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            from sklearn.feature_extraction.text import CountVectorizer
+
+            self._analyzer = CountVectorizer().build_analyzer()
+        return self._analyzer
+
+    @property
+    def normalizer(self):
+        """
+        The Normalizer for query words, or None if the corpus is not normalized.
+        """
+        if self._normalizer is None and self.normalization:
+            if self.normalization == NORMALIZATION:
+                # Share the process-wide memo table
+                self._normalizer = get_normalizer()
+            else:
+                self._normalizer = Normalizer(self.normalization)
+        return self._normalizer
+
+    def __len__(self):
+        return len(self.cv_ids)
+
+    def refresh(self):
+        """
+        Nothing to reload: the corpus is only ever rebuilt as a whole.
+        """
+
+    def vectorize(self, text):
+        """
+        Return the text as a 1 x V sparse row plus its full term-count norm.
+
+        Terms outside the corpus vocabulary cannot match any CV, but still count
+        towards the norm so scores agree with calculate_match_percentage.
+        """
+        counts = Counter(self.analyzer(text))
+        if self.normalizer is not None:
+            counts = self.normalizer.normalize_counts(counts)
+        columns, values = [], []
+        for term, count in counts.items():
+            column = self.vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+                values.append(count)
+        row = sp.csr_matrix(
+            (values, ([0] * len(columns), columns)),
+            shape=(1, self.matrix.shape[1]),
+            dtype=np.float64,
+        )
+        norm = float(np.sqrt(sum(c * c for c in counts.values())))
+        return row, norm
+
+    def scores(self, jd_text):
+        """
+        Return the match percentage of every CV against the job description.
+        """
+        row, jd_norm = self.vectorize(jd_text)
+        if jd_norm == 0 or not len(self):
+            return np.zeros(len(self))
+        dots = np.asarray((self.matrix @ row.T).todense()).ravel()
+        denominators = self.norms * jd_norm
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(denominators > 0, dots / denominators, 0.0)
+        return scores * 100
+
+    def rank(self, jd_text, k=50):
+        """
+        Return the top k (cv_id, match percentage) pairs, best first.
+        """
+        scores = self.scores(jd_text)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.cv_ids[i], float(scores[i])) for i in top]
+
+    def present_terms(self, cv_id, terms):
+        """
+        Return the terms, in the order given, that occur in the CV with this id.
+
+        Terms are keywords as extract_keywords gives them, so normalized the
+        same way as the corpus when the corpus was built with the current
+        SKILLS_MATCH_NORMALIZE.
+        """
+        if self._rows is None:
+            self._rows = {cv_id: row for row, cv_id in enumerate(self.cv_ids)}
+        row = self._rows[cv_id]
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        columns = set(self.matrix.indices[start:end].tolist())
+        return [term for term in terms if self.vocabulary.get(term) in columns]
+
+    def save(self, path):
+        """
+        Write the matrix, vocabulary and CV ids to a directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        sp.save_npz(os.path.join(path, "matrix.npz"), self.matrix)
+        with open(os.path.join(path, "corpus.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "cv_ids": self.cv_ids,
+                    "normalization": self.normalization,
+                    "vocabulary": {t: int(c) for t, c in self.vocabulary.items()},
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a ranker written by save().
+        """
+        matrix = sp.load_npz(os.path.join(path, "matrix.npz"))
+        with open(os.path.join(path, "corpus.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        # Corpora from before normalization was added were never normalized
+        normalization = data.get("normalization", "")
+        return cls(data["cv_ids"], data["vocabulary"], matrix, normalization)
+
+
+def read_jsonl(path):
+    """
+    Yield (id, text) pairs from a JSONL file of {"id": ..., "text": ...} lines.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["id"], record["text"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query a CV corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="vectorize a JSONL file of CVs")
+    build.add_argument("source")
+    build.add_argument("corpus")
+    query = commands.add_parser("rank", help="rank the corpus for a job description")
+    query.add_argument("corpus")
+    query.add_argument("job_description", help="path to a job description text file")
+    query.add_argument("-k", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        records = list(read_jsonl(args.source))
+        ranker = CVRanker.fit([r[0] for r in records], [r[1] for r in records])
+        ranker.save(args.corpus)
+        print(f"{len(ranker)} CVs, {len(ranker.vocabulary)} terms -> {args.corpus}")
+    else:
+        ranker = CVRanker.load(args.corpus)
+        with open(args.job_description, encoding="utf-8") as f:
+            jd_text = f.read()
+        for position, (cv_id, score) in enumerate(ranker.rank(jd_text, args.k), 1):
+            print(f"{position:>4}  {score:6.2f}%  {cv_id}")
+
+
+if __name__ == "__main__":
+    main()
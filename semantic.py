@@ -0,0 +1,295 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Semantic (latent semantic analysis) scoring of CVs against job descriptions.
+
+A TF-IDF + TruncatedSVD model is trained offline on a corpus of CVs and job
+descriptions, so words that appear in the same contexts ("postgres" and "sql",
+"k8s" and "kubernetes") land close together and synonyms are no longer scored
+as mismatches. The model is a fixed vocabulary, IDF weights and SVD components
+in .npy files; nothing is refitted per comparison.
+
+CV embeddings are precomputed into a float32 .npy matrix with unit-length rows
+that is memory-mapped at load, so every worker shares one copy through the page
+cache and scoring a job description against the whole corpus is one
+matrix-vector product.
+
+    python semantic.py train cvs.jsonl semantic --jds jds.jsonl --components 200
+    python semantic.py embed semantic cvs.jsonl
+    python semantic.py rank semantic job.txt -k 20
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+SEMANTIC_DIR = os.environ.get("SKILLS_MATCH_SEMANTIC", "semantic")
+
+
+class LSAModel:
+    """
+    TF-IDF weighting followed by a projection onto the SVD components.
+    """
+
+    def __init__(self, vocabulary, idf, components, version=""):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # n_components x n_terms
+        self.components = components
+        self.version = version
+        self._vectorizer = None
+
+    @classmethod
+    def fit(cls, texts, n_components=200, min_df=2, max_df=0.95, seed=0):
+        """
+        Train a model on an iterable of texts.
+        """
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        from keywords import load_stopwords
+
+        vectorizer = TfidfVectorizer(
+            sublinear_tf=True,
+            stop_words=sorted(load_stopwords()),
+            min_df=min_df,
+            max_df=max_df,
+            dtype=np.float32,
+        )
+        matrix = vectorizer.fit_transform(texts)
+        n_components = max(1, min(n_components, min(matrix.shape) - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=seed)
+        svd.fit(matrix)
+        return cls(
+            {term: int(column) for term, column in vectorizer.vocabulary_.items()},
+            vectorizer.idf_.astype(np.float32),
+            svd.components_.astype(np.float32),
+            version=time.strftime("%Y%m%dT%H%M%S"),
+        )
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import CountVectorizer
+
+            # Term counts only; the TF-IDF weighting is applied in embed()
+            self._vectorizer = CountVectorizer(vocabulary=self.vocabulary)
+        return self._vectorizer
+
+    def embed(self, texts):
+        """
+        Return unit-length float32 embeddings, one row per text.
+        """
+        counts = self.vectorizer.transform(texts).astype(np.float32)
+        # Sublinear term frequency and IDF, as in training. The TF-IDF length
+        # normalisation is folded into the final one, as the projection is linear.
+        counts.data = 1 + np.log(counts.data)
+        tfidf = counts.multiply(self.idf).tocsr()
+        vectors = np.asarray(tfidf @ self.components.T, dtype=np.float32)
+        lengths = np.linalg.norm(vectors, axis=1)
+        lengths[lengths == 0] = 1
+        return vectors / lengths[:, None]
+
+    def similarity(self, text, other):
+        """
+        Return the semantic match percentage of two texts.
+        """
+        a, b = self.embed([text, other])
+        return max(0.0, float(a @ b)) * 100
+
+    def save(self, path):
+        """
+        Write the model to a directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "idf.npy"), self.idf)
+        np.save(os.path.join(path, "components.npy"), self.components)
+        with open(os.path.join(path, "model.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "vocabulary": self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model written by save(), memory-mapping its arrays.
+        """
+        with open(os.path.join(path, "model.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["vocabulary"],
+            np.load(os.path.join(path, "idf.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "components.npy"), mmap_mode="r"),
+            version=meta["version"],
+        )
+
+
+class SemanticIndex:
+    """
+    Precomputed CV embeddings for one-JD-to-many-CV semantic ranking.
+    """
+
+    def __init__(self, model, cv_ids, embeddings):
+        self.model = model
+        self.cv_ids = list(cv_ids)
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.cv_ids)
+
+    @classmethod
+    def build(cls, model, records, path, batch_size=1000):
+        """
+        Embed (id, text) records into path/embeddings.npy, a batch at a time.
+        """
+        records = list(records)
+        out_path = os.path.join(path, "embeddings.npy")
+        tmp_path = os.path.join(path, f"embeddings.{os.getpid()}.tmp.npy")
+        embeddings = np.lib.format.open_memmap(
+            tmp_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(records), model.components.shape[0]),
+        )
+        for start in range(0, len(records), batch_size):
+            batch = records[start : start + batch_size]
+            embeddings[start : start + len(batch)] = model.embed([t for _, t in batch])
+        embeddings.flush()
+        del embeddings
+        os.replace(tmp_path, out_path)
+        # The ids are written last; load() checks they match the embeddings
+        tmp_ids = os.path.join(path, f"cv_ids.{os.getpid()}.tmp.json")
+        with open(tmp_ids, "w", encoding="utf-8") as f:
+            json.dump(
+                {"model_version": model.version, "cv_ids": [i for i, _ in records]}, f
+            )
+        os.replace(tmp_ids, os.path.join(path, "cv_ids.json"))
+        return cls.load(path, model)
+
+    @classmethod
+    def load(cls, path, model=None):
+        """
+        Load the embeddings in path, or None if they have not been built for
+        the model there.
+        """
+        model = model or LSAModel.load(path)
+        try:
+            with open(os.path.join(path, "cv_ids.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except OSError:
+            return None
+        if meta["model_version"] != model.version:
+            return None
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        if embeddings.shape != (len(meta["cv_ids"]), model.components.shape[0]):
+            return None
+        return cls(model, meta["cv_ids"], embeddings)
+
+    def scores(self, jd_text):
+        """
+        Return the semantic match percentage of every CV.
+        """
+        query = self.model.embed([jd_text])[0]
+        return np.clip(self.embeddings @ query, 0, None) * 100
+
+    def rank(self, jd_text, k=50):
+        """
+        Return the top k (cv_id, match percentage) pairs, best first.
+        """
+        scores = self.scores(jd_text)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.cv_ids[i], float(scores[i])) for i in top]
+
+
+_model = None
+_index = None
+
+
+def get_model():
+    """
+    Return the semantic model, or None if none has been trained.
+    """
+    global _model
+    if _model is None and os.path.exists(os.path.join(SEMANTIC_DIR, "model.json")):
+        _model = LSAModel.load(SEMANTIC_DIR)
+    return _model
+
+
+def get_index():
+    """
+    Return the semantic CV index, or None if no embeddings have been built.
+    """
+    global _index
+    if _index is None and get_model() is not None:
+        _index = SemanticIndex.load(SEMANTIC_DIR, get_model())
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and query the LSA model.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="train a model on JSONL documents")
+    train.add_argument("source", help="JSONL file of CVs")
+    train.add_argument("model")
+    train.add_argument("--jds", help="JSONL file of job descriptions to train on too")
+    train.add_argument("--components", type=int, default=200)
+    train.add_argument("--min-df", type=int, default=2)
+    embed = commands.add_parser("embed", help="precompute CV embeddings")
+    embed.add_argument("model")
+    embed.add_argument("source", help="JSONL file of CVs")
+    query = commands.add_parser("rank", help="rank the CVs for a job description")
+    query.add_argument("model")
+    query.add_argument("job_description", help="path to a job description text file")
+    query.add_argument("-k", type=int, default=50)
+    args = parser.parse_args()
+
+    from ranking import read_jsonl
+
+    if args.command == "train":
+        texts = [text for _, text in read_jsonl(args.source)]
+        if args.jds:
+            texts += [text for _, text in read_jsonl(args.jds)]
+        model = LSAModel.fit(texts, args.components, min_df=args.min_df)
+        model.save(args.model)
+        print(
+            f"{len(texts)} documents, {len(model.vocabulary)} terms, "
+            f"{model.components.shape[0]} components -> {args.model}"
+        )
+    elif args.command == "embed":
+        index = SemanticIndex.build(
+            LSAModel.load(args.model), read_jsonl(args.source), args.model
+        )
+        print(f"{len(index)} CVs embedded -> {args.model}")
+    else:
+        index = SemanticIndex.load(args.model)
+        if index is None:
+            parser.error(f"no embeddings for this model; run embed {args.model} first")
+        with open(args.job_description, encoding="utf-8") as f:
+            jd_text = f.read()
+        for position, (cv_id, score) in enumerate(index.rank(jd_text, args.k), 1):
+            print(f"{position:>4}  {score:6.2f}%  {cv_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Find mentions of known skills, including multi-word and punctuated names.
+
+The taxonomy (data/skills.txt) lists canonical skills and their aliases. It is
+compiled into an Aho-Corasick automaton over word tokens, so one pass over a
+document finds every alias however large the taxonomy is, and "machine
+learning", "C++", "CI/CD" and "Node.js" are matched as skills rather than as
+loose words. Overlapping matches are resolved leftmost-longest, so "Apache
+Spark" counts once as Apache Spark.
+
+The compiled automaton is saved next to the other caches and reloaded by later
+processes; it is rebuilt automatically when the taxonomy file changes.
+
+    python skills.py compile
+    python skills.py match cv.txt
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from collections import Counter, deque
+
+from cache import CACHE_DIR, content_hash
+
+TAXONOMY_PATH = os.environ.get(
+    "SKILLS_MATCH_TAXONOMY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "skills.txt"),
+)
+AUTOMATON_DIR = os.path.join(CACHE_DIR, "skills")
+# Bump when the compiled format or the tokenizer changes. 2: matches end at
+# line breaks.
+FORMAT_VERSION = 2
+
+# Words keep inner dots and trailing + or # ("node.js", ".net", "c++", "c#");
+# any other punctuation, including "-" and "/", separates words.
+_TOKEN = re.compile(r"\.?[^\W_]+(?:\.[^\W_]+)*[+#]*")
+
+
+def tokenize(text):
+    """
+    Return the word tokens of text in their original case.
+    """
+    return _TOKEN.findall(text)
+
+
+def read_taxonomy(path=TAXONOMY_PATH):
+    """
+    Return [(canonical, [alias, ...])] from a taxonomy file.
+
+    The canonical name is also an alias. Quoted aliases keep their quotes, as
+    they mark a case-sensitive match.
+    """
+    taxonomy = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            aliases = [alias.strip() for alias in line.split("|") if alias.strip()]
+            taxonomy.append((aliases[0].strip('"'), aliases))
+    return taxonomy
+
+
+class SkillMatcher:
+    """
+    Aho-Corasick automaton over word tokens mapping aliases to canonical skills.
+
+    States are numbered from 0 (the root). Transitions are one dict keyed by
+    state * len(tokens) + token id. Each state has a failure link, the skill
+    and alias length it completes (or -1), and a link to the next state on its
+    failure chain that completes a skill.
+    """
+
+    def __init__(self, skills, tokens, goto, fail, output, length, link, exact):
+        self.skills = skills
+        self.tokens = tokens
+        self.token_ids = {token: i for i, token in enumerate(tokens)}
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+        self.length = length
+        self.link = link
+        # {state: original tokens} for aliases that must match case exactly
+        self.exact = exact
+        # Identifies the taxonomy and format, set by load_matcher()
+        self.version = ""
+
+    @classmethod
+    def compile(cls, taxonomy):
+        """
+        Build the automaton from [(canonical, [alias, ...])].
+        """
+        skills = []
+        tokens = {}
+        trie = [{}]
+        output = [-1]
+        exact = {}
+        for canonical, aliases in taxonomy:
+            skill = len(skills)
+            skills.append(canonical)
+            for alias in aliases:
+                quoted = len(alias) > 1 and alias[0] == alias[-1] == '"'
+                words = tokenize(alias.strip('"'))
+                if not words:
+                    continue
+                state = 0
+                for word in words:
+                    token = tokens.setdefault(word.lower(), len(tokens))
+                    if token not in trie[state]:
+                        trie[state][token] = len(trie)
+                        trie.append({})
+                        output.append(-1)
+                    state = trie[state][token]
+                # The first skill to claim an alias keeps it
+                if output[state] == -1:
+                    output[state] = skill
+                    if quoted:
+                        exact[state] = tuple(words)
+
+        size = len(trie)
+        fail = [0] * size
+        link = [-1] * size
+        length = [0] * size
+        queue = deque()
+        for state in trie[0].values():
+            length[state] = 1
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for token, child in trie[state].items():
+                length[child] = length[state] + 1
+                queue.append(child)
+                target = fail[state]
+                while target and token not in trie[target]:
+                    target = fail[target]
+                target = trie[target].get(token, 0)
+                fail[child] = target if target != child else 0
+                link[child] = (
+                    fail[child] if output[fail[child]] != -1 else link[fail[child]]
+                )
+
+        width = len(tokens)
+        goto = {
+            state * width + token: child
+            for state, children in enumerate(trie)
+            for token, child in children.items()
+        }
+        ordered = sorted(tokens, key=tokens.get)
+        return cls(skills, ordered, goto, fail, output, length, link, exact)
+
+    def __len__(self):
+        return len(self.skills)
+
+    def find(self, text):
+        """
+        Yield (start, end, skill id) for every alias in text, overlaps included.
+
+        start and end are token positions.
+        """
+        words = tokenize(text)
+        width = len(self.tokens)
+        token_ids = self.token_ids
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        link = self.link
+        state = 0
+        for position, word in enumerate(words):
+            token = token_ids.get(word.lower())
+            if token is None:
+                state = 0
+                continue
+            while state and state * width + token not in goto:
+                state = fail[state]
+            state = goto.get(state * width + token, 0)
+            match = state if output[state] != -1 else link[state]
+            while match > 0:
+                start = position + 1 - self.length[match]
+                required = self.exact.get(match)
+                if required is None or tuple(words[start : position + 1]) == required:
+                    yield start, position + 1, output[match]
+                match = link[match]
+
+    def extract(self, text):
+        """
+        Return a Counter of the canonical skills mentioned in text.
+
+        No alias spans a line break, so a document's counts are the sum of its
+        lines' counts (which incremental.py relies on).
+        """
+        counts = Counter()
+        for line in text.splitlines():
+            # Leftmost-longest: sort by start, longer first, and skip overlaps
+            matches = sorted(self.find(line), key=lambda m: (m[0], m[0] - m[1]))
+            end = 0
+            for start, stop, skill in matches:
+                if start >= end:
+                    counts[self.skills[skill]] += 1
+                    end = stop
+        return counts
+
+    def save(self, path, source_hash=""):
+        """
+        Write the automaton to a directory.
+        """
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        keys = np.fromiter(self.goto.keys(), dtype=np.int64, count=len(self.goto))
+        targets = np.fromiter(self.goto.values(), dtype=np.int32, count=len(keys))
+        tmp_path = os.path.join(path, f"automaton.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            keys=keys,
+            targets=targets,
+            fail=np.asarray(self.fail, dtype=np.int32),
+            output=np.asarray(self.output, dtype=np.int32),
+            length=np.asarray(self.length, dtype=np.int32),
+            link=np.asarray(self.link, dtype=np.int32),
+        )
+        meta = {
+            "version": FORMAT_VERSION,
+            "source_hash": source_hash,
+            "skills": self.skills,
+            "tokens": self.tokens,
+            "exact": [[state, list(words)] for state, words in self.exact.items()],
+        }
+        tmp_meta = os.path.join(path, f"skills.{os.getpid()}.tmp.json")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # The metadata is written last, so a reader never pairs it with old arrays
+        os.replace(tmp_path, os.path.join(path, "automaton.npz"))
+        os.replace(tmp_meta, os.path.join(path, "skills.json"))
+
+    @classmethod
+    def load(cls, path, source_hash=None):
+        """
+        Load an automaton written by save(). Returns None if it is missing,
+        from an older format or, when source_hash is given, out of date.
+        """
+        import numpy as np
+
+        try:
+            with open(os.path.join(path, "skills.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = np.load(os.path.join(path, "automaton.npz"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+        if source_hash is not None and meta.get("source_hash") != source_hash:
+            return None
+        goto = dict(zip(arrays["keys"].tolist(), arrays["targets"].tolist()))
+        return cls(
+            meta["skills"],
+            meta["tokens"],
+            goto,
+            arrays["fail"].tolist(),
+            arrays["output"].tolist(),
+            arrays["length"].tolist(),
+            arrays["link"].tolist(),
+            {state: tuple(words) for state, words in meta["exact"]},
+        )
+
+
+def _file_hash(path):
+    with open(path, encoding="utf-8") as f:
+        return content_hash(f.read())
+
+
+def load_matcher(taxonomy_path=TAXONOMY_PATH, directory=AUTOMATON_DIR):
+    """
+    Load the compiled automaton for a taxonomy, compiling and saving it first
+    if there is no up-to-date copy.
+    """
+    source_hash = _file_hash(taxonomy_path)
+    matcher = SkillMatcher.load(directory, source_hash)
+    if matcher is None:
+        matcher = SkillMatcher.compile(read_taxonomy(taxonomy_path))
+        matcher.save(directory, source_hash)
+    matcher.version = f"{FORMAT_VERSION}:{source_hash[:16]}"
+    return matcher
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """
+    Return the shared SkillMatcher, loading it on first use.
+    """
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = load_matcher()
+    return _matcher
+
+
+def extract_skills(text):
+    """
+    Return a Counter of the canonical skills mentioned in text.
+    """
+    return get_matcher().extract(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or try the skills matcher.")
+    parser.add_argument("--taxonomy", default=TAXONOMY_PATH)
+    parser.add_argument("--output", default=AUTOMATON_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("compile", help="compile the taxonomy into an automaton")
+    match = commands.add_parser("match", help="list the skills found in a text file")
+    match.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        matcher = SkillMatcher.compile(read_taxonomy(args.taxonomy))
+        matcher.save(args.output, _file_hash(args.taxonomy))
+        print(f"{len(matcher)} skills, {len(matcher.fail)} states -> {args.output}")
+    else:
+        matcher = load_matcher(args.taxonomy, args.output)
+        with open(args.path, encoding="utf-8") as f:
+            for skill, count in matcher.extract(f.read()).most_common():
+                print(f"{count:>4}  {skill}")
+
+
+if __name__ == "__main__":
+    main()
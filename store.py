@@ -0,0 +1,481 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Local database of CVs and job descriptions with their precomputed terms.
+
+Documents live in one SQLite file in WAL mode, so web workers, background jobs
+and bulk loads can read while another process writes. Each document is stored
+once per content hash, with its keyword and skill counts, so a CV or job
+description is tokenized a single time however often it is analysed. Counts
+are tagged with the tokenizer and taxonomy version they were made with; when
+either changes, stale counts are recomputed the next time they are read (or
+all at once with `refresh`). The text is indexed with FTS5 for full-text search.
+
+The store also keeps the MinHash signatures and LSH buckets that dedup.py uses
+to find near-duplicate documents, and which canonical document each duplicate
+was collapsed into.
+
+The store keeps the full text of every CV and job description analysed, so it
+is off unless SKILLS_MATCH_STORE names its database file. `purge` deletes
+documents older than a number of days.
+
+    python store.py --store skills_match.db add cv cvs.jsonl
+    python store.py --store skills_match.db search "kubernetes AND terraform"
+    python store.py --store skills_match.db purge --days 30
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from cache import content_hash
+
+STORE_PATH = os.environ.get("SKILLS_MATCH_STORE", "")
+KINDS = ("cv", "jd")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    external_id TEXT,
+    content_hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (kind, content_hash)
+);
+CREATE INDEX IF NOT EXISTS documents_external_id ON documents (kind, external_id);
+CREATE TABLE IF NOT EXISTS terms (
+    document_id INTEGER PRIMARY KEY REFERENCES documents (id) ON DELETE CASCADE,
+    version TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    skills TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS terms_version ON terms (version);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    text, content='documents', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TABLE IF NOT EXISTS signatures (
+    document_id INTEGER PRIMARY KEY REFERENCES documents (id) ON DELETE CASCADE,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+    document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signature_bands_bucket ON signature_bands (band, bucket);
+CREATE INDEX IF NOT EXISTS signature_bands_document ON signature_bands (document_id);
+CREATE TABLE IF NOT EXISTS duplicates (
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    external_id TEXT,
+    canonical_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    similarity REAL NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (kind, content_hash)
+);
+CREATE INDEX IF NOT EXISTS duplicates_canonical ON duplicates (canonical_id);
+CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, text)
+    VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def terms_version():
+    """
+    Return the version of the keyword tokenizer (and normalization) and skills
+    taxonomy in use.
+    """
+    from keywords import KEYWORDS_VERSION
+    from skills import get_matcher
+
+    return f"keywords:{KEYWORDS_VERSION}/skills:{get_matcher().version}"
+
+
+def compute_terms(texts):
+    """
+    Return a (keywords, skills) pair of Counters for each text.
+    """
+    from keywords import extract_keywords_many
+    from skills import extract_skills
+
+    keywords = extract_keywords_many(texts)
+    return [(k, extract_skills(text)) for k, text in zip(keywords, texts)]
+
+
+class DocumentStore:
+    """
+    SQLite store of documents, their content hashes and their term counts.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._version = None
+        with self.connection as conn:
+            conn.executescript(SCHEMA)
+
+    @property
+    def connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = conn
+        return conn
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = terms_version()
+        return self._version
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, kind, text, external_id=None):
+        """
+        Store a document if it is new and return its id.
+        """
+        return self.add_many(kind, [{"id": external_id, "text": text}])[0]
+
+    def add_many(self, kind, records, batch_size=500):
+        """
+        Store many documents, one transaction per batch, and return their ids.
+
+        records are dicts with "text" and optionally "id" (an external id) and
+        precomputed "keywords" and "skills" counts. Documents already stored are
+        not added again.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}")
+        ids = []
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                ids.extend(self._add_batch(kind, batch))
+                batch = []
+        if batch:
+            ids.extend(self._add_batch(kind, batch))
+        return ids
+
+    def _add_batch(self, kind, records):
+        conn = self.connection
+        now = time.time()
+        hashes = [content_hash(record["text"]) for record in records]
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO documents "
+                "(kind, external_id, content_hash, text, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (kind, record.get("id"), digest, record["text"], now)
+                    for record, digest in zip(records, hashes)
+                ],
+            )
+            ids = [
+                conn.execute(
+                    "SELECT id FROM documents WHERE kind = ? AND content_hash = ?",
+                    (kind, digest),
+                ).fetchone()[0]
+                for digest in hashes
+            ]
+        precomputed = {
+            doc_id: (Counter(record["keywords"]), Counter(record["skills"]))
+            for doc_id, record in zip(ids, records)
+            if "keywords" in record and "skills" in record
+        }
+        self._ensure_terms(ids, precomputed)
+        return ids
+
+    def _ensure_terms(self, ids, precomputed=None):
+        """
+        Compute and store the terms of any of ids that are missing or stale.
+        """
+        conn = self.connection
+        placeholders = ",".join("?" * len(ids))
+        rows = conn.execute(
+            f"SELECT d.id, d.text FROM documents d LEFT JOIN terms t "
+            f"ON t.document_id = d.id AND t.version = ? "
+            f"WHERE d.id IN ({placeholders}) AND t.document_id IS NULL",
+            [self.version, *ids],
+        ).fetchall()
+        if not rows:
+            return 0
+        precomputed = precomputed or {}
+        todo = [row for row in rows if row["id"] not in precomputed]
+        terms = dict(precomputed)
+        terms.update(
+            zip(
+                [row["id"] for row in todo],
+                compute_terms([row["text"] for row in todo]),
+            )
+        )
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO terms (document_id, version, keywords, skills) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        row["id"],
+                        self.version,
+                        json.dumps(terms[row["id"]][0]),
+                        json.dumps(terms[row["id"]][1]),
+                    )
+                    for row in rows
+                ],
+            )
+        return len(rows)
+
+    def get(self, doc_id):
+        """
+        Return a stored document as a dict, or None.
+        """
+        row = self.connection.execute(
+            "SELECT id, kind, external_id, content_hash, text, created "
+            "FROM documents WHERE id = ?",
+            (doc_id,),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def find(self, kind, text):
+        """
+        Return the id of a stored document with exactly this text, or None.
+        """
+        row = self.connection.execute(
+            "SELECT id FROM documents WHERE kind = ? AND content_hash = ?",
+            (kind, content_hash(text)),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def terms(self, doc_id):
+        """
+        Return the (keywords, skills) Counters of a stored document.
+        """
+        return self.terms_many([doc_id])[0]
+
+    def terms_many(self, ids):
+        """
+        Return (keywords, skills) Counters for each id, recomputing stale ones.
+        """
+        result = {}
+        for start in range(0, len(ids), 500):
+            chunk = list(ids[start : start + 500])
+            self._ensure_terms(chunk)
+            placeholders = ",".join("?" * len(chunk))
+            for row in self.connection.execute(
+                f"SELECT document_id, keywords, skills FROM terms "
+                f"WHERE document_id IN ({placeholders})",
+                chunk,
+            ):
+                result[row[0]] = (
+                    Counter(json.loads(row[1])),
+                    Counter(json.loads(row[2])),
+                )
+        return [result[doc_id] for doc_id in ids]
+
+    def search(self, query, kind=None, limit=20):
+        """
+        Full-text search. Returns dicts with id, kind, external_id and snippet,
+        best match first. query uses the FTS5 syntax ("python AND aws").
+        """
+        sql = (
+            "SELECT d.id, d.kind, d.external_id, "
+            "snippet(documents_fts, 0, '[', ']', '...', 12) AS snippet "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params = [query]
+        if kind is not None:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY bm25(documents_fts) LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def add_signature(self, doc_id, signature, bands):
+        """
+        Store a document's MinHash signature (bytes) and its LSH band buckets.
+        """
+        with self.connection as conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO signatures (document_id, signature) VALUES (?, ?)",
+                (doc_id, signature),
+            ).rowcount
+            if added:
+                conn.executemany(
+                    "INSERT INTO signature_bands (document_id, band, bucket) "
+                    "VALUES (?, ?, ?)",
+                    [(doc_id, band, bucket) for band, bucket in enumerate(bands)],
+                )
+
+    def signature_candidates(self, kind, bands):
+        """
+        Return [(document id, signature)] for documents of kind sharing a band.
+        """
+        values = ",".join("(?, ?)" for _ in bands)
+        params = [kind]
+        for band, bucket in enumerate(bands):
+            params += [band, bucket]
+        return self.connection.execute(
+            f"SELECT s.document_id, s.signature FROM signatures s "
+            f"JOIN documents d ON d.id = s.document_id "
+            f"WHERE d.kind = ? AND s.document_id IN ("
+            f"SELECT document_id FROM signature_bands "
+            f"WHERE (band, bucket) IN (VALUES {values}))",
+            params,
+        ).fetchall()
+
+    def add_duplicate(self, kind, text, canonical_id, similarity, external_id=None):
+        """
+        Record that text is a near-duplicate of a stored document.
+        """
+        with self.connection as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO duplicates "
+                "(kind, content_hash, external_id, canonical_id, similarity, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    kind,
+                    content_hash(text),
+                    external_id,
+                    canonical_id,
+                    similarity,
+                    time.time(),
+                ),
+            )
+
+    def duplicate_of(self, kind, text):
+        """
+        Return (canonical id, similarity) if text was recorded as a duplicate.
+        """
+        row = self.connection.execute(
+            "SELECT canonical_id, similarity FROM duplicates "
+            "WHERE kind = ? AND content_hash = ?",
+            (kind, content_hash(text)),
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def delete(self, doc_id):
+        with self.connection as conn:
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def purge(self, older_than):
+        """
+        Delete the documents stored more than older_than seconds ago, with their
+        terms, signatures and duplicates. Returns how many were deleted.
+        """
+        cutoff = time.time() - older_than
+        with self.connection as conn:
+            conn.execute("DELETE FROM duplicates WHERE created < ?", (cutoff,))
+            return conn.execute(
+                "DELETE FROM documents WHERE created < ?", (cutoff,)
+            ).rowcount
+
+    def refresh(self, batch_size=500):
+        """
+        Recompute every stale set of terms now. Returns how many were updated.
+        """
+        updated = 0
+        while True:
+            ids = [
+                row[0]
+                for row in self.connection.execute(
+                    "SELECT d.id FROM documents d LEFT JOIN terms t "
+                    "ON t.document_id = d.id AND t.version = ? "
+                    "WHERE t.document_id IS NULL LIMIT ?",
+                    (self.version, batch_size),
+                )
+            ]
+            if not ids:
+                return updated
+            updated += self._ensure_terms(ids)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the shared DocumentStore, or None if SKILLS_MATCH_STORE is empty.
+    """
+    global _store
+    if _store is None and STORE_PATH:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore(STORE_PATH)
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the CV/JD document store.")
+    parser.add_argument("--store", default=STORE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="bulk-load a JSONL file of documents")
+    add.add_argument("kind", choices=KINDS)
+    add.add_argument("source", help='JSONL file of {"id": ..., "text": ...} lines')
+    search = commands.add_parser("search", help="full-text search")
+    search.add_argument("query")
+    search.add_argument("--kind", choices=KINDS)
+    search.add_argument("--limit", type=int, default=20)
+    commands.add_parser("refresh", help="recompute terms made by an old tokenizer")
+    purge = commands.add_parser("purge", help="delete documents older than --days")
+    purge.add_argument("--days", type=float, required=True)
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("give --store or set SKILLS_MATCH_STORE")
+
+    store = DocumentStore(args.store)
+    if args.command == "add":
+        from ranking import read_jsonl
+
+        start = time.perf_counter()
+        ids = store.add_many(
+            args.kind,
+            ({"id": doc_id, "text": text} for doc_id, text in read_jsonl(args.source)),
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{len(ids)} documents in {elapsed:.1f}s; {len(store)} stored")
+    elif args.command == "search":
+        for hit in store.search(args.query, args.kind, args.limit):
+            print(
+                f"{hit['id']:>6}  {hit['kind']}  {hit['external_id']}  {hit['snippet']}"
+            )
+    elif args.command == "purge":
+        print(f"{store.purge(args.days * 24 * 60 * 60)} documents deleted")
+    else:
+        print(f"{store.refresh()} documents updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Shared setup for the tests: the modules are imported from the repository root,
+with the caches in a temporary directory and the document store off.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+import pytest
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Read at import by cache.py and store.py, so set before any test imports them
+os.environ["SKILLS_MATCH_CACHE_DIR"] = tempfile.mkdtemp(prefix="skills_match_")
+os.environ["SKILLS_MATCH_STORE"] = ""
+os.environ["SKILLS_MATCH_HTTP_CACHE"] = os.path.join(
+    os.environ["SKILLS_MATCH_CACHE_DIR"], "http"
+)
+# The stub job board below is on 127.0.0.1
+os.environ["SKILLS_MATCH_FETCH_PRIVATE"] = "1"
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", 'slow: takes seconds; deselect with -m "not slow"'
+    )
+
+
+def job_page(text):
+    """
+    Return a job board page whose md_skills div holds text.
+    """
+    return f'<html><body><div id="md_skills"><p>{text}</p></div></body></html>'
+
+
+def docx(text):
+    """
+    Return a minimal Word document holding text, one paragraph per line.
+    """
+    paragraphs = "".join(
+        f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in text.splitlines()
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "word/document.xml",
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+            f'wordprocessingml/2006/main"><w:body>{paragraphs}</w:body></w:document>',
+        )
+    return buffer.getvalue()
+
+
+def pdf(lines):
+    """
+    Return a one-page PDF that draws each line as text, however many there are.
+    """
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    page = PageObject.create_blank_page(None, 612, 792)
+    page[NameObject("/Resources")] = DictionaryObject(
+        {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+    )
+    content = DecodedStreamObject()
+    drawn = " ".join(f"({line}) Tj T*" for line in lines)
+    content.set_data(f"BT /F1 12 Tf {drawn} ET".encode())
+    page[NameObject("/Contents")] = content
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            responses = server.routes.get(self.path, [{"status": 404}])
+            # The last response for a path is repeated once the others are used
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+        try:
+            time.sleep(response.get("delay", 0))
+            body = response.get("body", "").encode("utf-8")
+            self.send_response(response.get("status", 200))
+            for name, value in response.get("headers", {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if "chunks" in response:
+                # No Content-Length: the body ends when the connection closes
+                self.end_headers()
+                for delay, chunk in response["chunks"]:
+                    time.sleep(delay)
+                    self.wfile.write(chunk.encode("utf-8"))
+                    self.wfile.flush()
+                return
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """
+    A local HTTP server answering GETs from server.routes, {path: [response]},
+    where a response is a dict of status, headers, body and delay (seconds),
+    or chunks, [(delay, text)], to send the body a piece at a time.
+    It records each request's path and headers, and the most requests it
+    served at once.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.routes = {}
+    server.requests = []
+    server.active = server.peak = 0
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
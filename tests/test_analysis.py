@@ -0,0 +1,58 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import pytest
+from conftest import job_page
+
+import analysis
+from cache import LRUCache
+from fetcher import JobFetcher
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    fetcher = JobFetcher(cache_dir=str(tmp_path), text_cache=LRUCache())
+    monkeypatch.setattr(analysis, "get_fetcher", lambda: fetcher)
+    return fetcher
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_failed_fetch_is_not_cached(stub_server, fetcher, incremental):
+    path = f"/job-{incremental}"
+    stub_server.routes[path] = [
+        {"status": 503},
+        {"body": job_page("Senior Python developer with Django and SQL")},
+    ]
+    cv_text = "Python developer, five years of Django and SQL"
+    url = stub_server.url + path
+
+    failed = analysis.analyse(cv_text, url, incremental=incremental)
+    assert failed["job_text"] == "" and failed["similarity_score"] == 0
+
+    fetched = analysis.analyse(cv_text, url, incremental=incremental)
+    assert "Django" in fetched["job_text"]
+    assert fetched["similarity_score"] > 0
+    assert len(stub_server.requests) == 2
+
+
+def test_analysis_key_changes_with_the_skills_taxonomy(monkeypatch):
+    from skills import get_matcher
+
+    key = analysis.analysis_key("Python developer", "Python")
+    monkeypatch.setattr(get_matcher(), "version", "edited")
+    assert analysis.analysis_key("Python developer", "Python") != key
@@ -0,0 +1,121 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import gzip
+import json
+
+import pytest
+from flask import Flask
+from synthetic import generate_cv, generate_jd
+
+import analysis
+from api import NDJSON, blueprint
+
+CV = generate_cv(300, seed=1)
+JD = generate_jd(300, seed=2)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(blueprint)
+    return app.test_client()
+
+
+def test_score(client):
+    response = client.post("/api/score", json={"cv_text": CV, "job_description": JD})
+    assert response.status_code == 200
+    result = response.get_json()
+    expected = analysis.calculate_match_percentage(CV, JD)
+    assert result["score"] == pytest.approx(expected, abs=0.01)
+    assert result["common_keywords"]
+    assert set(result) >= {"common_skills", "missing_skills"}
+
+    limited = client.post(
+        "/api/score", json={"cv_text": CV, "job_description": JD, "limit": 2}
+    ).get_json()
+    assert limited["common_keywords"] == result["common_keywords"][:2]
+
+
+@pytest.mark.parametrize("gzipped", [False, True])
+def test_batch_streams_ndjson(client, gzipped):
+    pairs = [
+        {"id": "a", "cv_text": CV, "job_description": JD},
+        {"id": "b", "cv_text": "", "job_description": JD},
+    ]
+    body = "".join(json.dumps(pair) + "\n" for pair in pairs) + "not json\n"
+    headers = {"Accept": NDJSON}
+    if gzipped:
+        headers["Accept-Encoding"] = "gzip"
+    response = client.post(
+        "/api/score/batch", data=body, content_type=NDJSON, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.mimetype == NDJSON
+    data = response.get_data()
+    if gzipped:
+        assert response.headers["Content-Encoding"] == "gzip"
+        data = gzip.decompress(data)
+    else:
+        assert "Content-Encoding" not in response.headers
+    results = [json.loads(line) for line in data.splitlines()]
+    assert [r["id"] for r in results] == ["a", "b", 2]
+    assert "score" in results[0]
+    assert results[1]["error"] == "cv_text must be a non-empty string"
+    assert results[2]["error"] == "line 3 is not valid JSON"
+
+
+def test_batch_as_json(client):
+    response = client.post(
+        "/api/score/batch",
+        json={"pairs": [{"cv_text": CV, "job_description": JD}, "pair"]},
+    )
+    results = response.get_json()["results"]
+    assert results[0]["id"] == 0 and "score" in results[0]
+    assert results[1] == {"id": 1, "error": "pair must be a JSON object"}
+
+
+def test_rank_without_index_is_unavailable(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(analysis, "CORPUS_DIR", str(tmp_path / "corpus"))
+    monkeypatch.setattr(analysis, "_index", None)
+    monkeypatch.setattr(analysis, "_corpus", None)
+    response = client.post("/api/rank", json={"job_description": JD})
+    assert response.status_code == 503
+    assert response.get_json() == {"error": "no lexical CV index has been built"}
+
+
+@pytest.mark.parametrize(
+    "path, payload, error",
+    [
+        ("/api/score", [CV, JD], "request body must be a JSON object"),
+        ("/api/score", {"cv_text": " ", "job_description": JD}, "cv_text must"),
+        ("/api/score", {"cv_id": "nope", "job_description": JD}, "cv_id is unknown"),
+        ("/api/score", {"cv_text": CV, "job_description": JD, "limit": True}, "limit"),
+        ("/api/score", {"cv_text": CV, "job_description": JD, "limit": -1}, "limit"),
+        ("/api/score/batch", {"pairs": "a"}, "pairs must be a list"),
+        ("/api/rank", {"job_description": JD, "k": True}, "k must"),
+        ("/api/rank", {"job_description": JD, "k": 0}, "k must"),
+        ("/api/rank", {"job_description": JD, "mode": "fuzzy"}, "mode must"),
+        ("/api/gaps", {"cv_text": CV, "job_descriptions": []}, "job_descriptions"),
+    ],
+)
+def test_bad_requests(client, path, payload, error):
+    response = client.post(path, json=payload)
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith(error)
@@ -0,0 +1,78 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import multiprocessing
+import os
+import signal
+import time
+
+import metrics
+from cache import DiskCache
+
+
+def _hold_lock(directory, key, started):
+    def compute():
+        started.set()
+        time.sleep(600)
+
+    DiskCache(directory).get_or_compute(key, compute)
+
+
+def test_get_or_compute_shares_result(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("key", lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_lock_of_killed_holder_is_reclaimed(tmp_path):
+    context = multiprocessing.get_context("fork")
+    started = context.Event()
+    holder = context.Process(
+        target=_hold_lock, args=(str(tmp_path), "key", started), daemon=True
+    )
+    holder.start()
+    assert started.wait(10)
+    # What Dash does to a job superseded by another click
+    os.kill(holder.pid, signal.SIGKILL)
+
+    # Not yet reaped, the holder is a zombie, which must count as dead too
+    start = time.monotonic()
+    value = DiskCache(str(tmp_path)).get_or_compute("key", lambda: "fresh")
+    assert value == "fresh"
+    assert time.monotonic() - start < 5
+    holder.join()
+
+
+def test_lookups_are_counted_outside_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "FLUSH_SECONDS", 3600)
+    cache = DiskCache(str(tmp_path))
+    cache.set("key", 1)
+    for _ in range(3):
+        cache.get("key")
+        cache.get("other")
+    assert list(cache._cache) == ["key"] and len(cache) == 1
+    pid = os.fork()
+    if pid == 0:
+        cache.get("key")
+        metrics.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert cache.stats()["hits"] == 4 and cache.stats()["misses"] == 3
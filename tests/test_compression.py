@@ -0,0 +1,118 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import gzip
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import compression
+from compression import MIN_BYTES, init_app
+
+BIG = "x" * (MIN_BYTES * 4)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(compression, "ENABLED", True)
+    monkeypatch.setattr(compression, "_compressed", compression.OrderedDict())
+    app = Flask(__name__)
+
+    @app.route("/big")
+    def big():
+        return jsonify(text=BIG)
+
+    @app.route("/small")
+    def small():
+        return jsonify(text="x")
+
+    @app.route("/image")
+    def image():
+        return Response(BIG, mimetype="image/png")
+
+    @app.route("/encoded")
+    def encoded():
+        return Response(
+            gzip.compress(BIG.encode()),
+            mimetype="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    @app.route("/bundle.js")
+    def bundle():
+        return Response(
+            BIG, mimetype="application/javascript", headers={"ETag": '"v1"'}
+        )
+
+    init_app(app)
+    return app.test_client()
+
+
+def get(client, path, accept):
+    headers = {} if accept is None else {"Accept-Encoding": accept}
+    return client.get(path, headers=headers)
+
+
+@pytest.mark.parametrize(
+    "accept, compressed",
+    [
+        ("gzip", True),
+        ("gzip, deflate, br", True),
+        ("br;q=1, gzip;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0, br", False),
+        ("*, gzip;q=0", False),
+        ("identity", False),
+        ("", False),
+        (None, False),
+    ],
+)
+def test_gzip_is_negotiated(client, accept, compressed):
+    response = get(client, "/big", accept)
+    assert "Accept-Encoding" in response.headers.get_all("Vary")[0]
+    assert (response.headers.get("Content-Encoding") == "gzip") is compressed
+    body = gzip.decompress(response.data) if compressed else response.data
+    assert response.headers["Content-Length"] == str(len(response.data))
+    assert BIG in body.decode()
+
+
+def test_small_response_is_sent_as_is(client):
+    response = get(client, "/small", "gzip")
+    assert "Content-Encoding" not in response.headers
+    assert response.json == {"text": "x"}
+    # Still varies, as a larger response on the same URL would be compressed
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_already_encoded_response_is_not_compressed_again(client):
+    response = get(client, "/encoded", "gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).decode() == BIG
+
+
+def test_binary_response_is_not_compressed(client):
+    response = get(client, "/image", "gzip")
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_tagged_response_is_compressed_once(client, monkeypatch):
+    first = get(client, "/bundle.js", "gzip").data
+    monkeypatch.setattr(compression.gzip, "compress", None)
+    second = get(client, "/bundle.js", "gzip")
+    assert second.data == first and gzip.decompress(first).decode() == BIG
@@ -0,0 +1,102 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import io
+import threading
+import time
+import zipfile
+
+import pytest
+
+from conftest import docx, pdf
+from extraction import ExtractionError, extract_cv
+
+
+def in_thread(function, *args, **kwargs):
+    """
+    Call function from a thread other than the main one, as a web request
+    would, and return its result or raise its exception.
+    """
+    outcome = {}
+
+    def run():
+        try:
+            outcome["value"] = function(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+@pytest.mark.parametrize(
+    "caller", [extract_cv, lambda *a, **k: in_thread(extract_cv, *a, **k)]
+)
+def test_reads_word_and_pdf(caller):
+    result = caller(docx("Python developer\nSQL"))
+    assert result["type"] == "docx"
+    assert result["text"].split() == ["Python", "developer", "SQL"]
+    result = caller(pdf(["Python developer"]))
+    assert (result["type"], result["pages"]) == ("pdf", 1)
+    assert result["text"] == "Python developer"
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_one_slow_page_is_stopped_at_the_deadline(threaded):
+    # A single page whose text takes seconds to extract; the old check
+    # between pages never ran
+    data = pdf([f"Python developer {i}" for i in range(30_000)])
+    call = (lambda *a, **k: in_thread(extract_cv, *a, **k)) if threaded else extract_cv
+    started = time.monotonic()
+    with pytest.raises(ExtractionError, match="longer than 0.3s"):
+        call(data, max_seconds=0.3)
+    assert time.monotonic() - started < 1.5
+
+
+def test_deadline_applies_to_word_files():
+    data = docx("\n".join(f"Python developer {i}" for i in range(200_000)))
+    with pytest.raises(ExtractionError, match="longer than"):
+        extract_cv(data, max_seconds=0.05)
+
+
+def test_word_zip_bomb_is_refused():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", "<w:document/>")
+        archive.writestr("word/media/padding.bin", b"\0" * 10_000_000)
+    data = buffer.getvalue()
+    assert len(data) < 100_000
+    with pytest.raises(ExtractionError, match="unzips to"):
+        extract_cv(data, max_unzipped_bytes=1_000_000)
+    with pytest.raises(ExtractionError, match="unzips to"):
+        in_thread(extract_cv, data, max_unzipped_bytes=1_000_000)
+
+
+def test_word_text_is_capped():
+    result = extract_cv(docx("Python " * 1000), max_chars=100)
+    assert len(result["text"]) == 100
+    assert result["truncated"]
+
+
+def test_unreadable_file_fails_in_child():
+    with pytest.raises(Exception):
+        in_thread(extract_cv, b"PK\x03\x04 not really a zip")
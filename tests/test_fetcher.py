@@ -0,0 +1,193 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import time
+
+import pytest
+import requests
+from conftest import job_page
+
+from cache import LRUCache
+from fetcher import FetchError, JobFetcher, check_url, parse_job_text
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    # A text cache that expires at once, so every fetch goes to the HTTP layer
+    return JobFetcher(
+        cache_dir=str(tmp_path),
+        connect_timeout=1,
+        read_timeout=0.5,
+        text_cache=LRUCache(ttl=0),
+    )
+
+
+def test_parse_job_text():
+    html = job_page("Python and SQL") + '<div id="other"><p>Ignored</p></div>'
+    assert parse_job_text(html) == "Python and SQL"
+    assert parse_job_text("<p>No skills div</p>") == ""
+
+
+def test_fetch_200(stub_server, fetcher):
+    stub_server.routes["/job"] = [{"body": job_page("Senior Python developer")}]
+    assert fetcher.fetch(stub_server.url + "/job") == "Senior Python developer"
+
+
+def test_text_cache_saves_requests(stub_server, tmp_path):
+    stub_server.routes["/job"] = [{"body": job_page("Python")}]
+    fetcher = JobFetcher(cache_dir=str(tmp_path), text_cache=LRUCache())
+    for _ in range(3):
+        assert fetcher.fetch(stub_server.url + "/job") == "Python"
+    assert len(stub_server.requests) == 1
+
+
+@pytest.mark.parametrize(
+    "validator, request_header",
+    [("ETag", "If-None-Match"), ("Last-Modified", "If-Modified-Since")],
+)
+def test_revalidation_304(stub_server, fetcher, validator, request_header):
+    value = '"v1"' if validator == "ETag" else "Wed, 21 Oct 2015 07:28:00 GMT"
+    stub_server.routes["/job"] = [
+        {"body": job_page("Python and Kubernetes"), "headers": {validator: value}},
+        {"status": 304},
+    ]
+    url = stub_server.url + "/job"
+    assert fetcher.fetch(url) == "Python and Kubernetes"
+    # Answered 304 Not Modified from the validator cached with the text
+    assert fetcher.fetch(url) == "Python and Kubernetes"
+    first, second = stub_server.requests
+    assert request_header not in first[1]
+    assert second[1][request_header] == value
+
+
+def test_http_error_raises(stub_server, fetcher):
+    stub_server.routes["/gone"] = [{"status": 503}]
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(stub_server.url + "/gone")
+
+
+def test_read_timeout_raises(stub_server, fetcher):
+    stub_server.routes["/slow"] = [{"body": job_page("late"), "delay": 2}]
+    with pytest.raises(requests.Timeout):
+        fetcher.fetch(stub_server.url + "/slow")
+
+
+def test_fetch_many_limits_requests_per_host(stub_server, tmp_path):
+    fetcher = JobFetcher(cache_dir=str(tmp_path), per_host=2, text_cache=LRUCache())
+    urls = [f"{stub_server.url}/job/{number}" for number in range(8)]
+    for url in urls:
+        stub_server.routes[url[len(stub_server.url) :]] = [
+            {"body": job_page(url), "delay": 0.2}
+        ]
+    texts = fetcher.fetch_many(urls, max_workers=8)
+    assert texts == {url: url for url in urls}
+    assert stub_server.peak == 2
+
+
+def test_fetch_many_failures_give_empty_text(stub_server, fetcher):
+    stub_server.routes["/ok"] = [{"body": job_page("Python")}]
+    stub_server.routes["/error"] = [{"status": 500}]
+    stub_server.routes["/slow"] = [{"body": job_page("late"), "delay": 2}]
+    urls = [stub_server.url + path for path in ("/ok", "/error", "/slow")]
+    # Nothing listens on port 1, so the connection is refused
+    urls.append("http://127.0.0.1:1/job")
+    # A repeated URL is fetched once
+    texts = fetcher.fetch_many(urls + urls[:1])
+    assert texts == {urls[0]: "Python", urls[1]: "", urls[2]: "", urls[3]: ""}
+    assert fetcher.fetch_many([]) == {}
+
+
+def test_page_over_the_size_limit_is_refused(stub_server, tmp_path):
+    fetcher = JobFetcher(
+        cache_dir=str(tmp_path), text_cache=LRUCache(ttl=0), max_bytes=1000
+    )
+    stub_server.routes["/big"] = [{"body": job_page("x" * 2000)}]
+    # Without a Content-Length, refused once the bytes read pass the limit
+    stub_server.routes["/streamed"] = [{"chunks": [(0, "x" * 600)] * 4}]
+    stub_server.routes["/small"] = [{"chunks": [(0, job_page("Python"))]}]
+    for path in ("/big", "/streamed"):
+        with pytest.raises(FetchError):
+            fetcher.fetch(stub_server.url + path)
+    assert fetcher.fetch(stub_server.url + "/small") == "Python"
+
+
+def test_slow_page_is_cut_off_at_the_deadline(stub_server, tmp_path):
+    fetcher = JobFetcher(
+        cache_dir=str(tmp_path),
+        read_timeout=0.5,
+        text_cache=LRUCache(ttl=0),
+        deadline=1,
+    )
+    # Each piece comes within the read timeout, but the page never ends
+    stub_server.routes["/drip"] = [{"chunks": [(0.3, "<p>x</p>")] * 20}]
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        fetcher.fetch(stub_server.url + "/drip")
+    assert time.monotonic() - start < 1.5
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "file:///etc/passwd",
+        "ftp://example.com/job",
+        "http://127.0.0.1/job",
+        "http://localhost/job",
+        "http://10.0.0.1/job",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/job",
+        "http://[::ffff:127.0.0.1]/job",
+    ],
+)
+def test_private_and_non_http_urls_are_refused(url):
+    with pytest.raises(FetchError):
+        check_url(url, allowed_hosts=[], allow_private=False)
+
+
+def test_public_address_is_allowed():
+    check_url("http://93.184.216.34/job", allowed_hosts=[], allow_private=False)
+
+
+def test_only_allowed_hosts_are_fetched():
+    allowed = ["jobs.example.com"]
+    check_url("https://jobs.example.com/1", allowed, allow_private=True)
+    check_url("https://uk.jobs.example.com/1", allowed, allow_private=True)
+    for url in ("https://example.com/1", "https://evil-jobs.example.com.net/1"):
+        with pytest.raises(FetchError):
+            check_url(url, allowed, allow_private=True)
+
+
+def test_redirects_are_checked(stub_server, tmp_path):
+    fetcher = JobFetcher(
+        cache_dir=str(tmp_path),
+        text_cache=LRUCache(ttl=0),
+        allowed_hosts=["127.0.0.1"],
+        allow_private=True,
+    )
+    stub_server.routes["/job"] = [{"body": job_page("Python")}]
+    stub_server.routes["/moved"] = [{"status": 301, "headers": {"Location": "/job"}}]
+    stub_server.routes["/away"] = [
+        {
+            "status": 302,
+            "headers": {"Location": f"http://localhost:{stub_server.server_port}/"},
+        }
+    ]
+    assert fetcher.fetch(stub_server.url + "/moved") == "Python"
+    with pytest.raises(FetchError):
+        fetcher.fetch(stub_server.url + "/away")
+    assert [path for path, _ in stub_server.requests] == ["/moved", "/job", "/away"]
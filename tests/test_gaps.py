@@ -0,0 +1,102 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from gaps import SkillGaps, skill_gaps
+
+SKILLS = [f"skill-{i}" for i in range(40)]
+# More documents than an int8 can count, and a skill every one of them lacks
+DOCUMENTS = 300
+
+
+def dense_gaps(reference, documents, kind):
+    """
+    The gaps worked out pair by pair, with no sparse matrices.
+    """
+    known = set(SKILLS)
+    reference = set(reference) & known
+    rows = []
+    for _, counts in documents:
+        skills = set(counts) & known
+        required, offered = (skills, reference) if kind == "jd" else (reference, skills)
+        rows.append((required & offered, required - offered, offered - required))
+    return rows
+
+
+def batch(seed=0):
+    rng = random.Random(seed)
+    reference = Counter({skill: rng.randint(1, 3) for skill in SKILLS[:20]})
+    reference["not-in-taxonomy"] = 1
+    documents = [
+        (f"doc-{i}", Counter(rng.sample(SKILLS[1:], rng.randint(0, 25))))
+        for i in range(DOCUMENTS)
+    ]
+    return reference, documents
+
+
+@pytest.mark.parametrize("kind", ["cv", "jd"])
+def test_sparse_gaps_match_dense_reference(kind):
+    reference, documents = batch()
+    gaps = SkillGaps.compute(reference, documents, kind, skills=SKILLS)
+    expected = dense_gaps(reference, documents, kind)
+
+    assert len(gaps) == DOCUMENTS
+    coverage = gaps.coverage()
+    for row, (present, missing, extra) in zip(gaps.rows(), expected):
+        assert row["present"] == sorted(present)
+        assert row["missing"] == sorted(missing)
+        assert row["extra"] == sorted(extra)
+        required = len(present) + len(missing)
+        share = len(present) / required if required else 0.0
+        assert row["coverage"] == round(share * 100, 2)
+    assert coverage.dtype == np.float64
+
+    counts = Counter(skill for _, missing, _ in expected for skill in missing)
+    most_missing = gaps.most_missing()
+    assert dict(most_missing) == counts
+    assert [count for _, count in most_missing] == sorted(counts.values())[::-1]
+    if kind == "cv":
+        # No CV has skill-0, so every one of the 300 misses it
+        assert most_missing[0] == ("skill-0", DOCUMENTS)
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        SkillGaps.compute(Counter(), [], "resume", skills=SKILLS)
+
+
+def test_skill_gaps_from_text(tmp_path):
+    records = [
+        {"id": "a", "text": "Python and SQL developer"},
+        {"id": "b", "text": "Java developer"},
+    ]
+    gaps = skill_gaps("We need Python, SQL and Docker", records, "cv")
+    rows = {row["id"]: row for row in gaps.rows()}
+    assert rows["a"]["present"] == ["Python", "SQL"]
+    assert rows["a"]["missing"] == ["Docker"]
+    assert rows["b"]["missing"] == ["Docker", "Python", "SQL"]
+    assert rows["b"]["extra"] == ["Java"]
+    assert gaps.most_missing(1) == [("Docker", 2)]
+    gaps.to_csv(tmp_path / "gaps.csv")
+    gaps.summary_to_csv(tmp_path / "summary.csv")
+    assert (tmp_path / "summary.csv").read_text().startswith("skill,missing,share")
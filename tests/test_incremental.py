@@ -0,0 +1,94 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import pickle
+import random
+
+import pytest
+from synthetic import generate_cv, generate_jd
+
+from analysis import calculate_match_percentage
+from incremental import IncrementalMatch
+from keywords import extract_keywords
+from skills import extract_skills
+
+
+def edit(rng, text, pool):
+    """
+    Return text with a random paragraph edit: a line replaced, inserted,
+    deleted, duplicated, blanked or moved.
+    """
+    lines = text.splitlines()
+    position = rng.randrange(len(lines) + 1)
+    kind = rng.choice(["replace", "insert", "delete", "duplicate", "blank", "move"])
+    if kind == "insert" or not lines:
+        lines.insert(position, rng.choice(pool))
+        return "\n".join(lines)
+    position = min(position, len(lines) - 1)
+    if kind == "replace":
+        lines[position] = rng.choice(pool)
+    elif kind == "delete":
+        del lines[position]
+    elif kind == "duplicate":
+        lines.insert(position, lines[position])
+    elif kind == "blank":
+        lines[position] = "   "
+    else:
+        lines.insert(rng.randrange(len(lines)), lines.pop(position))
+    return "\n".join(lines)
+
+
+def assert_matches_full_rescore(match, cv_text, job_text):
+    cv_keywords, job_keywords = extract_keywords(cv_text), extract_keywords(job_text)
+    cv_skills, job_skills = extract_skills(cv_text), extract_skills(job_text)
+    assert match.cv.keywords == cv_keywords
+    assert match.jd.keywords == job_keywords
+    assert match.cv.skills == cv_skills
+    assert match.jd.skills == job_skills
+    assert match.common_keywords == cv_keywords & job_keywords
+    assert match.common_skills == cv_skills & job_skills
+    assert match.score == pytest.approx(calculate_match_percentage(cv_text, job_text))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_edits_match_full_rescore(seed):
+    rng = random.Random(seed)
+    cv_text, job_text = generate_cv(600, seed), generate_jd(300, seed)
+    pool = generate_cv(300, seed + 10) + "\n" + generate_jd(200, seed + 10)
+    pool = [line for line in pool.splitlines() if line.strip()]
+    match = IncrementalMatch()
+    match.update(cv_text, job_text)
+    assert_matches_full_rescore(match, cv_text, job_text)
+    for step in range(40):
+        if rng.random() < 0.7:
+            cv_text = edit(rng, cv_text, pool)
+        else:
+            job_text = edit(rng, job_text, pool)
+        if step % 10 == 0:
+            # As kept in the matches cache between analyses
+            match = pickle.loads(pickle.dumps(match))
+        match.update(cv_text, job_text)
+        assert_matches_full_rescore(match, cv_text, job_text)
+
+
+def test_emptied_documents_score_zero():
+    match = IncrementalMatch()
+    match.update(generate_cv(300, 1), generate_jd(200, 1))
+    match.update("", generate_jd(200, 1))
+    assert match.score == 0
+    assert not match.cv.keywords and not match.common_keywords
@@ -0,0 +1,128 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import json
+import os
+
+import pytest
+from synthetic import generate_cv
+
+import ingest
+from conftest import docx, pdf
+from dedup import Deduplicator, signature
+
+ORIGINAL_PROCESS_FILE = ingest.process_file
+LEGACY_DOC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 100
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def entries(checkpoint):
+    with open(checkpoint, encoding="utf-8") as f:
+        return {entry["path"]: entry for entry in map(json.loads, f)}
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "cvs"
+    write(str(root / "a.docx"), docx(generate_cv(300, seed=1)))
+    write(str(root / "nested" / "scan"), pdf(["Python developer"]))
+    write(str(root / "pdf_notes.txt"), b"not a CV, whatever its name says")
+    return str(root)
+
+
+def test_find_cvs_goes_by_content(source):
+    assert list(ingest.find_cvs(source)) == ["a.docx", os.path.join("nested", "scan")]
+
+
+def test_ingest_resumes_and_collapses_duplicates(source, tmp_path):
+    cv = generate_cv(300, seed=2)
+    write(os.path.join(source, "b.docx"), docx(cv))
+    write(os.path.join(source, "b copy.docx"), docx(cv + "\nReferences on request"))
+    output = str(tmp_path / "cvs.jsonl")
+
+    progress = ingest.ingest(source, output=output, workers=2)
+    assert (progress.done, progress.duplicates, progress.failed) == (4, 1, 0)
+    with open(output, encoding="utf-8") as f:
+        ids = {json.loads(line)["id"] for line in f}
+    duplicate = entries(output + ".done")
+    copies = {"b.docx", "b copy.docx"}
+    (copy,) = [path for path in copies if duplicate[path]["status"] == "duplicate"]
+    assert duplicate[copy]["duplicate_of"] == (copies - {copy}).pop()
+    assert ids == {"a.docx", os.path.join("nested", "scan")} | (copies - {copy})
+    assert ingest.ingest(source, output=output, workers=2).done == 0
+
+
+def test_duplicate_is_checkpointed_after_its_canonical_record(tmp_path):
+    checkpoint = ingest.Checkpoint(str(tmp_path / "done"))
+    sink = ingest.Sink(checkpoint, batch_size=10, deduplicator=Deduplicator())
+    text = generate_cv(300, seed=3)
+    for name, body in [("a", text), ("b", text + " Extra line")]:
+        record = {"id": name, "path": name, "text": body, "signature": signature(body)}
+        sink.add(record, (1, 1))
+    # Neither is done until the batch holding the canonical copy is written
+    assert checkpoint.done == {}
+    sink.flush()
+    assert entries(checkpoint.path)["b"]["duplicate_of"] == "a"
+    assert list(entries(checkpoint.path)) == ["a", "b"]
+
+
+def counting(source, relpath, *args):
+    with open(os.environ["INGEST_CALLS"], "a") as f:
+        f.write(relpath + "\n")
+    return ORIGINAL_PROCESS_FILE(source, relpath, *args)
+
+
+def test_extraction_limits_are_not_retried(source, tmp_path, monkeypatch):
+    write(os.path.join(source, "old.doc"), LEGACY_DOC)
+    calls = str(tmp_path / "calls")
+    monkeypatch.setenv("INGEST_CALLS", calls)
+    monkeypatch.setattr(ingest, "process_file", counting)
+    checkpoint = str(tmp_path / "done")
+    ingest.ingest(
+        source, output=str(tmp_path / "out"), checkpoint_path=checkpoint, retries=3
+    )
+    with open(calls) as f:
+        assert f.read().split().count("old.doc") == 1
+    assert entries(checkpoint)["old.doc"]["status"] == "quarantined"
+    assert "Legacy" in entries(checkpoint)["old.doc"]["error"]
+
+
+def crashing(source, relpath, *args):
+    if relpath == "crash.docx":
+        os._exit(1)
+    return ORIGINAL_PROCESS_FILE(source, relpath, *args)
+
+
+def test_dead_worker_quarantines_only_its_file(source, tmp_path, monkeypatch):
+    for seed in range(6):
+        write(os.path.join(source, f"cv{seed}.docx"), docx(generate_cv(200, seed)))
+    write(os.path.join(source, "crash.docx"), docx("Crashes the worker"))
+    monkeypatch.setattr(ingest, "process_file", crashing)
+    checkpoint = str(tmp_path / "done")
+    progress = ingest.ingest(
+        source, output=str(tmp_path / "out"), checkpoint_path=checkpoint, workers=3
+    )
+    statuses = {path: entry["status"] for path, entry in entries(checkpoint).items()}
+    assert statuses.pop("crash.docx") == "quarantined"
+    assert set(statuses.values()) == {"ok"} and len(statuses) == 8
+    assert progress.done == 9
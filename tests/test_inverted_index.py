@@ -0,0 +1,105 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import json
+import os
+
+import pytest
+from synthetic import generate_cv, generate_jd
+
+import analysis
+from inverted_index import InvertedIndex
+from ranking import CVRanker
+
+CVS = {f"cv-{seed}": generate_cv(300, seed) for seed in range(30)}
+JD = generate_jd(300, seed=11)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = InvertedIndex(str(tmp_path / "index"))
+    items = list(CVS.items())
+    # Two segments, so compaction has something to merge
+    index.add(items[:20])
+    index.add(items[20:])
+    return index
+
+
+def test_search_scores_shortlist_exactly(index):
+    expected = CVRanker.fit(list(CVS), list(CVS.values())).rank(JD, 10)
+    ranked = index.search(JD, k=10)
+    assert [cv_id for cv_id, _ in ranked] == [cv_id for cv_id, _ in expected]
+    assert [score for _, score in ranked] == pytest.approx(
+        [score for _, score in expected]
+    )
+
+
+def test_delete_compact_and_reopen_keep_scores(index):
+    index.delete(["cv-3", "cv-25"])
+    before = index.search(JD, k=10)
+    index.compact()
+    assert len(index.segments) == 1
+    reopened = InvertedIndex(index.path)
+    assert reopened.search(JD, k=10) == pytest.approx(before)
+    assert "cv-3" not in reopened and len(reopened) == len(CVS) - 2
+
+
+def test_present_terms(index):
+    assert index.present_terms("cv-1", ["python", "zyxwvut"]) == (
+        ["python"] if "python" in CVS["cv-1"].lower() else []
+    )
+
+
+def test_get_ranker_prefers_index_and_sees_updates(index, monkeypatch):
+    monkeypatch.setattr(analysis, "INDEX_DIR", index.path)
+    monkeypatch.setattr(analysis, "_index", None)
+    ranker = analysis.get_ranker()
+    assert isinstance(ranker, InvertedIndex)
+    assert len(ranker) == len(CVS)
+
+    # Another process adds a CV
+    InvertedIndex(index.path).add([("cv-new", JD)])
+    assert analysis.get_ranker().rank(JD, 1)[0] == ("cv-new", pytest.approx(100))
+
+
+def test_get_ranker_uses_corpus_until_stale_index_is_rebuilt(
+    index, tmp_path, monkeypatch
+):
+    corpus = str(tmp_path / "corpus")
+    CVRanker.fit(list(CVS), list(CVS.values())).save(corpus)
+    monkeypatch.setattr(analysis, "INDEX_DIR", index.path)
+    monkeypatch.setattr(analysis, "CORPUS_DIR", corpus)
+    monkeypatch.setattr(analysis, "_index", None)
+    monkeypatch.setattr(analysis, "_corpus", None)
+    manifest_path = os.path.join(index.path, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    def write_manifest(version):
+        with open(manifest_path, "w") as f:
+            json.dump({**manifest, "version": version}, f)
+        # The manifest is told apart by its mtime
+        stat = os.stat(manifest_path)
+        os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    write_manifest("0:old")
+    assert isinstance(analysis.get_ranker(), CVRanker)
+    assert isinstance(analysis.get_ranker(), CVRanker)
+
+    write_manifest(manifest["version"])
+    assert isinstance(analysis.get_ranker(), InvertedIndex)
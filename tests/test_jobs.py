@@ -0,0 +1,188 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+import pytest
+
+import jobs
+from jobs import worker_slot
+
+WORD_CLOUD_OUTPUTS = [
+    {"id": "word-cloud", "property": "src"},
+    {"id": "word-cloud", "property": "style"},
+    {"id": "word-cloud-placeholder", "property": "children"},
+]
+
+
+@pytest.fixture(scope="module")
+def app():
+    import app
+
+    return app
+
+
+def sleeper():
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+def gone(process, timeout=5):
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return False
+    return True
+
+
+def update_component(client, query, output, outputs, inputs, state=()):
+    return client.post(
+        "/_dash-update-component" + query,
+        json={
+            "output": output,
+            "outputs": outputs,
+            "inputs": inputs,
+            "state": list(state),
+            "changedPropIds": [f"{i['id']}.{i['property']}" for i in inputs],
+        },
+    )
+
+
+def test_slot_of_killed_job_is_reclaimed(monkeypatch):
+    monkeypatch.setattr(jobs, "WORKERS", 1)
+    monkeypatch.setattr(jobs, "_slots", None)
+    ready, signal_ready = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(ready)
+        with worker_slot():
+            os.write(signal_ready, b"x")
+            time.sleep(60)
+        os._exit(0)
+    os.close(signal_ready)
+    os.read(ready, 1)
+    os.close(ready)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+
+    started = time.monotonic()
+    with worker_slot(poll_interval=0.01):
+        assert jobs._slot_cache().get("slot:0") == os.getpid()
+    assert time.monotonic() - started < 1
+    assert jobs._slot_cache().get("slot:0") is None
+
+
+def test_queued_job_waits_for_the_holder_to_exit(monkeypatch):
+    monkeypatch.setattr(jobs, "WORKERS", 1)
+    monkeypatch.setattr(jobs, "_slots", None)
+    holder = sleeper()
+    jobs._slot_cache().set("slot:0", holder.pid)
+    queued, done = threading.Event(), threading.Event()
+
+    def job():
+        with worker_slot(on_wait=queued.set, poll_interval=0.01):
+            done.set()
+
+    thread = threading.Thread(target=job, daemon=True)
+    thread.start()
+    assert queued.wait(5)
+    assert not done.wait(0.2)
+    holder.kill()
+    holder.wait()
+    assert done.wait(5)
+    thread.join()
+
+
+def test_terminate_job_kills_the_job(app):
+    job = sleeper()
+    jobs._manager.terminate_job(str(job.pid))
+    assert gone(job)
+
+
+def test_job_that_exits_while_being_terminated_is_ignored(app, monkeypatch):
+    job = sleeper()
+    job.kill()
+    job.wait()
+    # Dash saw the pid just before the forkserver reaped it
+    monkeypatch.setattr(psutil, "pid_exists", lambda pid: True)
+    jobs._manager.terminate_job(str(job.pid))
+    assert jobs._manager.job_running(str(job.pid)) is False
+
+
+def test_clicking_analyze_again_terminates_the_superseded_job(app, monkeypatch):
+    old = sleeper()
+    started = []
+    monkeypatch.setattr(
+        jobs._manager,
+        "call_job_fn",
+        lambda key, job_fn, args, context: started.append(key) or 0,
+    )
+    response = update_component(
+        app.server.test_client(),
+        f"?oldJob={old.pid}",
+        "..word-cloud.src...word-cloud.style...word-cloud-placeholder.children..",
+        WORD_CLOUD_OUTPUTS,
+        [{"id": "analyze-button", "property": "n_clicks", "value": 2}],
+        [
+            {"id": "cv-document", "property": "data", "value": None},
+            {"id": "job-description", "property": "value", "value": ""},
+            {"id": "similarity-store", "property": "data", "value": None},
+            {"id": "session-id", "property": "data", "value": "s"},
+        ],
+    )
+    assert response.status_code == 200
+    assert gone(old)
+    assert len(started) == 1
+
+
+def test_clear_cancels_running_jobs(app):
+    job = sleeper()
+    response = update_component(
+        app.server.test_client(),
+        f"?cancelJob={job.pid}",
+        "clear-button.id",
+        {"id": "clear-button", "property": "id"},
+        [{"id": "clear-button", "property": "n_clicks", "value": 1}],
+    )
+    assert response.status_code == 204
+    assert gone(job)
+
+
+def test_word_cloud_failure_is_logged_and_shown(app, monkeypatch, caplog):
+    def broken(keywords):
+        raise RuntimeError("no fonts")
+
+    monkeypatch.setattr(app, "generate_wordcloud", broken)
+    src, style, placeholder = app.update_word_cloud(
+        1,
+        {"text": "Python developer with SQL and Docker experience"},
+        "Python developer",
+        None,
+        "s",
+    )
+    assert src is None and style == {"display": "none"}
+    assert placeholder.children == "The word cloud could not be generated"
+    assert "Generating the CV word cloud failed" in caplog.text
+    assert "no fonts" in caplog.text
@@ -0,0 +1,155 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import os
+import pickle
+import random
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+from nltk.tokenize import NLTKWordTokenizer
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+from synthetic import generate_cv, generate_jd
+
+import keywords
+from keywords import KeywordExtractor
+
+# Chunks the fast path must hand to NLTK, or get exactly right itself
+TRICKY = [
+    "don't",
+    "can't",
+    "cannot",
+    "gonna",
+    "I'm",
+    "they'll",
+    "O'Neil",
+    "Node.js",
+    "e.g.",
+    "i.e.",
+    "U.S.",
+    "Ph.D.",
+    "C++",
+    "C#",
+    "CI/CD",
+    "(Python),",
+    "[SQL]",
+    "{Go};",
+    "<Rust>",
+    "self-taught",
+    "end-to-end",
+    "5+",
+    "2019-2023",
+    "$100k",
+    "50%",
+    '"quoted"',
+    "'single'",
+    "``tick''",
+    "--",
+    "...",
+    "Mr.",
+    "etc.",
+    "Zürich",
+    "naïve",
+    "café,",
+    "mid-2020s.",
+    "a/b",
+    "foo@bar.com",
+    "https://example.com/jobs?id=1",
+    "Q&A",
+    "R&D!",
+    "why?",
+    "yes!",
+    "x:",
+]
+PUNCTUATION = [".", ",", ";", ":", "!", "?", "", "", "", ""]
+
+
+def reference_counts(extractor, text):
+    """
+    The counts before the fast path: nltk.word_tokenize on each line (Punkt
+    sentences, then the Treebank word tokenizer), lowercased alphabetic words
+    minus stopwords.
+    """
+    tokenizer = NLTKWordTokenizer()
+    counts = Counter()
+    for line in text.splitlines():
+        for sentence in extractor._sentences.tokenize(line):
+            for token in tokenizer.tokenize(sentence):
+                word = token.lower()
+                if token.isalpha() and word not in extractor.stop_words:
+                    counts[word] += 1
+    return counts
+
+
+def fuzz_document(rng, words):
+    parts = []
+    for _ in range(rng.randint(1, 120)):
+        word = rng.choice(TRICKY) if rng.random() < 0.3 else rng.choice(words)
+        if rng.random() < 0.2:
+            word = word.capitalize()
+        parts.append(word + rng.choice(PUNCTUATION))
+        if rng.random() < 0.05:
+            parts.append("\n")
+    return " ".join(parts)
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    return KeywordExtractor(normalize=False)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_synthetic_documents_match_nltk(extractor, seed):
+    for text in (generate_cv(800, seed), generate_jd(400, seed)):
+        assert extractor.extract(text) == reference_counts(extractor, text)
+
+
+def test_fuzzed_documents_match_nltk(extractor):
+    rng = random.Random(0)
+    words = generate_cv(2000, 0).split()
+    for _ in range(500):
+        text = fuzz_document(rng, words)
+        assert extractor.extract(text) == reference_counts(extractor, text), text
+
+
+def test_untrained_sentence_splitter_has_its_own_version(tmp_path):
+    def imported(script):
+        env = dict(os.environ, SKILLS_MATCH_NLTK_DATA=str(tmp_path))
+        env.pop("SKILLS_MATCH_NORMALIZE", None)
+        return subprocess.run(
+            [sys.executable, "-c", f"import keywords; {script}"],
+            cwd=os.path.dirname(keywords.__file__),
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()[-1]
+
+    untrained = imported("print(keywords.KEYWORDS_VERSION)")
+    assert untrained == f"{keywords.TOKENIZER_VERSION}-untrained"
+
+    model = tmp_path / "tokenizers" / "punkt" / "PY3" / "english.pickle"
+    model.parent.mkdir(parents=True)
+    model.write_bytes(pickle.dumps(PunktSentenceTokenizer()))
+    trained = imported(
+        "print(type(keywords.load_sentence_tokenizer()).__name__,"
+        " keywords.KEYWORDS_VERSION)"
+    )
+    assert trained == f"PunktSentenceTokenizer {keywords.TOKENIZER_VERSION}"
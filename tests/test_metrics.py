@@ -0,0 +1,60 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import os
+
+import metrics
+from metrics import timed
+
+
+def count(stage):
+    return metrics._get_store().get(
+        (metrics.stage_seconds.name, stage, "count"), 0, retry=True
+    )
+
+
+def test_observations_are_batched_until_flushed(monkeypatch):
+    monkeypatch.setattr(metrics, "FLUSH_SECONDS", 3600)
+    for _ in range(3):
+        with timed("batched"):
+            pass
+    assert count("batched") == 0
+    assert 'skills_match_stage_seconds_count{stage="batched"} 3' in metrics.render()
+    assert count("batched") == 3
+
+
+def test_observations_flush_after_the_interval(monkeypatch):
+    monkeypatch.setattr(metrics, "FLUSH_SECONDS", 0)
+    with timed("interval"):
+        pass
+    assert count("interval") == 1
+
+
+def test_forked_child_does_not_write_parent_observations(monkeypatch):
+    monkeypatch.setattr(metrics, "FLUSH_SECONDS", 3600)
+    with timed("forked"):
+        pass
+    pid = os.fork()
+    if pid == 0:
+        with timed("forked"):
+            pass
+        metrics.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    metrics.flush()
+    assert count("forked") == 2
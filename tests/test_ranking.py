@@ -0,0 +1,55 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import pytest
+from synthetic import generate_cv, generate_jd
+
+import keywords
+import normalize
+from incremental import match_percentage, score_tokens
+from ranking import CVRanker
+
+
+@pytest.fixture(params=["", "stem"])
+def normalization(request, monkeypatch):
+    normalizer = normalize.Normalizer("stem") if request.param else None
+    monkeypatch.setattr(normalize, "_normalizer", normalizer)
+    monkeypatch.setattr(normalize, "NORMALIZATION", request.param)
+    return request.param
+
+
+def test_ranker_scores_match_pairwise_scores(tmp_path, normalization):
+    cv_texts = [generate_cv(400, seed) for seed in range(20)]
+    jd_text = generate_jd(300, seed=7)
+    ranker = CVRanker.fit(range(len(cv_texts)), cv_texts, normalization)
+    ranker.save(str(tmp_path))
+    ranker = CVRanker.load(str(tmp_path))
+    assert ranker.normalization == normalization
+
+    jd_tokens = score_tokens(jd_text)
+    expected = [match_percentage(score_tokens(cv), jd_tokens) for cv in cv_texts]
+    assert ranker.scores(jd_text) == pytest.approx(expected)
+
+
+def test_present_terms_match_normalized_keywords(normalization):
+    jd_text = "Developers developing developed software. Testing tested tests."
+    cv_text = jd_text + " Managers managing management."
+    ranker = CVRanker.fit(["cv"], [cv_text], normalization)
+    job_keywords = list(keywords.KeywordExtractor().extract(jd_text))
+    assert ("develop" in job_keywords) == bool(normalization)
+    assert ranker.present_terms("cv", job_keywords) == job_keywords
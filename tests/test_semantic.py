@@ -0,0 +1,71 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import numpy as np
+import pytest
+from synthetic import generate_cv, generate_jd
+
+from semantic import LSAModel, SemanticIndex
+
+CVS = [(f"cv-{i}", generate_cv(300, seed=i)) for i in range(40)]
+
+
+@pytest.fixture(scope="module")
+def model():
+    texts = [text for _, text in CVS] + [generate_jd(300, seed=i) for i in range(20)]
+    return LSAModel.fit(texts, n_components=16)
+
+
+def test_model_round_trip(model, tmp_path):
+    model.save(tmp_path)
+    loaded = LSAModel.load(tmp_path)
+    assert isinstance(loaded.components, np.memmap)
+    assert loaded.version == model.version and loaded.vocabulary == model.vocabulary
+    texts = [CVS[0][1], generate_jd(300, seed=99)]
+    np.testing.assert_array_equal(loaded.embed(texts), model.embed(texts))
+
+
+def test_index_round_trip(model, tmp_path):
+    model.save(tmp_path)
+    built = SemanticIndex.build(model, CVS, tmp_path, batch_size=7)
+    loaded = SemanticIndex.load(tmp_path)
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.cv_ids == [cv_id for cv_id, _ in CVS]
+    np.testing.assert_allclose(
+        loaded.embeddings, model.embed([text for _, text in CVS]), atol=1e-6
+    )
+    np.testing.assert_array_equal(loaded.embeddings, built.embeddings)
+    assert loaded.rank(CVS[5][1], k=1)[0][0] == "cv-5"
+    assert loaded.rank(CVS[5][1], k=1000) == built.rank(CVS[5][1], k=1000)
+    assert len(loaded.rank(CVS[5][1], k=1000)) == len(CVS)
+
+
+def test_index_of_another_model_version_is_not_loaded(model, tmp_path):
+    model.save(tmp_path)
+    SemanticIndex.build(model, CVS, tmp_path)
+    retrained = LSAModel(
+        model.vocabulary, model.idf, model.components, version=model.version + "-new"
+    )
+    retrained.save(tmp_path)
+    assert SemanticIndex.load(tmp_path) is None
+    assert SemanticIndex.build(retrained, CVS, tmp_path) is not None
+
+
+def test_index_not_yet_built_is_not_loaded(model, tmp_path):
+    model.save(tmp_path)
+    assert SemanticIndex.load(tmp_path, model) is None
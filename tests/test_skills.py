@@ -0,0 +1,158 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import random
+import string
+import time
+from collections import Counter
+
+import pytest
+from synthetic import generate_cv
+
+from skills import SkillMatcher, load_matcher, read_taxonomy, tokenize
+
+LARGE_TAXONOMY = 30_000
+
+
+def brute_force(taxonomy, text):
+    """
+    Count skills by trying every alias at every word position: on each line,
+    the longest alias starting at the leftmost word, then after its end.
+    """
+    aliases = {}
+    for canonical, names in taxonomy:
+        for alias in names:
+            quoted = len(alias) > 1 and alias[0] == alias[-1] == '"'
+            words = tuple(tokenize(alias.strip('"')))
+            if words:
+                key = tuple(word.lower() for word in words)
+                # The first skill to claim an alias keeps it
+                aliases.setdefault(key, (canonical, words if quoted else None))
+    longest = max(map(len, aliases))
+    counts = Counter()
+    for line in text.splitlines():
+        words = tokenize(line)
+        position = 0
+        while position < len(words):
+            for length in range(min(longest, len(words) - position), 0, -1):
+                span = tuple(words[position : position + length])
+                found = aliases.get(tuple(word.lower() for word in span))
+                if found is not None and found[1] in (None, span):
+                    counts[found[0]] += 1
+                    position += length
+                    break
+            else:
+                position += 1
+    return counts
+
+
+@pytest.fixture(scope="module")
+def taxonomy():
+    return read_taxonomy()
+
+
+@pytest.fixture(scope="module")
+def matcher(taxonomy):
+    return SkillMatcher.compile(taxonomy)
+
+
+def test_punctuated_and_overlapping_aliases(matcher):
+    text = "Apache Spark, machine learning and C++ with CI/CD on Node.js"
+    assert matcher.extract(text) == Counter(
+        ["Apache Spark", "Machine learning", "C++", "CI/CD", "Node.js"]
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_synthetic_documents_match_brute_force(taxonomy, matcher, seed):
+    text = generate_cv(1500, seed)
+    assert matcher.extract(text) == brute_force(taxonomy, text)
+
+
+def test_alias_soup_matches_brute_force(taxonomy, matcher):
+    # Runs of alias words in random order and case, so aliases overlap, nest
+    # and break off part way far more often than in real text
+    words = [
+        word for _, names in taxonomy for alias in names for word in tokenize(alias)
+    ]
+    rng = random.Random(0)
+    for _ in range(300):
+        parts = []
+        for _ in range(rng.randint(1, 60)):
+            word = rng.choice(words)
+            word = rng.choice([word, word.lower(), word.upper()])
+            parts.append(word + rng.choice(["", "", "", ",", ".", " /", "\n"]))
+        text = " ".join(parts)
+        assert matcher.extract(text) == brute_force(taxonomy, text), text
+
+
+def large_taxonomy(taxonomy, size, seed=0):
+    """
+    The taxonomy padded with made-up skills of one to four words, drawn from
+    its own alias words and invented ones, each with up to two more aliases.
+    """
+    rng = random.Random(seed)
+    words = sorted(
+        {word for _, names in taxonomy for alias in names for word in tokenize(alias)}
+    )
+    words += [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        for _ in range(5000)
+    ]
+    lines = ["|".join(names) for _, names in taxonomy]
+    seen = {canonical.lower() for canonical, _ in taxonomy}
+    while len(lines) < size:
+        names = []
+        for _ in range(rng.randint(1, 3)):
+            name = " ".join(rng.choices(words, k=rng.randint(1, 4)))
+            if name.lower() not in seen:
+                seen.add(name.lower())
+                names.append(name)
+        if names:
+            lines.append("|".join(names))
+    return lines, words
+
+
+@pytest.mark.slow
+def test_large_taxonomy(taxonomy, tmp_path):
+    lines, words = large_taxonomy(taxonomy, LARGE_TAXONOMY)
+    path = tmp_path / "skills.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    directory = str(tmp_path / "automaton")
+
+    start = time.perf_counter()
+    compiled = load_matcher(str(path), directory)
+    compile_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded = load_matcher(str(path), directory)
+    load_seconds = time.perf_counter() - start
+    assert len(compiled) == len(loaded) == LARGE_TAXONOMY
+    # About 0.5s and 0.08s here; the bounds only catch a change of complexity
+    assert compile_seconds < 10 and load_seconds < 2
+
+    rng = random.Random(1)
+    cv = generate_cv(6000, seed=1).split(" ")
+    for _ in range(1000):
+        cv.insert(rng.randrange(len(cv)), " ".join(rng.choices(words, k=3)))
+    text = " ".join(cv)
+    start = time.perf_counter()
+    counts = loaded.extract(text)
+    match_seconds = time.perf_counter() - start
+    assert counts == compiled.extract(text)
+    assert counts == brute_force(read_taxonomy(str(path)), text)
+    assert match_seconds < 0.5
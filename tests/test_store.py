@@ -0,0 +1,54 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import os
+import subprocess
+import sys
+import time
+
+import store
+
+
+def test_store_is_off_by_default():
+    env = {k: v for k, v in os.environ.items() if k != "SKILLS_MATCH_STORE"}
+    output = subprocess.run(
+        [sys.executable, "-c", "import store; print(store.get_store())"],
+        cwd=os.path.dirname(store.__file__),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert output.strip() == "None"
+
+
+def test_purge_deletes_old_documents(tmp_path, monkeypatch):
+    documents = store.DocumentStore(str(tmp_path / "db"))
+    old = documents.add("cv", "Kubernetes and Terraform engineer")
+    documents.add_duplicate("cv", "Kubernetes and Terraform engineer.", old, 0.95)
+    documents.terms(old)
+
+    later = time.time() + 10 * 24 * 60 * 60
+    monkeypatch.setattr(store.time, "time", lambda: later)
+    new = documents.add("cv", "Kubernetes platform engineer")
+
+    assert documents.purge(5 * 24 * 60 * 60) == 1
+    assert documents.get(old) is None
+    assert documents.get(new) is not None
+    assert documents.duplicate_of("cv", "Kubernetes and Terraform engineer.") is None
+    assert [hit["id"] for hit in documents.search("kubernetes")] == [new]
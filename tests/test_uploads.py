@@ -0,0 +1,75 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+import io
+
+import pytest
+from flask import Flask
+
+import store
+from analysis import analyse
+from conftest import docx
+from synthetic import generate_cv
+from uploads import blueprint, load_cv
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "_store", store.DocumentStore(str(tmp_path / "db")))
+    app = Flask(__name__)
+    app.register_blueprint(blueprint)
+    return app.test_client()
+
+
+def upload(client, text):
+    response = client.post(
+        "/upload/cv?text=1",
+        data={"file": (io.BytesIO(docx(text)), "cv.docx")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_edited_copy_is_analysed_as_uploaded(client):
+    original = generate_cv(600, seed=3)
+    edited = original + "\nZyxwvut certification in quantum basket weaving"
+
+    first = upload(client, original)
+    second = upload(client, edited)
+
+    assert first["duplicate_of"] is None
+    assert second["duplicate_of"] is not None
+    assert second["id"] != first["id"]
+    assert "Zyxwvut" in second["text"]
+    assert "Zyxwvut" in load_cv(second["id"])
+
+
+def test_analysed_near_duplicate_is_not_stored(client):
+    original = generate_cv(600, seed=4)
+    edited = original + "\nZyxwvut certification in quantum basket weaving"
+    job = "Senior Python developer with SQL and Kubernetes"
+
+    analyse(upload(client, original)["text"], job)
+    documents = len(store._store)
+    second = upload(client, edited)
+    result = analyse(second["text"], job)
+
+    assert second["duplicate_of"] is not None
+    assert "zyxwvut" in result["cv_keywords"]
+    assert len(store._store) == documents
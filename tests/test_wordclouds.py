@@ -0,0 +1,105 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+from collections import Counter
+
+import pytest
+from dash import _get_paths
+from dash._utils import AttributeDict
+from flask import Flask
+
+import wordclouds
+from wordclouds import blueprint, wordcloud_url
+
+KEYWORDS = Counter({"python": 5, "django": 3, "sql": 2, "docker": 1})
+
+
+@pytest.fixture(autouse=True)
+def setup(monkeypatch):
+    # What a Dash app served behind a proxy at /skills/ sets
+    config = AttributeDict(requests_pathname_prefix="/skills/")
+    monkeypatch.setattr(_get_paths, "CONFIG", config)
+    wordclouds.image_cache.clear()
+    wordclouds.recipe_cache.clear()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+    render = wordclouds.render_wordcloud
+
+    def counting(*args):
+        calls.append(args)
+        return render(*args)
+
+    monkeypatch.setattr(wordclouds, "render_wordcloud", counting)
+    return calls
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(blueprint)
+    return app.test_client()
+
+
+def served_path(url):
+    # The proxy strips the prefix before the request reaches the app
+    return url.removeprefix("/skills")
+
+
+def test_url_is_under_the_requests_pathname_prefix(renders):
+    url = wordcloud_url(KEYWORDS, "Greens", fmt="png")
+    assert url.startswith("/skills/wordcloud/") and url.endswith(".png")
+    assert wordcloud_url(KEYWORDS, "Greens", fmt="png") == url
+    assert wordcloud_url(KEYWORDS, "Blues", fmt="png") != url
+    assert len(renders) == 2
+
+
+def test_served_with_etag(client):
+    path = served_path(wordcloud_url(KEYWORDS, "Greens", fmt="png"))
+    response = client.get(path)
+    assert response.status_code == 200 and response.mimetype == "image/png"
+    assert response.data.startswith(b"\x89PNG")
+    etag = response.headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_evicted_image_is_drawn_again(client, renders):
+    path = served_path(wordcloud_url(KEYWORDS, "Greens", fmt="png"))
+    image = client.get(path).data
+    wordclouds.image_cache.clear()
+    response = client.get(path)
+    assert response.status_code == 200
+    # Laid out with a fixed seed, so the ETag still names the same image
+    assert response.data == image
+    assert len(renders) == 2
+
+    wordclouds.recipe_cache.clear()
+    wordclouds.image_cache.clear()
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize(
+    "path",
+    [f"/wordcloud/{'0' * 64}.png", "/wordcloud/{key}.gif", "/wordcloud/{key}.webp"],
+)
+def test_unknown_image_is_not_found(client, path):
+    key = wordcloud_url(KEYWORDS, "Greens", fmt="png").rsplit("/", 1)[1][:-4]
+    wordclouds.image_cache.clear()
+    assert client.get(path.format(key=key)).status_code == 404
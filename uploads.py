@@ -0,0 +1,178 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+
+"""
+CV uploads posted as multipart form data and kept on the server under an ID.
+
+dcc.Upload hands a file to its callback as a base64 data URL, a third larger
+than the file, and the extracted text used to travel back to the browser and
+up again as callback State on every Analyze click. Instead the browser posts
+the file to /upload/cv (see assets/clientside.js). The body is streamed into a
+spooled temporary file, in memory up to SPOOL_MEMORY_BYTES and on disk beyond,
+and refused with 413 once it passes SKILLS_MATCH_MAX_FILE_BYTES. The text is
+extracted there and kept in a disk cache shared by every process, and the
+response carries its document ID, which callbacks send in place of the text.
+With ?text=1 the response also carries the text, for the CV text box.
+
+    curl -F file=@cv.pdf 'http://127.0.0.1:8050/upload/cv'
+"""
+
+import os
+import tempfile
+
+from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+
+from cache import CACHE_DIR, DiskCache, content_hash
+from extraction import MAX_FILE_BYTES, ExtractionError, extract_cv
+from metrics import document_bytes, register_cache, timed
+
+# Room for the multipart boundaries and headers around the file
+MAX_REQUEST_BYTES = MAX_FILE_BYTES + 64 * 1024
+# Uploads larger than this are spooled to disk rather than held in memory
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+# Uploaded CV texts by document ID. Kept a day by default: a session whose
+# upload has expired has to upload the CV again.
+upload_cache = DiskCache(
+    os.path.join(CACHE_DIR, "uploads"),
+    size_limit=int(os.environ.get("SKILLS_MATCH_UPLOAD_CACHE_BYTES", 256 * 1024**2)),
+    ttl=float(os.environ.get("SKILLS_MATCH_UPLOAD_TTL", 24 * 60 * 60)),
+)
+register_cache("uploads", upload_cache)
+
+blueprint = Blueprint("uploads", __name__)
+
+
+class _Spool(tempfile.SpooledTemporaryFile):
+    """
+    Spooled temporary file that refuses to grow past max_bytes, so a chunked
+    request without a Content-Length is cut off too.
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__(max_size=SPOOL_MEMORY_BYTES)
+        self.max_bytes = max_bytes
+
+    def write(self, data):
+        if self.tell() + len(data) > self.max_bytes:
+            raise RequestEntityTooLarge(
+                f"Files over {self.max_bytes} bytes are not accepted"
+            )
+        return super().write(data)
+
+
+def _stream_factory(total_content_length, content_type, filename, content_length=None):
+    return _Spool(MAX_FILE_BYTES)
+
+
+def save_cv(text, filename=None):
+    """
+    Keep a CV's text and return its document ID.
+    """
+    # The ID is a hash of the text, so IDs cannot be guessed and a re-upload of
+    # the same CV gets the same one
+    doc_id = content_hash("cv", text)
+    upload_cache.set(doc_id, {"text": text, "filename": filename})
+    return doc_id
+
+
+def load_cv(doc_id):
+    """
+    Return the text of an uploaded CV, or None if the ID is unknown or expired.
+    """
+    if not isinstance(doc_id, str):
+        return None
+    document = upload_cache.get(doc_id)
+    return document["text"] if document is not None else None
+
+
+def document_text(document):
+    """
+    Return the CV text a cv-document store holds: the text itself, once it has
+    been edited in the browser, or the uploaded document its ID names.
+    """
+    if not document:
+        return None
+    if "id" in document:
+        return load_cv(document["id"])
+    return document.get("text")
+
+
+def _error(message, status):
+    response = jsonify({"error": message})
+    response.status_code = status
+    return response
+
+
+@blueprint.route("/upload/cv", methods=["POST"])
+def upload_cv():
+    """
+    Extract the text of a CV posted as the "file" field of a multipart form.
+    """
+    if request.content_length is not None and (
+        request.content_length > MAX_REQUEST_BYTES
+    ):
+        return _error(f"Files over {MAX_FILE_BYTES} bytes are not accepted", 413)
+    parser = FormDataParser(
+        stream_factory=_stream_factory, max_content_length=MAX_REQUEST_BYTES
+    )
+    try:
+        _, _, files = parser.parse(
+            request.stream,
+            request.mimetype,
+            request.content_length,
+            request.mimetype_params,
+        )
+    except HTTPException as e:
+        return _error(e.description, e.code)
+    upload = files.get("file")
+    if upload is None:
+        return _error('Send the CV as the "file" field of a multipart form', 400)
+    with upload.stream as spool:
+        size = spool.seek(0, os.SEEK_END)
+        document_bytes.observe(size, "cv_upload")
+        try:
+            with timed("extract_cv"):
+                result = extract_cv(spool)
+        except ExtractionError as e:
+            return _error(str(e), 400)
+        except Exception as e:
+            print(e)
+            return _error("The file could not be read as a Word or PDF CV", 400)
+    from dedup import record_duplicate
+
+    text = result["text"]
+    # An edited copy of a stored CV is still analysed as uploaded; the stored
+    # corpus only keeps one document per group of near-duplicates
+    with timed("deduplicate_cv"):
+        duplicate_of = record_duplicate("cv", text, upload.filename)
+    document = {
+        "id": save_cv(text, upload.filename),
+        "filename": upload.filename,
+        "type": result["type"],
+        "pages": result["pages"],
+        "truncated": result["truncated"],
+        "chars": len(text),
+        "duplicate_of": duplicate_of,
+    }
+    if request.args.get("text") == "1":
+        document["text"] = text
+    return jsonify(document)
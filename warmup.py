@@ -0,0 +1,74 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Load what the analysis needs before processes are forked from this one.
+
+A background job forked from a cold process would import NLTK and the word
+cloud renderer and load the tokenizer, stopwords and skill automaton itself,
+seconds of work before it starts on its documents. The job forkserver (see
+jobs.py) preloads this module, so that work is done once and every job starts
+warm. Importing the module calls warm_up(). With normalization on, the memo
+table of normalized words is also filled from the CV corpus vocabulary, so jobs
+(which exit with whatever they add to it) start with it warm.
+
+Under gunicorn, gunicorn.conf.py calls preload() in the master before it forks
+the web workers, which also loads the corpus ranker and semantic index the
+workers rank with. The workers then share those pages copy-on-write instead of
+each loading its own copy.
+"""
+
+from analysis import get_ranker, get_semantic_index, get_semantic_model
+from keywords import get_extractor
+from normalize import warm_from_corpus
+from skills import get_matcher
+
+
+def warm_up():
+    """
+    Load the keyword extractor, skill matcher, semantic model (if one has been
+    trained), the word cloud renderer and the CV readers, and warm the
+    normalization memo table.
+    """
+    import docx2txt  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import wordcloud  # noqa: F401
+
+    get_extractor()
+    get_matcher()
+    get_semantic_model()
+    warm_from_corpus()
+
+
+def preload():
+    """
+    Load everything a web worker uses, for a server about to fork workers:
+    warm_up() (done on import) plus the CV corpus ranker's vocabulary and term
+    matrix and the semantic CV index, if they have been built.
+    """
+    import plotly.graph_objects  # noqa: F401
+    import plotly.io
+
+    # plotly imports its JSON engine (orjson) on first use and hands a
+    # half-imported module to a second thread serializing at the same time
+    plotly.io.to_json({})
+    get_ranker()
+    get_semantic_index()
+
+
+warm_up()
@@ -0,0 +1,128 @@
+###############################################################################
+#   This program compares two inputs and returns a similarity score.           #
+#    Copyright (C) 2024  Tom Welsh twelsh37@gmail.com                         #
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.   #
+###############################################################################
+
+"""
+Word cloud images rendered from keyword counts and served by URL.
+
+Clouds are drawn from the Counter that extract_keywords already produced, so
+the text is never tokenized a second time. Each image is cached under a hash of
+its frequencies, colormap, size and format, and served from
+/wordcloud/<key>.<format> (under the app's requests_pathname_prefix) with an
+ETag, instead of being inlined as a base64 data URI in every callback response.
+The words are laid out with a fixed seed, so a key always names the same image,
+and what it was drawn from is kept too: an image evicted from the cache is drawn
+again when it is next requested.
+"""
+
+import os
+from io import BytesIO
+
+from flask import Blueprint, Response, abort, request
+
+from cache import CACHE_DIR, DiskCache, content_hash
+from metrics import register_cache, timed
+
+WORDCLOUD_WIDTH = int(os.environ.get("SKILLS_MATCH_WORDCLOUD_WIDTH", 400))
+WORDCLOUD_HEIGHT = int(os.environ.get("SKILLS_MATCH_WORDCLOUD_HEIGHT", 200))
+WORDCLOUD_FORMAT = os.environ.get("SKILLS_MATCH_WORDCLOUD_FORMAT", "webp")
+# WordCloud draws at most this many words, so only they affect the image
+MAX_WORDS = 200
+
+MIME_TYPES = {"webp": "image/webp", "png": "image/png", "jpeg": "image/jpeg"}
+
+# On disk, so images rendered by background jobs can be served by any worker
+image_cache = DiskCache(
+    os.path.join(CACHE_DIR, "wordclouds"),
+    size_limit=int(os.environ.get("SKILLS_MATCH_IMAGE_CACHE_BYTES", 64 * 1024 * 1024)),
+)
+register_cache("wordclouds", image_cache)
+# What each image is drawn from, a few KB against tens for the image itself, so
+# it is kept long after the image has been evicted
+recipe_cache = DiskCache(os.path.join(CACHE_DIR, "wordcloud_recipes"))
+
+blueprint = Blueprint("wordclouds", __name__)
+
+
+@timed("wordcloud_render")
+def render_wordcloud(frequencies, colormap, width, height, fmt):
+    """
+    Draw a word cloud from {word: count} and return the encoded image bytes.
+    """
+    from wordcloud import WordCloud
+
+    wordcloud = WordCloud(
+        width=width,
+        height=height,
+        background_color="white",
+        colormap=colormap,
+        min_font_size=10,
+        max_words=MAX_WORDS,
+        random_state=0,
+    ).generate_from_frequencies(frequencies)
+    image_bytes = BytesIO()
+    options = {"quality": 80, "method": 4} if fmt == "webp" else {}
+    wordcloud.to_image().save(image_bytes, format=fmt.upper(), **options)
+    return image_bytes.getvalue()
+
+
+def wordcloud_url(
+    keywords,
+    colormap,
+    width=WORDCLOUD_WIDTH,
+    height=WORDCLOUD_HEIGHT,
+    fmt=WORDCLOUD_FORMAT,
+):
+    """
+    Render (or reuse) the word cloud for a keyword Counter and return its URL.
+    """
+    from dash import get_relative_path
+
+    frequencies = dict(keywords.most_common(MAX_WORDS))
+    key = content_hash(
+        repr(sorted(frequencies.items())), colormap, str(width), str(height), fmt
+    )
+    recipe = recipe_cache.get_or_compute(
+        key, lambda: (frequencies, colormap, width, height, fmt)
+    )
+    _image(key, recipe)
+    return get_relative_path(f"/wordcloud/{key}.{fmt}")
+
+
+def _image(key, recipe):
+    return image_cache.get_or_compute(key, lambda: render_wordcloud(*recipe))
+
+
+@blueprint.route("/wordcloud/<key>.<fmt>")
+def serve_wordcloud(key, fmt):
+    """
+    Serve a word cloud, drawing it again if it has been evicted. The key is a
+    content hash, so it is the ETag.
+    """
+    if fmt not in MIME_TYPES:
+        abort(404)
+    image = image_cache.get(key)
+    if image is None:
+        recipe = recipe_cache.get(key)
+        if recipe is None or recipe[-1] != fmt:
+            abort(404)
+        image = _image(key, recipe)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400, immutable"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers=headers)
+    return Response(image, mimetype=MIME_TYPES[fmt], headers=headers)